@@ -0,0 +1,95 @@
+import numpy as np
+
+
+# Links scored at once, limits the size of link x device matrices
+CHUNK_SIZE = 16384
+
+
+def device_arrays(table, req_avb):
+    """Convert a bandwidth table of the catalog to NumPy matrices (device x MCS)."""
+
+    width = table.width
+    count = np.asarray(table.mcs_count, dtype=np.int64)
+    capacity = np.asarray(table.capacity, dtype=np.int64).reshape(-1, width)
+    cap_sorted = np.asarray(table.cap_sorted, dtype=np.int64).reshape(-1, width)
+    cap_order = np.asarray(table.cap_order, dtype=np.int64).reshape(-1, width)
+    distance = np.asarray(table.distance[req_avb], dtype=np.float64).reshape(-1, width)
+    return count, capacity, cap_sorted, cap_order, distance
+
+
+def closest_mcs(count, capacity, cap_sorted, cap_order, req_cap):
+    """Find the closest MCS to the requested capacity for every link and device.
+    The same rules as in BandwidthTable.closest_mcs() are applied:
+    the smallest capacity which is not below the requested one (the highest MCS excluded)
+    is compared with the capacity of the highest MCS.
+
+    All sorted capacities are packed into one increasing array (every device gets its own
+    key range), so the search is done with a single searchsorted() call.
+    Return matrices (link x device) of MCS numbers and their capacities.
+    """
+
+    devices, width = capacity.shape
+    rows = np.arange(devices)
+    last = count - 1
+    cap_last = capacity[rows, last]
+
+    key_range = int(capacity.max()) + 2
+    # Unused cells are moved to the end of the device range
+    used = np.arange(width)[None, :] < last[:, None]
+    keys = np.where(used, cap_sorted, key_range - 1) + (rows * key_range)[:, None]
+    req_key = np.clip(req_cap, 0, key_range - 1)[:, None] + rows * key_range
+
+    pos = np.searchsorted(keys.ravel(), req_key) - rows * width
+    found = pos < last
+    pos = np.minimum(pos, width - 1)
+    cap_found = cap_sorted[rows, pos]
+    req = req_cap[:, None]
+    found &= cap_found - req <= np.abs(cap_last - req)
+
+    mcs = np.where(found, cap_order[rows, pos], last)
+    mcs_cap = np.where(found, cap_found, cap_last)
+    return mcs, mcs_cap
+
+
+def score(table, req_avb, link_dist, req_cap, excluded, dev_cost, weight_exclude):
+    """Calculate weights of all devices of the table for a batch of links.
+    Weights are bit-identical to the scalar scoring of csvhandler.get_recommendations().
+
+    link_dist - link distances, km (link)
+    req_cap - requested capacities (link)
+    excluded - excluded devices (link x device)
+    dev_cost - weight_cost of devices (device)
+    Return the weight matrix (link x device).
+    """
+
+    count, capacity, cap_sorted, cap_order, distance = device_arrays(table, req_avb)
+    mcs, mcs_cap = closest_mcs(count, capacity, cap_sorted, cap_order, req_cap)
+    mcs_dist = distance[np.arange(len(count)), mcs]
+
+    cost = dev_cost[None, :]
+    weight_cap = np.where(req_cap[:, None] > mcs_cap, -cost, cost)
+    diff = link_dist[:, None] - mcs_dist
+    unreachable = diff > 0
+    weight_cap = np.where(unreachable, -cost, weight_cap)
+    weight_dist = np.where(unreachable, diff, diff * -1)
+    weight_excl = np.where(excluded, weight_exclude, 0)
+    return weight_cap + weight_dist + weight_excl
+
+
+def recommend(table, req_avb, link_dist, req_cap, excluded, dev_cost, weight_exclude):
+    """Select the best device of the table for every link of the batch.
+    Devices are sorted by name in the table, so ties are resolved like min() of (weight, name).
+    Return row numbers of the winners.
+    """
+
+    link_dist = np.asarray(link_dist, dtype=np.float64)
+    req_cap = np.asarray(req_cap, dtype=np.int64)
+    excluded = np.asarray(excluded, dtype=bool)
+    dev_cost = np.asarray(dev_cost, dtype=np.int64)
+    winners = np.empty(len(link_dist), dtype=np.int64)
+    for start in range(0, len(link_dist), CHUNK_SIZE):
+        chunk = slice(start, start + CHUNK_SIZE)
+        weights = score(table, req_avb, link_dist[chunk], req_cap[chunk], excluded[chunk],
+                        dev_cost, weight_exclude)
+        winners[chunk] = np.argmin(weights, axis=1)
+    return winners
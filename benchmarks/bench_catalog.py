@@ -0,0 +1,80 @@
+"""Compare start-up time of the device catalog: TinyDB JSON vs the mapped binary catalog.
+
+Usage: python benchmarks/bench_catalog.py [--db devices.db] [--repeat 50]
+
+The binary catalog is written to a temporary folder, so the binary catalog next to the
+database is not touched. Loading times are the best of `repeat` runs in this process, the cold start
+is measured in a new interpreter (imports included).
+"""
+
+import subprocess
+import sys
+from argparse import ArgumentParser
+from pathlib import Path
+from tempfile import TemporaryDirectory
+from time import perf_counter
+
+ROOT = Path(__file__).resolve().parent.parent
+sys.path.insert(0, str(ROOT))
+
+from catalog import DeviceCatalog, write_binary
+
+
+COLD_START = '''
+import sys
+from time import perf_counter
+sys.path.insert(0, {root!r})
+start = perf_counter()
+from catalog import DeviceCatalog
+{load}
+print(perf_counter() - start)
+'''
+
+
+def best_time(function, repeat):
+    """Return the best time of `repeat` calls."""
+
+    times = []
+    for _ in range(repeat):
+        start = perf_counter()
+        function()
+        times.append(perf_counter() - start)
+    return min(times)
+
+
+def cold_start(load, repeat):
+    """Return the best time of loading the catalog in a new interpreter."""
+
+    code = COLD_START.format(root=str(ROOT), load=load)
+    return min(float(subprocess.run([sys.executable, '-c', code], capture_output=True, text=True,
+                                    check=True).stdout) for _ in range(repeat))
+
+
+def main():
+    parser = ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--db', type=Path, default=ROOT / 'devices.db')
+    parser.add_argument('--repeat', type=int, default=50)
+    args = parser.parse_args()
+
+    source = args.db.read_bytes()
+    with TemporaryDirectory() as tmp_dir:
+        bin_path = Path(tmp_dir) / 'devices.bin'
+        write_binary(DeviceCatalog.from_tinydb(args.db), bin_path, source)
+
+        time_json = best_time(lambda: DeviceCatalog.from_tinydb(args.db), args.repeat)
+        time_binary = best_time(lambda: DeviceCatalog.from_binary(bin_path, args.db.read_bytes()), args.repeat)
+        cold_repeat = max(args.repeat // 10, 1)
+        cold_json = cold_start(f'DeviceCatalog.from_tinydb({str(args.db)!r})', cold_repeat)
+        cold_binary = cold_start(f'DeviceCatalog.from_binary({str(bin_path)!r})', cold_repeat)
+
+        print(f'devices.db:           {len(source) / 1024:.1f} KB')
+        print(f'devices.bin:          {bin_path.stat().st_size / 1024:.1f} KB')
+        print(f'JSON (TinyDB):        {time_json * 1000:.2f} ms')
+        print(f'Binary (mmap):        {time_binary * 1000:.2f} ms ({time_json / time_binary:.0f}x)')
+        print(f'Cold start, JSON:     {cold_json * 1000:.2f} ms')
+        print(f'Cold start, binary:   {cold_binary * 1000:.2f} ms ({cold_json / cold_binary:.1f}x)')
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
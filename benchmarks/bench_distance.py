@@ -0,0 +1,80 @@
+"""Compare geodesy.link_distances() with per-link geopy distances.
+
+Usage: python benchmarks/bench_distance.py [--links 100000] [--seed 1] [--accuracy 1e-6]
+
+Reports the time of both methods, the maximum difference of raw distances
+and the number of links which rounded distances differ (must be zero).
+"""
+
+import sys
+from argparse import ArgumentParser
+from pathlib import Path
+from random import Random
+from time import perf_counter
+
+import numpy as np
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+
+from geodesy import DEFAULT_ACCURACY, geodesic, link_distances, vincenty
+
+
+def generate_links(count, seed):
+    """Random links: mostly up to 100 km, some long ones and some zero-length ones."""
+
+    rnd = Random(seed)
+    links = []
+    for _ in range(count):
+        lat_a = rnd.uniform(-89, 89)
+        lon_a = rnd.uniform(-180, 180)
+        kind = rnd.random()
+        if kind < 0.9:
+            spread = 1.0
+        elif kind < 0.99:
+            spread = 60.0
+        else:
+            spread = 0.0
+        lat_b = min(max(lat_a + rnd.uniform(-spread, spread), -90), 90)
+        lon_b = lon_a + rnd.uniform(-spread, spread)
+        links.append((lat_a, lon_a, lat_b, lon_b))
+    return links
+
+
+def main():
+    parser = ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--links', type=int, default=100000)
+    parser.add_argument('--seed', type=int, default=1)
+    parser.add_argument('--accuracy', type=float, default=DEFAULT_ACCURACY, help='accuracy bound, km')
+    args = parser.parse_args()
+
+    links = generate_links(args.links, args.seed)
+    lat_a, lon_a, lat_b, lon_b = np.array(links).T
+
+    start = perf_counter()
+    expected_raw = np.array([geodesic(*link) for link in links])
+    expected = np.array([round(link_dist, 2) for link_dist in expected_raw])
+    time_geopy = perf_counter() - start
+
+    start = perf_counter()
+    result = link_distances(lat_a, lon_a, lat_b, lon_b, accuracy=args.accuracy)
+    time_vectorized = perf_counter() - start
+
+    raw, converged = vincenty(lat_a, lon_a, lat_b, lon_b)
+    max_error = np.nanmax(np.abs(raw - expected_raw))
+    mismatches = int(np.count_nonzero(result != expected))
+
+    print(f'Links:                {args.links}')
+    print(f'geopy (per link):     {time_geopy:.3f} s')
+    print(f'link_distances():     {time_vectorized:.3f} s ({time_geopy / time_vectorized:.0f}x)')
+    print(f'Not converged:        {np.count_nonzero(~converged)}')
+    print(f'Max raw difference:   {max_error * 1e6:.6f} mm')
+    print(f'Rounded mismatches:   {mismatches}')
+
+    if max_error > args.accuracy or mismatches != 0:
+        print('FAILED: the accuracy bound is exceeded')
+        return 1
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,86 @@
+"""Measure import time of the entry points with python -X importtime.
+
+Usage: python benchmarks/bench_import.py [--repeat 5] [--rev HEAD~1] [--modules gui iwpgen csvhandler]
+
+Every module is imported in a new interpreter (in a temporary working directory, so
+import-time side effects don't touch the repository), the best cumulative time is reported
+with the heaviest imports of the last run. --rev also measures a git revision of the repository
+(extracted with git archive) to show the difference.
+"""
+
+import subprocess
+import sys
+from argparse import ArgumentParser
+from pathlib import Path
+from tempfile import TemporaryDirectory
+
+ROOT = Path(__file__).resolve().parent.parent
+
+
+def import_time(source, module, cwd):
+    """Import the module in a new interpreter.
+    Return the cumulative import time of the module and of its dependencies, microseconds.
+    """
+
+    code = f'import sys; sys.path.insert(0, {str(source)!r}); import {module}'
+    result = subprocess.run([sys.executable, '-X', 'importtime', '-c', code], cwd=cwd,
+                            capture_output=True, text=True)
+    if result.returncode != 0:
+        raise RuntimeError(f'Cannot import {module}: {result.stderr.strip().splitlines()[-1]}')
+    times = {}
+    for line in result.stderr.splitlines():
+        if not line.startswith('import time:') or 'cumulative' in line:
+            continue
+        self_time, cumulative, name = line[len('import time:'):].split('|')
+        times[name.strip()] = int(cumulative)
+    return times[module], times
+
+
+def measure(source, modules, repeat):
+    """Return {module: (best time, times of the last run)}."""
+
+    results = {}
+    with TemporaryDirectory() as cwd:
+        for module in modules:
+            runs = [import_time(source, module, cwd) for _ in range(repeat)]
+            results[module] = (min(total for total, times in runs), runs[-1][1])
+    return results
+
+
+def extract_revision(rev, target):
+    """Extract the repository at the revision into the folder."""
+
+    archive = subprocess.run(['git', 'archive', rev], cwd=ROOT, capture_output=True, check=True).stdout
+    subprocess.run(['tar', '-x', '-C', str(target)], input=archive, check=True)
+
+
+def main():
+    parser = ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--repeat', type=int, default=5)
+    parser.add_argument('--rev', help='git revision to compare with')
+    parser.add_argument('--modules', nargs='+', default=['gui', 'iwpgen', 'csvhandler'])
+    parser.add_argument('--top', type=int, default=5, help='number of the heaviest imports to show')
+    args = parser.parse_args()
+
+    current = measure(ROOT, args.modules, args.repeat)
+    previous = {}
+    if args.rev:
+        with TemporaryDirectory() as source:
+            extract_revision(args.rev, source)
+            modules = [module for module in args.modules if (Path(source) / f'{module}.py').is_file()]
+            previous = measure(source, modules, args.repeat)
+
+    for module in args.modules:
+        total, times = current[module]
+        line = f'{module:<12}{total / 1000:>9.1f} ms'
+        if module in previous:
+            line += f'   {args.rev}: {previous[module][0] / 1000:.1f} ms ({previous[module][0] / total:.1f}x)'
+        print(line)
+        heaviest = sorted((cumulative, name) for name, cumulative in times.items() if name != module)[-args.top:]
+        for cumulative, name in reversed(heaviest):
+            print(f'    {name:<28}{cumulative / 1000:>9.1f} ms')
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,137 @@
+"""Measure the memory held per link and the time of building links and linksArray items.
+
+Usage: python benchmarks/bench_memory.py [--links 20000] [--seed 1] [--simple 0.3] [--rev HEAD~1]
+
+A synthetic project (see synthetic.py) is read with csvhandler.read_csv, then every revision
+is measured in a new interpreter: create_links (bytes per link traced with tracemalloc, time without it),
+recommend_links with the equipment lookup (bytes per link after distances and equipment are set)
+and prepare_project. --rev also measures a git revision of the repository (extracted with git archive)
+to show the difference, both link shapes (dictionaries and records.Link) are supported.
+"""
+
+import json
+import os
+import subprocess
+import sys
+import tracemalloc
+from argparse import ArgumentParser, SUPPRESS
+from pathlib import Path
+from tempfile import TemporaryDirectory
+from time import perf_counter
+
+ROOT = Path(__file__).resolve().parent.parent
+
+
+def set_equipment(link, catalog, name):
+    """Look up the equipment of the link like handle() does."""
+
+    if isinstance(link, dict):
+        # Links before records.Link
+        link['Equipment'] = catalog.get_equipment(link['Requirements']['Frequency range'], name)
+    else:
+        link.equipment = catalog.get_equipment(link.requirements.band, name)
+
+
+def measure(csv_path):
+    """Measure csvhandler of the working directory. Return {metric: value}."""
+
+    sys.path.insert(0, os.getcwd())
+    import csvhandler
+    from catalog import load_catalog
+
+    csvhandler.logger.setLevel('WARNING')
+    catalog = load_catalog('devices.db')
+    profile = csvhandler.get_profile()
+    rows = csvhandler.read_csv(csv_path)
+    # The first run warms up caches (coordinates, imports), it is also the timed one
+    start = perf_counter()
+    links = list(csvhandler.create_links(rows).values())
+    create_time = perf_counter() - start
+    del links
+
+    tracemalloc.start()
+    before = tracemalloc.get_traced_memory()[0]
+    links = list(csvhandler.create_links(rows).values())
+    created = tracemalloc.get_traced_memory()[0] - before
+    tracemalloc.stop()
+
+    recommendations = csvhandler.recommend_links(links, catalog, profile)
+    scored = [(link, name) for link, name in zip(links, recommendations) if not isinstance(name, ValueError)]
+    tracemalloc.start()
+    before = tracemalloc.get_traced_memory()[0]
+    for link, name in scored:
+        set_equipment(link, catalog, name)
+    equipped = tracemalloc.get_traced_memory()[0] - before
+    tracemalloc.stop()
+
+    start = perf_counter()
+    for site_id, (link, name) in enumerate(scored):
+        csvhandler.prepare_project(link, 400000 + site_id * 2, profile)
+    prepare_time = perf_counter() - start
+    return {'links': len(links),
+            'create_bytes': created / len(links),
+            'full_bytes': (created + equipped) / len(links),
+            'create_us': create_time / len(links) * 1e6,
+            'prepare_us': prepare_time / max(len(scored), 1) * 1e6}
+
+
+def run(source, csv_path):
+    """Measure the source tree in a new interpreter (csvhandler reads config.ini from the working directory)."""
+
+    result = subprocess.run([sys.executable, __file__, '--measure', str(csv_path)], cwd=source,
+                            capture_output=True, text=True)
+    if result.returncode != 0:
+        raise RuntimeError(f'Cannot measure {source}: {result.stderr.strip()}')
+    return json.loads(result.stdout.splitlines()[-1])
+
+
+def extract_revision(rev, target):
+    """Extract the repository at the revision into the folder."""
+
+    archive = subprocess.run(['git', 'archive', rev], cwd=ROOT, capture_output=True, check=True).stdout
+    subprocess.run(['tar', '-x', '-C', str(target)], input=archive, check=True)
+
+
+def main():
+    parser = ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--links', type=int, default=20000)
+    parser.add_argument('--seed', type=int, default=1)
+    parser.add_argument('--simple', type=float, default=0.3, help='share of simple rows')
+    parser.add_argument('--rev', help='git revision to compare with')
+    parser.add_argument('--measure', type=Path, help=SUPPRESS)
+    args = parser.parse_args()
+
+    if args.measure:
+        print(json.dumps(measure(args.measure)))
+        return 0
+
+    sys.path.insert(0, str(ROOT))
+    from synthetic import write_project
+
+    with TemporaryDirectory() as tmp_dir:
+        csv_path = Path(tmp_dir) / 'benchmark.csv'
+        write_project(csv_path, args.links, args.seed, args.simple)
+        current = run(ROOT, csv_path)
+        previous = None
+        if args.rev:
+            source = Path(tmp_dir) / 'revision'
+            source.mkdir()
+            extract_revision(args.rev, source)
+            previous = run(source, csv_path)
+
+    metrics = (('create_bytes', 'Links, bytes/link'),
+               ('full_bytes', 'With equipment, bytes/link'),
+               ('create_us', 'create_links, us/link'),
+               ('prepare_us', 'prepare_project, us/link'))
+    print(f'Links: {current["links"]}')
+    print(f'{"":<28}{"Current":>10}' + (f'{args.rev:>12}{"Change":>9}' if previous else ''))
+    for key, title in metrics:
+        line = f'{title:<28}{current[key]:>10.1f}'
+        if previous:
+            line += f'{previous[key]:>12.1f}{current[key] / previous[key] - 1:>+9.1%}'
+        print(line)
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,159 @@
+"""Benchmark the CSV -> KMZ/BOM pipeline stage by stage.
+
+Usage: python benchmarks/bench_pipeline.py [--links 10000] [--seed 1] [--batch] [--no-cache]
+                                           [--memory] [--json result.json] [--compare old.json]
+
+A synthetic project (see synthetic.py) is written to a temporary folder and processed by
+the csvhandler functions: read_csv, create_links, set_distances, get_recommendations
+(recommend_links), prepare_project and create_project. Time, throughput and the share
+of every stage are reported. With --memory the peak memory of every stage is traced
+(tracemalloc slows the pipeline down, so times are not comparable with runs without it).
+--json saves the result, --compare prints the difference with a saved result.
+"""
+
+import json
+import os
+import platform
+import sys
+import tracemalloc
+from argparse import ArgumentParser
+from datetime import datetime
+from pathlib import Path
+from tempfile import TemporaryDirectory
+from time import perf_counter
+
+ROOT = Path(__file__).resolve().parent.parent
+sys.path.insert(0, str(ROOT))
+
+import csvhandler
+from cache import RecommendationCache
+from catalog import load_catalog
+from synthetic import write_project
+
+
+class Stages:
+    """Time (and optionally trace memory of) consecutive stages."""
+
+    def __init__(self, memory=False):
+        self.memory = memory
+        self.results = []
+
+    def run(self, name, function, *args):
+        """Run the stage and return its result."""
+
+        if self.memory:
+            tracemalloc.reset_peak()
+        start = perf_counter()
+        result = function(*args)
+        elapsed = perf_counter() - start
+        peak = tracemalloc.get_traced_memory()[1] if self.memory else None
+        self.results.append({'stage': name, 'seconds': elapsed, 'peak_bytes': peak})
+        return result
+
+
+def prepare_links(links, recommendations, catalog, profile):
+    """Prepare linksArray items like handle() does."""
+
+    project_links = []
+    site_id = 400000
+    for link, link_rec in zip(links, recommendations):
+        if isinstance(link_rec, ValueError):
+            continue
+        link.equipment = catalog.get_equipment(link.requirements.band, link_rec)
+        project_links.append(csvhandler.prepare_project(link, site_id, profile))
+        site_id += 2
+    return project_links
+
+
+def run_pipeline(csv_path, output, batch=False, memory=False):
+    """Process the project and return stage results."""
+
+    catalog = load_catalog(ROOT / 'devices.db')
+    profile = csvhandler.get_profile()
+    stages = Stages(memory)
+    if memory:
+        tracemalloc.start()
+    rows = stages.run('read_csv', csvhandler.read_csv, csv_path)
+    links = list(stages.run('create_links', csvhandler.create_links, rows).values())
+    stages.run('set_distances', csvhandler.set_distances, links)
+    recommendations = stages.run('get_recommendations', csvhandler.recommend_links, links, catalog, profile, batch)
+    project_links = stages.run('prepare_project', prepare_links, links, recommendations, catalog, profile)
+    project_sites = [site for project_link in project_links for site in (project_link['startSite'],
+                                                                         project_link['endSite'])]
+    stages.run('create_project', csvhandler.create_project, 'benchmark', project_links, project_sites,
+               output / 'benchmark.kmz', output / 'benchmark.txt')
+    peak = tracemalloc.get_traced_memory()[1] if memory else None
+    if memory:
+        tracemalloc.stop()
+    return stages.results, len(project_links), peak
+
+
+def print_results(result, compare=None):
+    """Print the stage table (and the difference with a previous result)."""
+
+    total = result['total_seconds']
+    old_stages = {stage['stage']: stage for stage in compare['stages']} if compare else {}
+    print(f'Links: {result["links"]} ({result["recommended"]} recommended), batch: {result["batch"]}, '
+          f'cache: {result["cache"]}')
+    print(f'{"Stage":<22}{"Time, s":>10}{"Share":>9}{"Links/s":>12}{"Peak, MB":>11}'
+          + (f'{"Old, s":>10}{"Change":>9}' if compare else ''))
+    for stage in result['stages'] + [{'stage': 'total', 'seconds': total, 'peak_bytes': result['peak_bytes']}]:
+        peak = f'{stage["peak_bytes"] / 2 ** 20:.1f}' if stage['peak_bytes'] is not None else '-'
+        line = (f'{stage["stage"]:<22}{stage["seconds"]:>10.3f}{stage["seconds"] / total:>9.1%}'
+                f'{result["links"] / stage["seconds"]:>12.0f}{peak:>11}')
+        if compare:
+            old = old_stages.get(stage['stage'], {'seconds': compare['total_seconds']} if stage['stage'] == 'total'
+                                 else None)
+            if old is not None:
+                line += f'{old["seconds"]:>10.3f}{stage["seconds"] / old["seconds"] - 1:>+9.1%}'
+        print(line)
+
+
+def main():
+    parser = ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--links', type=int, default=10000)
+    parser.add_argument('--seed', type=int, default=1)
+    parser.add_argument('--simple', type=float, default=0.3, help='share of simple rows')
+    parser.add_argument('--batch', action='store_true', help='score chunks with NumPy')
+    parser.add_argument('--no-cache', action='store_true', help='disable the recommendation cache')
+    parser.add_argument('--memory', action='store_true', help='trace peak memory (slower)')
+    parser.add_argument('--json', type=Path, help='save the result')
+    parser.add_argument('--compare', type=Path, help='compare with a saved result')
+    args = parser.parse_args()
+
+    csvhandler.logger.setLevel('WARNING')
+    # The config of the repository is used, the pipeline runs in a temporary folder
+    csvhandler.load_config(ROOT / 'config.ini')
+    if args.no_cache:
+        csvhandler.recommendation_cache = RecommendationCache(size=0)
+    cwd = Path.cwd()
+    with TemporaryDirectory() as tmp_dir:
+        os.chdir(tmp_dir)
+        try:
+            csv_path = Path(tmp_dir) / 'benchmark.csv'
+            write_project(csv_path, args.links, args.seed, args.simple)
+            stages, recommended, peak = run_pipeline(csv_path, Path(tmp_dir), args.batch, args.memory)
+        finally:
+            os.chdir(cwd)
+
+    result = {'date': datetime.now().isoformat(timespec='seconds'),
+              'python': platform.python_version(),
+              'links': args.links,
+              'seed': args.seed,
+              'simple': args.simple,
+              'batch': args.batch,
+              'cache': not args.no_cache,
+              'recommended': recommended,
+              'total_seconds': sum(stage['seconds'] for stage in stages),
+              'links_per_second': args.links / sum(stage['seconds'] for stage in stages),
+              'peak_bytes': peak,
+              'stages': stages}
+    compare = json.loads(args.compare.read_text()) if args.compare else None
+    print_results(result, compare)
+    if args.json:
+        args.json.write_text(json.dumps(result, indent=2))
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
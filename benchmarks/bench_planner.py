@@ -0,0 +1,86 @@
+"""Compare linkplanner.iter_site_pairs() with a scan of all pairs of sites.
+
+Usage: python benchmarks/bench_planner.py [--sites 10000] [--area 1000] [--reach 96.81] [--neighbours 0]
+                                          [--seed 1] [--no-scan]
+
+Sites are spread uniformly over a square of --area km (at 55 degrees of latitude), every site reaches
+--reach km (96.81 km is the reach of 5 GHz, 40 MHz, 99.99 % devices of devices.db).
+Reports the time of the grid and of the scan of all pairs (every site against all others,
+vectorized with NumPy) and the number of pairs which differ (must be zero).
+"""
+
+import sys
+from argparse import ArgumentParser
+from pathlib import Path
+from random import Random
+from time import perf_counter
+
+import numpy as np
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+
+from geodesy import link_distances
+from linkplanner import iter_site_pairs
+
+
+def generate_sites(count, area, seed):
+    """Random sites in a square of `area` km."""
+
+    rnd = Random(seed)
+    lat_span = area / 111.2
+    lon_span = area / (111.3 * np.cos(np.radians(55)))
+    latitudes = [55 + rnd.uniform(0, lat_span) for _ in range(count)]
+    longitudes = [37 + rnd.uniform(0, lon_span) for _ in range(count)]
+    return latitudes, longitudes
+
+
+def scan_pairs(latitudes, longitudes, reach):
+    """Find pairs within reach by comparing every site with all next ones."""
+
+    lat = np.asarray(latitudes)
+    lon = np.asarray(longitudes)
+    pairs = []
+    for site_id in range(len(lat) - 1):
+        others = np.arange(site_id + 1, len(lat))
+        distances = link_distances(np.full(len(others), lat[site_id]), np.full(len(others), lon[site_id]),
+                                   lat[others], lon[others])
+        within = (distances > 0) & (distances <= reach)
+        pairs.extend(zip([site_id] * int(within.sum()), others[within].tolist(), distances[within].tolist()))
+    return pairs
+
+
+def main():
+    parser = ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--sites', type=int, default=10000)
+    parser.add_argument('--area', type=float, default=1000.0, help='side of the square, km')
+    parser.add_argument('--reach', type=float, default=96.81, help='km')
+    parser.add_argument('--neighbours', type=int, default=0, help='links to N nearest sites, 0 - all')
+    parser.add_argument('--seed', type=int, default=1)
+    parser.add_argument('--no-scan', action='store_true', help='skip the scan of all pairs')
+    args = parser.parse_args()
+
+    latitudes, longitudes = generate_sites(args.sites, args.area, args.seed)
+    reaches = [args.reach] * args.sites
+    start = perf_counter()
+    pairs = list(iter_site_pairs(latitudes, longitudes, reaches, args.neighbours))
+    time_grid = perf_counter() - start
+    print(f'Sites:          {args.sites} in {args.area:.0f} x {args.area:.0f} km, reach {args.reach} km')
+    print(f'Pairs:          {len(pairs)} ({len(pairs) / args.sites:.1f} per site)')
+    print(f'Grid:           {time_grid:.2f} s')
+    if args.no_scan or args.neighbours > 0:
+        return 0
+
+    start = perf_counter()
+    expected = scan_pairs(latitudes, longitudes, args.reach)
+    time_scan = perf_counter() - start
+    mismatches = len(set(pairs) ^ set(expected))
+    print(f'All pairs scan: {time_scan:.2f} s ({time_scan / time_grid:.1f}x)')
+    print(f'Mismatches:     {mismatches}')
+    if mismatches != 0:
+        print('FAILED: the grid has missed or added pairs')
+        return 1
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,170 @@
+"""Load test of the planning service (iwpgen.py serve) on localhost.
+
+Usage: python benchmarks/bench_service.py [--endpoint recommend|project] [--links 1] [--concurrency 16]
+                                          [--duration 10] [--workers N] [--port 8080] [--external]
+
+The service is started in a subprocess (with --external the running service on --port is used),
+keep-alive connections send requests for --duration seconds, requests/s and latency percentiles
+(p50, p90, p99) are reported. Requests are built from synthetic links (see synthetic.py):
+/recommend gets a JSON list of --links links, /project gets a CSV of --links links.
+"""
+
+import asyncio
+import json
+import shutil
+import subprocess
+import sys
+from argparse import ArgumentParser
+from pathlib import Path
+from random import Random
+from tempfile import TemporaryDirectory
+from time import perf_counter
+
+ROOT = Path(__file__).resolve().parent.parent
+sys.path.insert(0, str(ROOT))
+
+from synthetic import generate_rows
+
+
+def get_bodies(endpoint, links, count, seed=1):
+    """Return `count` request bodies (bytes) of `links` synthetic links."""
+
+    rows = list(generate_rows(links * count, seed))
+    bodies = []
+    for start in range(0, len(rows), links * 2):
+        chunk = rows[start:start + links * 2]
+        if endpoint == 'project':
+            bodies.append(''.join(','.join(row) + '\n' for row in chunk).encode('utf-8'))
+            continue
+        items = []
+        for site_a, site_b in zip(chunk[::2], chunk[1::2]):
+            item = {'site_a': dict(zip(('name', 'latitude', 'longitude', 'height'), site_a)),
+                    'site_b': dict(zip(('name', 'latitude', 'longitude', 'height'), site_b))}
+            item.update(zip(('frequency_range', 'bandwidth', 'capacity', 'availability', 'exclude'), site_a[4:]))
+            items.append(item)
+        bodies.append(json.dumps(items).encode('utf-8'))
+    return bodies
+
+
+async def request(stream_reader, stream_writer, path, body, content_type):
+    """Send a POST request on a keep-alive connection, return the status code."""
+
+    stream_writer.write(f'POST {path} HTTP/1.1\r\nHost: localhost\r\nContent-Type: {content_type}\r\n'
+                        f'Content-Length: {len(body)}\r\n\r\n'.encode('latin-1') + body)
+    await stream_writer.drain()
+    status = int((await stream_reader.readline()).split()[1])
+    length = 0
+    while True:
+        line = await stream_reader.readline()
+        if line in (b'\r\n', b''):
+            break
+        key, _, value = line.decode('latin-1').partition(':')
+        if key.lower() == 'content-length':
+            length = int(value)
+    await stream_reader.readexactly(length)
+    return status
+
+
+async def client(port, path, bodies, content_type, deadline, latencies, errors, seed):
+    """Send requests until the deadline."""
+
+    rnd = Random(seed)
+    stream_reader, stream_writer = await asyncio.open_connection('127.0.0.1', port)
+    try:
+        while perf_counter() < deadline:
+            started = perf_counter()
+            status = await request(stream_reader, stream_writer, path, rnd.choice(bodies), content_type)
+            latencies.append(perf_counter() - started)
+            if status != 200:
+                errors.append(status)
+    finally:
+        stream_writer.close()
+
+
+async def run_load(port, endpoint, bodies, concurrency, duration):
+    """Run clients concurrently. Return latencies (seconds), error statuses and the elapsed time."""
+
+    path = '/project?name=benchmark' if endpoint == 'project' else '/recommend'
+    content_type = 'text/csv' if endpoint == 'project' else 'application/json'
+    latencies = []
+    errors = []
+    started = perf_counter()
+    await asyncio.gather(*(client(port, path, bodies, content_type, started + duration, latencies, errors, seed)
+                           for seed in range(concurrency)))
+    return latencies, errors, perf_counter() - started
+
+
+async def wait_for_service(port, timeout=30):
+    """Wait until the service accepts connections."""
+
+    started = perf_counter()
+    while True:
+        try:
+            stream_reader, stream_writer = await asyncio.open_connection('127.0.0.1', port)
+            stream_writer.close()
+            return
+        except OSError:
+            if perf_counter() - started > timeout:
+                raise
+            await asyncio.sleep(0.1)
+
+
+def prepare_workdir(target):
+    """Copy the config and the database into the working directory of the service,
+    so its logs and outputs don't appear in the repository.
+    """
+
+    for path in [ROOT / 'config.ini', ROOT / 'devices.db', *ROOT.glob('devices.*.bin')]:
+        if path.is_file():
+            shutil.copy(path, target)
+
+
+def percentile(values, share):
+    """Return the percentile of sorted values."""
+
+    return values[min(len(values) - 1, int(len(values) * share))]
+
+
+def main():
+    parser = ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--endpoint', choices=('recommend', 'project'), default='recommend')
+    parser.add_argument('--links', type=int, default=1, help='links per request')
+    parser.add_argument('--concurrency', type=int, default=16, help='number of connections')
+    parser.add_argument('--duration', type=float, default=10.0, help='seconds')
+    parser.add_argument('--workers', type=int, help='worker processes of the service')
+    parser.add_argument('--port', type=int, default=8080)
+    parser.add_argument('--external', action='store_true', help='use the running service')
+    args = parser.parse_args()
+
+    bodies = get_bodies(args.endpoint, args.links, 256)
+    service = None
+    workdir = TemporaryDirectory()
+    if not args.external:
+        prepare_workdir(workdir.name)
+        command = [sys.executable, str(ROOT / 'iwpgen.py'), 'serve', '--port', str(args.port), '--quiet']
+        if args.workers:
+            command += ['--workers', str(args.workers)]
+        service = subprocess.Popen(command, cwd=workdir.name, stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL)
+    try:
+        asyncio.run(wait_for_service(args.port))
+        # Warm up worker processes
+        asyncio.run(run_load(args.port, args.endpoint, bodies, args.concurrency, 1.0))
+        latencies, errors, elapsed = asyncio.run(run_load(args.port, args.endpoint, bodies, args.concurrency,
+                                                          args.duration))
+    finally:
+        if service is not None:
+            service.terminate()
+            service.wait()
+        workdir.cleanup()
+
+    latencies.sort()
+    print(f'Endpoint: /{args.endpoint}, {args.links} links per request, {args.concurrency} connections')
+    print(f'Requests: {len(latencies)} in {elapsed:.1f} s, {len(errors)} errors')
+    print(f'Requests/s: {len(latencies) / elapsed:.1f}, links/s: {len(latencies) * args.links / elapsed:.1f}')
+    print(f'Latency, ms: p50 {percentile(latencies, 0.5) * 1000:.1f}, p90 {percentile(latencies, 0.9) * 1000:.1f}, '
+          f'p99 {percentile(latencies, 0.99) * 1000:.1f}, max {latencies[-1] * 1000:.1f}')
+    return 0 if len(errors) == 0 else 1
+
+
+if __name__ == '__main__':
+    sys.exit(main())
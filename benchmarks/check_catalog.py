@@ -0,0 +1,86 @@
+"""Check that the JSON and the binary catalog backends agree.
+
+Usage: python benchmarks/check_catalog.py [--db devices.db]
+
+The catalog of the database is built from JSON (DeviceCatalog.from_tinydb) and mapped from
+the binary catalog (write_binary, from_binary): all tables and the longest reaches must be equal.
+Then one MCS distance of one device is removed in a copy of the database: both backends must
+reject it (load_catalog raises ValueError and no binary catalog is written). Files are written
+to a temporary folder. The exit code is 1 if any check fails.
+"""
+
+import json
+import sys
+from argparse import ArgumentParser
+from pathlib import Path
+from tempfile import TemporaryDirectory
+
+ROOT = Path(__file__).resolve().parent.parent
+sys.path.insert(0, str(ROOT))
+
+from catalog import AVAILABILITIES, DeviceCatalog, load_catalog, write_binary
+
+
+def get_tables(catalog):
+    """Return the content of all tables as plain lists."""
+
+    return {key: (table.names, table.families, table.width, list(table.mcs_count), list(table.capacity),
+                  list(table.cap_sorted), list(table.cap_order),
+                  {req_avb: list(values) for req_avb, values in table.distance.items()},
+                  [table.max_reach(req_avb) for req_avb in AVAILABILITIES])
+            for key, table in catalog.tables.items()}
+
+
+def remove_distance(tables):
+    """Remove the distance of the highest MCS of the first device with distances. Return its name."""
+
+    for title, documents in tables.items():
+        if title.startswith('_'):
+            continue
+        for document in documents.values():
+            for bandwidth, distances in document['Availability']['99.90'].items():
+                if distances:
+                    distances.pop(list(distances)[-1])
+                    return document['Name']
+    raise ValueError('No device has distances.')
+
+
+def main():
+    parser = ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--db', type=Path, default=ROOT / 'devices.db')
+    args = parser.parse_args()
+
+    failures = []
+    source = args.db.read_bytes()
+    with TemporaryDirectory() as tmp_dir:
+        bin_path = Path(tmp_dir) / 'devices.bin'
+        catalog_json = DeviceCatalog.from_tinydb(args.db)
+        write_binary(catalog_json, bin_path, source)
+        catalog_binary = DeviceCatalog.from_binary(bin_path, source)
+        if get_tables(catalog_json) != get_tables(catalog_binary):
+            failures.append('tables of the JSON and the binary catalogs differ')
+        if catalog_json.equipment != catalog_binary.equipment:
+            failures.append('equipment of the JSON and the binary catalogs differs')
+
+        db_path = Path(tmp_dir) / 'missing.db'
+        tables = json.loads(source)
+        name = remove_distance(tables)
+        db_path.write_text(json.dumps(tables))
+        for backend, load in (('JSON', DeviceCatalog.from_tinydb), ('load_catalog', load_catalog)):
+            try:
+                load(db_path)
+            except ValueError as error_msg:
+                print(f'{backend}: {error_msg}')
+            else:
+                failures.append(f'{backend} has accepted {name} without a distance')
+        if list(Path(tmp_dir).glob('missing*.bin')):
+            failures.append(f'a binary catalog has been written for {name} without a distance')
+
+    for failure in failures:
+        print(f'Failed: {failure}')
+    print(f'Tables: {len(catalog_json.tables)}, failures: {len(failures)}')
+    return 0 if not failures else 1
+
+
+if __name__ == '__main__':
+    sys.exit(main())
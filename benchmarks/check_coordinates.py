@@ -0,0 +1,76 @@
+"""Check the coordinate parser on the forms the CSV accepts.
+
+Usage: python benchmarks/check_coordinates.py
+
+Every case of CASES is parsed with coordinates.parse_coordinate and compared with the expected
+decimal degrees (None if the text must be rejected). Decimal forms which float() reads (.5, +59.6, 5.)
+must be kept for the KMZ as they are, like the geopy path did. The exit code is 1 if any case fails.
+"""
+
+import sys
+from pathlib import Path
+
+ROOT = Path(__file__).resolve().parent.parent
+sys.path.insert(0, str(ROOT))
+
+from coordinates import parse_coordinate
+
+
+# (text, axis, expected decimal degrees or None if the coordinate is invalid)
+CASES = (('59.6070142792', 'latitude', 59.6070142792),
+         ('-41.40338', 'latitude', -41.40338),
+         ('+59.6', 'latitude', 59.6),
+         ('.5', 'latitude', 0.5),
+         ('-.5', 'longitude', -0.5),
+         ('+.5', 'longitude', 0.5),
+         ('5.', 'latitude', 5.0),
+         ('', 'latitude', 0.0),
+         ('41°24\'12.2"N', 'latitude', 41 + 24 / 60 + 12.2 / 3600),
+         ('41 24 12.2 S', 'latitude', -(41 + 24 / 60 + 12.2 / 3600)),
+         ('41:24:12.2', 'latitude', 41 + 24 / 60 + 12.2 / 3600),
+         ('41 24.2028', 'latitude', 41 + 24.2028 / 60),
+         ('S .5', 'latitude', -0.5),
+         ('W 170 30', 'longitude', -170.5),
+         ('190', 'longitude', -170.0),
+         ('95', 'latitude', None),
+         ('41 60', 'latitude', None),
+         ('41.5 30', 'latitude', None),
+         ('-41 N', 'latitude', None),
+         ('41 E', 'latitude', None),
+         ('.', 'latitude', None),
+         ('+', 'latitude', None),
+         ('abc', 'latitude', None))
+
+
+def is_decimal(text, value):
+    """Return True if float() reads the text as the value (decimal degrees within the range)."""
+
+    try:
+        return float(text) == value
+    except ValueError:
+        return False
+
+
+def main():
+    failures = 0
+    for text, axis, expected in CASES:
+        try:
+            value, kmz_text = parse_coordinate(text, axis)
+        except ValueError as error_msg:
+            result = f'rejected ({error_msg})'
+            passed = expected is None
+        else:
+            result = f'{value} ({kmz_text!r})'
+            passed = expected is not None and abs(value - expected) < 1e-9
+            if passed and is_decimal(text, value):
+                # Decimal input is written to the KMZ as it is
+                passed = kmz_text == text
+        if not passed:
+            failures += 1
+            print(f'{axis} {text!r}: expected {expected}, got {result}')
+    print(f'Cases: {len(CASES)}, failures: {failures}')
+    return 0 if failures == 0 else 1
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,107 @@
+"""Check that all recommenders select the same device on seeded synthetic links.
+
+Usage: python benchmarks/check_recommendations.py [--links 20000] [--seed 1]
+
+get_recommendations (the reference), get_recommendations_indexed, get_recommendations_batch
+and the first alternative of get_alternatives are compared link by link. Links are built
+from the MCS tables of devices.db: capacities are exact MCS capacities or 1 Mbps around them,
+distances are exact MCS reaches (the reach boundary) or 0.01 km around them, and devices
+with equal MCS tables make ties which are broken by name. Links without a device table
+check that all recommenders reject the same links. The exit code is 1 if any result differs.
+"""
+
+import sys
+from argparse import ArgumentParser
+from pathlib import Path
+from random import Random
+
+ROOT = Path(__file__).resolve().parent.parent
+sys.path.insert(0, str(ROOT))
+
+import csvhandler
+from catalog import load_catalog
+from records import Link, Requirements, Site
+from scoring import EXCLUDE_BITS
+
+
+def generate_links(catalog, count, seed=1):
+    """Return `count` links with distances set (no coordinates are needed). Return links and
+    the number of links placed exactly at the reach of an MCS.
+    """
+
+    rnd = Random(seed)
+    tables = sorted(catalog.tables.items())
+    bits = list(EXCLUDE_BITS.values())
+    links = []
+    boundary = 0
+    for link_id in range(count):
+        (band, bandwidth), table = rnd.choice(tables)
+        req_avb = rnd.choice(('99.90', '99.99'))
+        row = rnd.randrange(len(table))
+        mcs = rnd.randrange(table.mcs_count[row])
+        cell = row * table.width + mcs
+        capacity = max(table.capacity[cell] + rnd.choice((0, 0, -1, 1)), 1)
+        reach = table.distance[req_avb][cell]
+        if rnd.random() < 0.2:
+            distance = round(rnd.uniform(0, 60), 2)
+        else:
+            offset = rnd.choice((0, 0, -0.01, 0.01))
+            distance = max(reach + offset, 0)
+            boundary += offset == 0
+        exclude = sum(bit for bit in bits if rnd.random() < 0.15)
+        if rnd.random() < 0.01:
+            # No devices support the bandwidth
+            bandwidth = '1000'
+        site_a = Site(f'Site {link_id} A', '0', '0', '10', (0.0, 0.0))
+        site_b = Site(f'Site {link_id} B', '0', '0', '10', (0.0, 0.0))
+        links.append(Link(site_a, site_b, Requirements(band, bandwidth, capacity, req_avb, exclude), distance))
+    return links, boundary
+
+
+def get_name(recommender, *args):
+    """Return the device name or None if the link is rejected."""
+
+    try:
+        return recommender(*args)
+    except ValueError:
+        return None
+
+
+def main():
+    parser = ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--links', type=int, default=20000)
+    parser.add_argument('--seed', type=int, default=1)
+    args = parser.parse_args()
+
+    csvhandler.load_config(ROOT / 'config.ini')
+    catalog = load_catalog(ROOT / 'devices.db')
+    profile = csvhandler.get_profile()
+    links, boundary = generate_links(catalog, args.links, args.seed)
+
+    batch = csvhandler.get_recommendations_batch(links, catalog, profile)
+    mismatches = 0
+    ties = 0
+    for link, name_batch in zip(links, batch):
+        expected = get_name(csvhandler.get_recommendations, link, catalog, profile)
+        alternatives = get_name(csvhandler.get_alternatives, link, catalog, profile, 2)
+        if alternatives is not None and len(alternatives) > 1:
+            ties += alternatives[0]['Weight'] == alternatives[1]['Weight']
+        results = {'indexed': get_name(csvhandler.get_recommendations_indexed, link, catalog, profile),
+                   'batch': None if isinstance(name_batch, ValueError) else name_batch,
+                   'alternatives': None if alternatives is None else alternatives[0]['Name']}
+        differs = {recommender: name for recommender, name in results.items() if name != expected}
+        if differs:
+            mismatches += 1
+            if mismatches <= 10:
+                print(f'{link.name}: {link.requirements!r}, {link.distance} km: expected {expected!r}, '
+                      + ', '.join(f'{recommender} {name!r}' for recommender, name in differs.items()))
+
+    print(f'Links: {len(links)}, at the reach boundary: {boundary}, ties: {ties}, mismatches: {mismatches}')
+    if boundary == 0 or ties == 0:
+        print('The links don\'t cover both ties and the reach boundary, try another seed.')
+        return 1
+    return 0 if mismatches == 0 else 1
+
+
+if __name__ == '__main__':
+    sys.exit(main())
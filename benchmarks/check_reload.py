@@ -0,0 +1,108 @@
+"""Check that a project is generated with one config even if config.ini is reloaded meanwhile.
+
+Usage: python benchmarks/check_reload.py [--links 3000] [--reload-after 300]
+
+config.ini and devices.db are copied to a temporary folder and a project of simple links (requirements
+are taken from the project defaults) is generated with the resources of reloader.Reloader.
+After --reload-after links, req_freq of config.ini is changed and the reloader is checked:
+all links of the KMZ must have the band of the old config, the next project must have the new one.
+The exit code is 1 if any check fails.
+"""
+
+import json
+import os
+import sys
+from argparse import ArgumentParser
+from pathlib import Path
+from shutil import copyfile
+from tempfile import TemporaryDirectory
+from xml.etree import ElementTree
+from zipfile import ZipFile
+
+ROOT = Path(__file__).resolve().parent.parent
+sys.path.insert(0, str(ROOT))
+
+import csvhandler
+from progress import Progress
+from reloader import Reloader
+from synthetic import write_project
+
+OLD_FREQ, NEW_FREQ = '5', '6'
+
+
+def get_bands(kmz_path):
+    """Return the number of links of every band in linksArray of the KMZ."""
+
+    with ZipFile(kmz_path) as kmz:
+        root = ElementTree.fromstring(kmz.read('doc.kml'))
+    text = next(element.text for element in root.iter() if element.text and 'linksArray' in element.text)
+    bands = {}
+    for link in json.loads(text)['linksArray']:
+        bands[link['band']] = bands.get(link['band'], 0) + 1
+    return bands
+
+
+def set_req_freq(config_path, req_freq):
+    """Change req_freq of the [Project] partition, the modification time is moved forward."""
+
+    lines = [f'req_freq = {req_freq}' if line.startswith('req_freq') else line
+             for line in config_path.read_text().splitlines()]
+    config_path.write_text('\n'.join(lines) + '\n')
+    mtime = config_path.stat().st_mtime_ns + 1_000_000_000
+    os.utime(config_path, ns=(mtime, mtime))
+
+
+def main():
+    parser = ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--links', type=int, default=3000)
+    parser.add_argument('--reload-after', type=int, default=300)
+    args = parser.parse_args()
+
+    failures = []
+    cwd = Path.cwd()
+    with TemporaryDirectory() as tmp_dir:
+        tmp_path = Path(tmp_dir)
+        copyfile(ROOT / 'devices.db', tmp_path / 'devices.db')
+        copyfile(ROOT / 'config.ini', tmp_path / 'config.ini')
+        set_req_freq(tmp_path / 'config.ini', OLD_FREQ)
+        write_project(tmp_path / 'first.csv', args.links, simple=1.0)
+        write_project(tmp_path / 'second.csv', args.links, seed=2, simple=1.0)
+        os.chdir(tmp_path)
+        try:
+            reloader = Reloader(tmp_path / 'config.ini', interval=0)
+            reloaded = []
+
+            def reload_once(stage, done, total):
+                if stage == 'links' and done >= args.reload_after and not reloaded:
+                    set_req_freq(tmp_path / 'config.ini', NEW_FREQ)
+                    reloaded.append(reloader.check())
+
+            catalog, profile, config = reloader.get()
+            csvhandler.handle(tmp_path / 'first.csv', catalog, profile=profile, output_folder=tmp_path / 'first',
+                              progress=Progress(reload_once), run_config=config)
+            if reloaded != [True]:
+                failures.append(f'config.ini has not been reloaded during the run ({reloaded})')
+            catalog, profile, config = reloader.get()
+            csvhandler.handle(tmp_path / 'second.csv', catalog, profile=profile, output_folder=tmp_path / 'second',
+                              run_config=config)
+            for project, req_freq in (('first', OLD_FREQ), ('second', NEW_FREQ)):
+                kmz_paths = list((tmp_path / project).glob('*.kmz'))
+                if len(kmz_paths) != 1:
+                    failures.append(f'{project}: {len(kmz_paths)} KMZ files')
+                    continue
+                bands = get_bands(kmz_paths[0])
+                print(f'{project}: links by band {bands}')
+                expected = {csvhandler.BANDS[req_freq][2]}
+                if set(bands) != expected:
+                    failures.append(f'{project}: bands {sorted(bands)} instead of {sorted(expected)}')
+        finally:
+            os.chdir(cwd)
+
+    for failure in failures:
+        print(f'Failed: {failure}')
+    print(f'Links: {args.links}, failures: {len(failures)}')
+    return 0 if not failures else 1
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,80 @@
+"""Generate a synthetic project CSV for benchmarks.
+
+Usage: python benchmarks/synthetic.py output.csv [--links 10000] [--seed 1] [--simple 0.3] [--hubs 0]
+
+Links have random coordinates (sites B are up to ~50 km from sites A), a part of them
+are simple rows (project defaults are used), others are advanced rows which request
+frequency ranges and bandwidths of all tables of devices.db.
+With --hubs N sites A are N hub sites shared by the links (see merge_sites of config.ini).
+"""
+
+import sys
+from argparse import ArgumentParser
+from pathlib import Path
+from random import Random
+
+ROOT = Path(__file__).resolve().parent.parent
+sys.path.insert(0, str(ROOT))
+
+from catalog import load_catalog
+
+
+EXCLUDE = ('', 'none', 'xg1000', 'xg500', 'quanta', 'e5000', 'r5000_pro', 'r5000_lite', 'xg1000 r5000_lite')
+
+
+def get_requirements(db_path):
+    """Return (frequency range, bandwidth, capacities) of all bandwidth tables of the database.
+    Tables with zero bandwidth can't be requested in CSV.
+    """
+
+    catalog = load_catalog(db_path)
+    return [(band, bandwidth, sorted(set(table.capacity) - {0}))
+            for (band, bandwidth), table in sorted(catalog.tables.items()) if int(bandwidth) > 0]
+
+
+def generate_rows(links, seed=1, simple=0.3, db_path=ROOT / 'devices.db', hubs=0):
+    """Yield CSV rows, two per link."""
+
+    rnd = Random(seed)
+    requirements = get_requirements(db_path)
+    hub_sites = [(f'Hub {hub_id}', rnd.uniform(-60, 70), rnd.uniform(-180, 180)) for hub_id in range(hubs)]
+    for link_id in range(links):
+        if hub_sites:
+            name_a, lat_a, lon_a = rnd.choice(hub_sites)
+        else:
+            name_a, lat_a, lon_a = f'Site {link_id} A', rnd.uniform(-60, 70), rnd.uniform(-180, 180)
+        lat_b = lat_a + rnd.uniform(-0.3, 0.3)
+        lon_b = lon_a + rnd.uniform(-0.3, 0.3)
+        site_a = [name_a, f'{lat_a:.10f}', f'{lon_a:.10f}', str(rnd.randint(10, 100))]
+        site_b = [f'Site {link_id} B', f'{lat_b:.10f}', f'{lon_b:.10f}', str(rnd.randint(10, 100))]
+        if rnd.random() >= simple:
+            band, bandwidth, capacities = rnd.choice(requirements)
+            capacity = rnd.choice(capacities) + rnd.randint(-5, 5) if capacities else 1
+            site_a += [band, bandwidth, str(max(capacity, 1)), rnd.choice(('99.90', '99.99')), rnd.choice(EXCLUDE)]
+        yield site_a
+        yield site_b
+
+
+def write_project(path, links, seed=1, simple=0.3, db_path=ROOT / 'devices.db', hubs=0):
+    """Write the synthetic project to a CSV file."""
+
+    with open(path, 'w', newline='') as file:
+        for row in generate_rows(links, seed, simple, db_path, hubs):
+            file.write(','.join(row) + '\n')
+
+
+def main():
+    parser = ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('output', type=Path)
+    parser.add_argument('--links', type=int, default=10000)
+    parser.add_argument('--seed', type=int, default=1)
+    parser.add_argument('--simple', type=float, default=0.3, help='share of simple rows')
+    parser.add_argument('--db', type=Path, default=ROOT / 'devices.db')
+    parser.add_argument('--hubs', type=int, default=0, help='number of hub sites shared by the links')
+    args = parser.parse_args()
+    write_project(args.output, args.links, args.seed, args.simple, args.db, args.hubs)
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,76 @@
+from collections import OrderedDict
+
+
+class RecommendationCache:
+    """LRU cache of recommendations.
+
+    Links are equal for the recommender if they have the same frequency range, bandwidth,
+    capacity, availability, excluded options and distance. The distance can be quantized
+    to `distance_step` km, then all links of a step get the device recommended for the first one.
+    Alternatives hold the weights and the reach of the link they are scored for, so they are cached
+    only for links of the same distance (the distance isn't quantized).
+    Cached results are dropped when another catalog or other weights are used (see bind()).
+    """
+
+    __slots__ = ('size', 'distance_step', 'entries', 'hits', 'misses', 'catalog', 'weights', 'top_k')
+
+    def __init__(self, size=4096, distance_step=0.0):
+        self.size = size
+        self.distance_step = distance_step
+        # key -> device name (or a list of alternatives), the least recently used first
+        self.entries = OrderedDict()
+        self.hits = 0
+        self.misses = 0
+        self.catalog = None
+        self.weights = None
+        self.top_k = 0
+
+    def __len__(self):
+        return len(self.entries)
+
+    def bind(self, catalog, profile, top_k=0):
+        """Use the cache for the catalog and the scoring profile.
+        Cached results are dropped if the catalog or the weights differ from the previous ones,
+        or if lists of top_k alternatives are cached instead of device names (or vice versa).
+        """
+
+        weights = profile.get_key()
+        if catalog is not self.catalog or weights != self.weights or top_k != self.top_k:
+            self.entries.clear()
+            self.catalog = catalog
+            self.weights = weights
+            self.top_k = top_k
+
+    def get_key(self, link, link_dist):
+        """Return the cache key of the link."""
+
+        requirements = link.requirements
+        if self.distance_step > 0 and self.top_k == 0:
+            link_dist = round(link_dist / self.distance_step)
+        return (requirements.band,
+                requirements.bandwidth,
+                requirements.capacity,
+                requirements.availability,
+                requirements.exclude,
+                link_dist)
+
+    def get(self, key):
+        """Return the cached device name or None."""
+
+        name = self.entries.get(key)
+        if name is None:
+            self.misses += 1
+        else:
+            self.hits += 1
+            self.entries.move_to_end(key)
+        return name
+
+    def put(self, key, name):
+        """Save the device name, the least recently used one is evicted if the cache is full."""
+
+        if self.size <= 0:
+            return
+        self.entries[key] = name
+        self.entries.move_to_end(key)
+        if len(self.entries) > self.size:
+            self.entries.popitem(last=False)
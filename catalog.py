@@ -0,0 +1,362 @@
+from array import array
+from bisect import bisect_left
+from json import dumps, loads
+from mmap import ACCESS_READ, mmap
+from os import replace
+from pathlib import Path
+from struct import Struct
+from sys import byteorder
+from zlib import crc32
+
+from records import Equipment
+
+
+AVAILABILITIES = ('99.90', '99.99')
+
+# Binary catalog: header, JSON directory (string table, equipment and array offsets), arrays
+BINARY_MAGIC = b'IWPC'
+BINARY_VERSION = 2
+# magic, version, byte order, CRC32 and size of devices.db, directory size
+BINARY_HEADER = Struct('<4sHHIII')
+BYTE_ORDERS = ('little', 'big')
+
+
+class BandwidthTable:
+    """Devices of one frequency range which support one bandwidth.
+
+    MCS tables are flattened row by row into sequences of `width` items per device
+    (shorter rows are padded). Capacities of all MCS except the highest one are also stored
+    sorted together with their MCS numbers, so the closest MCS is found with a binary search.
+    Rows are sorted by device name.
+    """
+
+    __slots__ = ('band', 'bandwidth', 'names', 'families', 'width', 'mcs_count',
+                 'capacity', 'cap_sorted', 'cap_order', 'distance')
+
+    def __init__(self, band, bandwidth, names, families, width, mcs_count,
+                 capacity, cap_sorted, cap_order, distance):
+        self.band = band
+        self.bandwidth = bandwidth
+        self.names = names
+        self.families = families
+        self.width = width
+        self.mcs_count = mcs_count
+        self.capacity = capacity
+        self.cap_sorted = cap_sorted
+        self.cap_order = cap_order
+        # {'99.90': [...], '99.99': [...]}
+        self.distance = distance
+
+    def __len__(self):
+        return len(self.names)
+
+    def closest_mcs(self, row, req_cap):
+        """Find the MCS which capacity is the closest to the requested one.
+        MCS below the requested capacity are skipped except the highest MCS,
+        it is kept in case the device doesn't satisfy the requirements.
+        Return MCS number and its capacity.
+        """
+
+        start = row * self.width
+        last = start + self.mcs_count[row] - 1
+        cap_last = self.capacity[last]
+        pos = bisect_left(self.cap_sorted, req_cap, start, last)
+        if pos < last and self.cap_sorted[pos] - req_cap <= abs(cap_last - req_cap):
+            return self.cap_order[pos], self.cap_sorted[pos]
+        return self.mcs_count[row] - 1, cap_last
+
+    def mcs_distance(self, row, req_avb, mcs):
+        """Return MCS distance for the particular availability."""
+
+        return self.distance[req_avb][row * self.width + mcs]
+
+    def max_reach(self, req_avb):
+        """Return the longest MCS distance of all devices for the particular availability, km."""
+
+        return max(self.distance[req_avb], default=0.0)
+
+
+class DeviceCatalog:
+    """Read-only index of the device database.
+    Devices are indexed by frequency range and bandwidth (for the recommendations)
+    and by frequency range and name (for the equipment lookup).
+    """
+
+    def __init__(self):
+        # (band, bandwidth) -> BandwidthTable
+        self.tables = {}
+        # (band, name) -> device properties without MCS tables
+        self.equipment = {}
+        # (band, name) -> records.Equipment, created on the first lookup
+        self.records = {}
+        # Binary catalog the tables are mapped from
+        self.binary_path = None
+
+    def __reduce_ex__(self, protocol):
+        # Memory views can't be pickled, a mapped catalog is mapped again by the receiver
+        if self.binary_path is not None:
+            return DeviceCatalog.from_binary, (self.binary_path,)
+        return super().__reduce_ex__(protocol)
+
+    @classmethod
+    def from_documents(cls, bands):
+        """Build the catalog from devices.db documents grouped by frequency range.
+        Raise ValueError if a device has no distance for one of its MCS (see build_table).
+        """
+
+        catalog = cls()
+        for band, devices in bands.items():
+            slices = {}
+            for device in devices:
+                properties = {key: value for key, value in device.items()
+                              if key not in ('Capacity', 'Availability')}
+                catalog.equipment.setdefault((band, device['Name']), properties)
+                for bandwidth in device['Capacity']:
+                    slices.setdefault(bandwidth, []).append(device)
+            for bandwidth, devices_bw in slices.items():
+                catalog.tables[(band, bandwidth)] = build_table(band, bandwidth, devices_bw)
+        return catalog
+
+    @classmethod
+    def from_tinydb(cls, db_path):
+        """Build the catalog from devices.db (TinyDB). Service tables (_name) are skipped."""
+
+        from tinydb import TinyDB
+
+        db = TinyDB(db_path)
+        bands = {name: db.table(name).all() for name in db.tables() if not name.startswith('_')}
+        db.close()
+        return cls.from_documents(bands)
+
+    @classmethod
+    def from_binary(cls, bin_path, source=None):
+        """Map the binary catalog (see write_binary()) into memory.
+        MCS tables are memory views of the file, nothing is copied.
+        If `source` (devices.db content) is given, the catalog must be built from it.
+        Raise ValueError if the file is not a valid catalog.
+        """
+
+        with open(bin_path, 'rb') as file:
+            buffer = mmap(file.fileno(), 0, access=ACCESS_READ)
+        try:
+            dir_size = check_header(buffer, bin_path, source)
+        except ValueError:
+            # An invalid file is not kept mapped, so it can be replaced (Windows doesn't replace mapped files)
+            buffer.close()
+            raise
+
+        view = memoryview(buffer)
+        directory = loads(bytes(view[BINARY_HEADER.size:BINARY_HEADER.size + dir_size]))
+        strings = directory['strings']
+        # Arrays are 8-byte aligned, their offsets are relative to the end of the directory
+        base = BINARY_HEADER.size + dir_size
+        base += -base % 8
+
+        def get_array(offset, length, typecode):
+            offset += base
+            return view[offset:offset + length * array(typecode).itemsize].cast(typecode)
+
+        catalog = cls()
+        catalog.binary_path = Path(bin_path)
+        fields = [strings[item] for item in directory['fields']]
+        for band, *properties in directory['equipment']:
+            values = [None if item < 0 else strings[item] for item in properties]
+            equipment = dict(zip(fields, values))
+            catalog.equipment[(strings[band], equipment['Name'])] = equipment
+        for item in directory['tables']:
+            devices, width = item['devices'], item['width']
+            cells = devices * width
+            table = BandwidthTable(strings[item['band']], strings[item['bandwidth']],
+                                   [strings[i] for i in get_array(item['names'], devices, 'i')],
+                                   [strings[i] for i in get_array(item['families'], devices, 'i')],
+                                   width,
+                                   get_array(item['mcs_count'], devices, 'i'),
+                                   get_array(item['capacity'], cells, 'i'),
+                                   get_array(item['cap_sorted'], cells, 'i'),
+                                   get_array(item['cap_order'], cells, 'i'),
+                                   {req_avb: get_array(offset, cells, 'd')
+                                    for req_avb, offset in item['distance'].items()})
+            catalog.tables[(table.band, table.bandwidth)] = table
+        return catalog
+
+    def get_table(self, band, bandwidth):
+        """Return devices which support the bandwidth or None."""
+
+        return self.tables.get((band, bandwidth))
+
+    def get_equipment(self, band, name):
+        """Return device properties (records.Equipment, without Capacity and Availability).
+        The record is shared by all links of the device, so it must not be modified.
+        """
+
+        record = self.records.get((band, name))
+        if record is None:
+            record = self.records[(band, name)] = Equipment.from_document(self.equipment[(band, name)])
+        return record
+
+
+def check_header(buffer, bin_path, source):
+    """Validate the header of the binary catalog. Return the size of the directory."""
+
+    if len(buffer) < BINARY_HEADER.size:
+        raise ValueError(f'{bin_path} is not a device catalog')
+    magic, version, order, source_crc, source_size, dir_size = BINARY_HEADER.unpack_from(buffer)
+    if magic != BINARY_MAGIC or version != BINARY_VERSION:
+        raise ValueError(f'{bin_path} is not a device catalog of version {BINARY_VERSION}')
+    if BYTE_ORDERS[order] != byteorder:
+        raise ValueError(f'{bin_path} was written on a {BYTE_ORDERS[order]}-endian machine')
+    if source is not None and (source_size, source_crc) != (len(source), crc32(source)):
+        raise ValueError(f'{bin_path} is outdated')
+    return dir_size
+
+
+def build_table(band, bandwidth, devices):
+    """Flatten MCS tables of devices for one bandwidth.
+    Every MCS must have a distance for both availabilities, a missing one can't be scored (ValueError).
+    """
+
+    devices = sorted(devices, key=lambda x: x['Name'])
+    width = max(len(device['Capacity'][bandwidth]) for device in devices)
+    names = []
+    families = []
+    mcs_count = []
+    capacity = []
+    cap_sorted = []
+    cap_order = []
+    distance = {}
+    for device in devices:
+        dev_cap = device['Capacity'][bandwidth]
+        mcs_keys = list(dev_cap)
+        padding = width - len(mcs_keys)
+        names.append(device['Name'])
+        families.append(device['Family'])
+        mcs_count.append(len(mcs_keys))
+        capacity.extend([dev_cap[key] for key in mcs_keys] + [0] * padding)
+        # The highest MCS is handled separately, it is always a candidate
+        modulations = sorted((dev_cap[key], mcs) for mcs, key in enumerate(mcs_keys[:-1]))
+        cap_sorted.extend([cap for cap, mcs in modulations] + [0] * (padding + 1))
+        cap_order.extend([mcs for cap, mcs in modulations] + [0] * (padding + 1))
+        for req_avb in AVAILABILITIES:
+            dev_dist = device['Availability'].get(req_avb, {}).get(bandwidth, {})
+            missing = [key for key in mcs_keys if dev_dist.get(key) is None]
+            if missing:
+                raise ValueError(f'Device \'{device["Name"]}\' has no distance of {", ".join(missing)} '
+                                 f'for {bandwidth} MHz and {req_avb}% availability.')
+            distance.setdefault(req_avb, []).extend([dev_dist[key] for key in mcs_keys] + [0.0] * padding)
+
+    return BandwidthTable(band, bandwidth, names, families, width, mcs_count,
+                          capacity, cap_sorted, cap_order, distance)
+
+
+def get_binary_path(db_path, source):
+    """Return the path of the binary catalog of devices.db with the content `source`: devices.<CRC32>.bin.
+    Every version of the database has its own file, so a catalog mapped by a running process
+    is never replaced (Windows doesn't replace or remove mapped files).
+    """
+
+    db_path = Path(db_path)
+    return db_path.with_name(f'{db_path.stem}.{crc32(source):08x}.bin')
+
+
+def remove_stale_binaries(db_path, bin_path):
+    """Remove binary catalogs of other versions of devices.db (and devices.bin of earlier versions).
+    Files mapped by running processes can't be removed on Windows, they are removed next time.
+    """
+
+    db_path = Path(db_path)
+    for path in [db_path.with_suffix('.bin'), *db_path.parent.glob(f'{db_path.stem}.*.bin')]:
+        if path != bin_path and path.is_file():
+            try:
+                path.unlink()
+            except OSError:
+                pass
+
+
+def write_binary(catalog, bin_path, source):
+    """Save the catalog in the binary format.
+    `source` is the content of devices.db the catalog is built from, it is used
+    to detect outdated files. The file is replaced atomically, the temporary file is removed if it fails.
+    """
+
+    strings = {}
+    data = bytearray()
+
+    def intern(value):
+        return -1 if value is None else strings.setdefault(value, len(strings))
+
+    def add_array(typecode, values):
+        data.extend(bytes(-len(data) % 8))
+        offset = len(data)
+        data.extend(array(typecode, values).tobytes())
+        return offset
+
+    fields = list(next(iter(catalog.equipment.values()), {}))
+    equipment = [[intern(band)] + [intern(properties.get(field)) for field in fields]
+                 for (band, name), properties in catalog.equipment.items()]
+    tables = []
+    for table in catalog.tables.values():
+        tables.append({'band': intern(table.band),
+                       'bandwidth': intern(table.bandwidth),
+                       'devices': len(table),
+                       'width': table.width,
+                       'names': add_array('i', [intern(name) for name in table.names]),
+                       'families': add_array('i', [intern(family) for family in table.families]),
+                       'mcs_count': add_array('i', table.mcs_count),
+                       'capacity': add_array('i', table.capacity),
+                       'cap_sorted': add_array('i', table.cap_sorted),
+                       'cap_order': add_array('i', table.cap_order),
+                       'distance': {req_avb: add_array('d', values) for req_avb, values in table.distance.items()}})
+    directory = {'fields': [intern(field) for field in fields], 'equipment': equipment, 'tables': tables}
+    directory['strings'] = list(strings)
+    directory = dumps(directory, separators=(',', ':')).encode('utf-8')
+
+    bin_path = Path(bin_path)
+    tmp_path = bin_path.with_name(f'{bin_path.name}.tmp')
+    try:
+        with open(tmp_path, 'wb') as file:
+            file.write(BINARY_HEADER.pack(BINARY_MAGIC, BINARY_VERSION, BYTE_ORDERS.index(byteorder),
+                                          crc32(source), len(source), len(directory)))
+            file.write(directory)
+            file.write(bytes(-file.tell() % 8))
+            file.write(data)
+        replace(tmp_path, bin_path)
+    except OSError:
+        tmp_path.unlink(missing_ok=True)
+        raise
+
+
+def load_catalog(db_path):
+    """Return the catalog for devices.db.
+    The catalog is built once and reused until the database file changes.
+    The binary catalog (see get_binary_path) is mapped if it matches the database,
+    otherwise the catalog is built from JSON and the binary catalog is saved for the next start.
+    """
+
+    db_path = Path(db_path)
+    stat = db_path.stat() if db_path.is_file() else None
+    stamp = (stat.st_mtime_ns, stat.st_size) if stat is not None else None
+    key = db_path.resolve()
+    cached = _catalogs.get(key)
+    if cached is not None and cached[0] == stamp:
+        return cached[1]
+    if stat is None:
+        catalog = DeviceCatalog.from_tinydb(db_path)
+    else:
+        source = db_path.read_bytes()
+        bin_path = get_binary_path(db_path, source)
+        try:
+            catalog = DeviceCatalog.from_binary(bin_path, source)
+        except (OSError, ValueError):
+            catalog = DeviceCatalog.from_tinydb(db_path)
+            try:
+                write_binary(catalog, bin_path, source)
+            except OSError:
+                pass
+            else:
+                remove_stale_binaries(db_path, bin_path)
+    _catalogs[key] = (stamp, catalog)
+    return catalog
+
+
+# Catalogs built during this session: path -> (file stamp, catalog)
+_catalogs = {}
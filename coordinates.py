@@ -0,0 +1,88 @@
+from re import compile, VERBOSE
+
+
+# An unsigned number as float() reads it: 41, 41.40338, 41. or .40338
+NUMBER = r'(?:\d+(?:\.\d*)?|\.\d+)'
+# Degrees, minutes and seconds with optional marks, the sign or the hemisphere letter before or after:
+# 41°24'12.2"N, 41 24 12.2 N, 41°24.2028', 41 24.2028, 41.40338, -41.40338, +.5, S 41.40338
+COORDINATE = compile(rf'''
+    \s*(?P<prefix>[NSEW])?
+    \s*(?P<sign>[+-])?
+    \s*(?P<degrees>{NUMBER})\s*(?:°|º|:)?
+    (?:\s*(?P<minutes>{NUMBER})\s*(?:'|′|’|:)?
+    (?:\s*(?P<seconds>{NUMBER})\s*(?:"|″|”|'')?)?)?
+    \s*(?P<suffix>[NSEW])?\s*$''', VERBOSE)
+# Decimal degrees are parsed without COORDINATE and written to the KMZ as they are
+DECIMAL = compile(rf'[+-]?{NUMBER}')
+HEMISPHERES = {'latitude': 'NS', 'longitude': 'EW'}
+# Parsed coordinates kept per axis, the cache is cleared when it is full
+CACHE_SIZE = 262144
+
+
+def parse_coordinate(text, axis='latitude'):
+    """Convert a coordinate (DMS, DMM or DD, see COORDINATE) into decimal degrees.
+    axis is latitude or longitude, it gives the hemisphere letters and the range (see check_range).
+    Return the value and its text for the KMZ: decimal input is kept as it is, other forms are
+    written as decimal degrees. An empty coordinate is 0. Raise ValueError if the coordinate is invalid.
+    """
+
+    hemispheres = HEMISPHERES[axis]
+    if DECIMAL.fullmatch(text) is not None:
+        # Decimal degrees, the most common form
+        return check_range(float(text), text, axis), text
+    if text.strip() == '':
+        return 0.0, text
+    match = COORDINATE.match(text.upper())
+    if match is None:
+        raise ValueError(f'{axis.capitalize()} \'{text}\' is not a coordinate. '
+                         f'Appropriate formats are DMS (41°24\'12.2"N), DMM (41 24.2028) and DD (41.40338).')
+    prefix, sign, deg, minutes, seconds, suffix = match.group('prefix', 'sign', 'degrees', 'minutes', 'seconds',
+                                                              'suffix')
+    hemisphere = prefix or suffix
+    if (prefix and suffix) or (hemisphere and sign) or (hemisphere and hemisphere not in hemispheres):
+        raise ValueError(f'{axis.capitalize()} \'{text}\' must have either a sign or one of the hemispheres '
+                         f'{" or ".join(hemispheres)}.')
+    # Only the last part can be fractional, minutes and seconds are below 60
+    parts = [part for part in (deg, minutes, seconds) if part is not None]
+    if any('.' in part for part in parts[:-1]) or any(float(part) >= 60 for part in parts[1:]):
+        raise ValueError(f'{axis.capitalize()} \'{text}\' is not a coordinate: minutes and seconds must be below 60 '
+                         f'and only the last part can be fractional.')
+    value = sum(float(part) / 60 ** power for power, part in enumerate(parts))
+    if sign == '-' or hemisphere in ('S', 'W'):
+        value = -value
+    value = check_range(value, text, axis)
+    return value, f'{value:.10f}'
+
+
+def check_range(value, text, axis):
+    """Return the coordinate within the range of the axis.
+    Latitude beyond the poles is invalid, longitude is wrapped to [-180; 180] (like geopy.point.Point does).
+    """
+
+    if axis == 'longitude':
+        return value if -180 <= value <= 180 else (value + 180) % 360 - 180
+    if not -90 <= value <= 90:
+        raise ValueError(f'Latitude must be in the [-90; 90] range: {text}.')
+    return value
+
+
+class CoordinateCache(dict):
+    """Parsed coordinates of one axis by their text: cache[text] is parse_coordinate(text, axis).
+    Every unique string is parsed once (hubs repeat in every link), a known one costs a dict lookup.
+    """
+
+    __slots__ = ('axis',)
+
+    def __init__(self, axis):
+        super().__init__()
+        self.axis = axis
+
+    def __missing__(self, text):
+        if len(self) >= CACHE_SIZE:
+            self.clear()
+        result = self[text] = parse_coordinate(text, self.axis)
+        return result
+
+
+LATITUDES = CoordinateCache('latitude')
+LONGITUDES = CoordinateCache('longitude')
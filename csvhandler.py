@@ -1,216 +1,478 @@
-from collections import Counter, OrderedDict
+from argparse import ArgumentParser
+from collections import Counter, OrderedDict, deque
 from configparser import ConfigParser
-from copy import deepcopy
-from csv import reader
+from csv import reader, writer as csv_writer
 from datetime import datetime
-from geopy import point as gepoint
-from geopy import distance as gedistance
+from heapq import nsmallest
+from io import TextIOWrapper
 from json import dumps
 from logging import getLogger, StreamHandler, FileHandler, Formatter
+from operator import itemgetter
 from pathlib import Path
 from random import randint
-from re import compile
-from tinydb import TinyDB, Query
-from zipfile import ZipFile
-from xml.etree import ElementTree
+from shutil import copyfileobj
+from tempfile import SpooledTemporaryFile
+from time import perf_counter
+from zipfile import ZipFile, ZipInfo
+
+from cache import RecommendationCache
+from catalog import load_catalog
+from coordinates import LATITUDES, LONGITUDES
+from progress import NULL_PROGRESS
+from reachindex import ReachIndex
+from records import Link, Requirements, Site
+from report import NULL_REPORT, RunReport
+from scoring import EXCLUDE_BITS, ScoringProfile
+from siteregistry import SiteRegistry
+
+
+# Links scored at once by the streaming pipeline
+CHUNK_SIZE = 1024
+# sitesArray is kept in memory up to this size (bytes), then it is moved to a temporary file
+SPOOL_SIZE = 1048576
+# Frequency range -> start and end of frequencies and the band of a linksArray item
+BANDS = {'3': (2990, 4010, 3000),
+         '4': (3990, 5010, 4000),
+         '5': (4850, 6050, 5000),
+         '6': (6000, 6425, 6000),
+         '28': (28000, 29000, 28000),
+         '70': (70500, 76000, 70500)}
+# Keyword of excluded options (req_exclude) -> exclude option (see scoring.EXCLUDE_OPTIONS).
+# 'quanta' has never excluded Quanta (the parsed option was misspelled), so it isn't a keyword
+EXCLUDE_KEYWORDS = {'xg1000': 'XG 1000',
+                    'xg500': 'XG 500',
+                    'e5000': 'E5000',
+                    'r5000_pro': 'R5000 Pro',
+                    'r5000_lite': 'R5000 Lite'}
+# Parsed requirements are kept up to this number of distinct rows, then they are parsed again
+REQUIREMENTS_CACHE_SIZE = 4096
+# Requirement caches are kept for this number of configs (see get_requirement_cache)
+REQUIREMENT_CONFIGS = 8
+
+
+def read_config(config_path=None):
+    """Read the config (config.ini in the working directory by default) without activating it."""
+
+    new_config = ConfigParser(comment_prefixes='/', allow_no_value=True)
+    new_config.read(Path('config.ini') if config_path is None else config_path)
+    return new_config
+
+
+def load_config(config_path=None):
+    """Read the config and make it active."""
+
+    return set_config(read_config(config_path))
+
+
+def set_config(new_config):
+    """Replace the active config (e.g. after config.ini has been changed).
+    Runs which have taken the previous config (see handle) finish with it: requirements are cached
+    per config (see get_requirement_cache), so its defaults are never mixed with the new ones.
+    """
 
+    global config
+    config = new_config
+    return config
+
+
+def get_config():
+    """Return the config, it is read on the first call."""
+
+    if config is None:
+        return load_config()
+    return config
+
+
+def setup_logging(console_level='DEBUG'):
+    """Log to the console and to Logs/<date>.log in the working directory.
+    It is done once, on the first run, so importing the module doesn't touch the file system.
+    """
+
+    if len(logger.handlers) != 0:
+        return
+    logger.setLevel(level='DEBUG')
+
+    # Create path and filenames
+    log_path = Path.cwd() / 'Logs'
+    if Path.is_dir(log_path) is False:
+        Path.mkdir(log_path)
+    log = log_path / f'{datetime.today().strftime("%Y_%m_%d")}.log'
+
+    # Create handlers
+    console_handler = StreamHandler()
+    file_handler = FileHandler(log)
+    console_handler.setLevel(level=console_level)
+    file_handler.setLevel(level='INFO')
+
+    # Create formatter and add it to handlers
+    form = '%(asctime)s - %(levelname)s - %(pathname)s - %(message)s'
+    formatter = Formatter(fmt=form, datefmt='%d-%b-%y %H:%M:%S')
+    console_handler.setFormatter(formatter)
+    file_handler.setFormatter(formatter)
+
+    # Add handlers to the logger
+    logger.addHandler(console_handler)
+    logger.addHandler(file_handler)
+
+
+def iter_csv(file_path):
+    """Read *.CSV file row by row, empty rows are skipped."""
+
+    for row_number, row in iter_numbered_csv(file_path):
+        yield row
 
-def read_csv(file_path):
-    """Opens *.CSV file. Expects even amount of sites."""
+
+def iter_numbered_csv(file_path):
+    """Read *.CSV file row by row like iter_csv. Yield the row number (the line in the file) and the row."""
 
     logger.info(f'Open CSV file: {file_path}')
     with open(file_path, mode='r') as file:
-        csv_reader = list(reader(file, delimiter=','))
-        csv_reader = list(filter(lambda x: len(x) != 0, csv_reader))
-        if len(csv_reader) % 2 != 0:
-            raise ValueError(f'{file_path} doesn\'t contains even number of rows.')
-        else:
-            return csv_reader
+        csv_reader = reader(file, delimiter=',')
+        for row in csv_reader:
+            if len(row) != 0:
+                yield csv_reader.line_num, row
+
+
+def count_links(file_path):
+    """Return the number of links of a CSV file (half of non-empty rows)."""
+
+    with open(file_path, mode='r') as file:
+        return sum(1 for row in reader(file, delimiter=',') if len(row) != 0) // 2
+
+
+def read_csv(file_path):
+    """Opens *.CSV file. Expects even amount of sites."""
+
+    csv_reader = list(iter_csv(file_path))
+    if len(csv_reader) % 2 != 0:
+        raise ValueError(f'{file_path} doesn\'t contains even number of rows.')
+    else:
+        return csv_reader
+
+
+def check_req_freq(req_freq):
+    """Check what this frequency range is supported."""
+
+    if req_freq in ['3', '4', '5', '6', '28', '70']:
+        return req_freq
+    else:
+        raise ValueError(f'The requested frequency range cannot be {req_freq}. '
+                         f'Appropriate values are 3, 4, 5, 6, 28, 70.')
+
+
+def check_req_bw(req_bw):
+    """Check what this bandwidth is supported (cannot be zero)."""
+
+    if int(req_bw) > 0:
+        return req_bw
+    else:
+        raise ValueError(f'The requested bandwidth cannot be {req_bw}. '
+                         f'Appropriate value must be greater than zero.')
+
+
+def check_req_cap(req_cap):
+    """Check what this capacity is supported (cannot be zero)."""
+
+    if int(req_cap) > 0:
+        return int(req_cap)
+    else:
+        raise ValueError(f'The requested capacity  cannot be {req_cap}. '
+                         f'Appropriate value must be greater than zero.')
+
+
+def check_req_avb(req_avb):
+    """Check what this availability range is supported."""
+
+    if req_avb in ['99.90', '99.99']:
+        return req_avb
+    else:
+        raise ValueError(f'The requested availability cannot be {req_avb}. '
+                         f'Appropriate value is either 99.90 or 99.99 %.')
+
+
+def check_req_exclude(req_exclude):
+    """Parse excluded options into a bitmask of families (see scoring.EXCLUDE_BITS)."""
+
+    req_exclude = req_exclude.lower()
+    result = 0
+    for keyword, option in EXCLUDE_KEYWORDS.items():
+        if keyword in req_exclude:
+            result |= EXCLUDE_BITS[option]
+    return result
+
+
+# [Project] options of the requirements and their checks, in the order of CSV columns
+REQUIREMENT_OPTIONS = (('req_freq', check_req_freq),
+                       ('req_bw', check_req_bw),
+                       ('req_cap', check_req_cap),
+                       ('req_avb', check_req_avb),
+                       ('req_exclude', check_req_exclude))
+
+
+class RequirementCache:
+    """Checked project defaults and parsed requirements of one config (see get_requirements).
+    The cache never outlives its config, so values of another config can't get into it.
+    """
+
+    __slots__ = ('config', 'defaults', 'parsed', 'interned')
+
+    def __init__(self, req_config):
+        self.config = req_config
+        # [Project] option -> checked value (see get_default)
+        self.defaults = {}
+        # Requirements by CSV columns and interned requirements by their values
+        self.parsed = {}
+        self.interned = {}
+
+
+def get_requirement_cache(req_config):
+    """Return the requirement cache of the config.
+    Caches are kept for the last REQUIREMENT_CONFIGS configs, a cache keeps its config alive,
+    so its id isn't reused while the cache exists.
+    """
+
+    cache = requirement_caches.get(id(req_config))
+    if cache is None:
+        if len(requirement_caches) >= REQUIREMENT_CONFIGS:
+            requirement_caches.clear()
+        cache = requirement_caches[id(req_config)] = RequirementCache(req_config)
+    return cache
+
+
+def get_default(option, check, req_config=None):
+    """Return the checked value of a requirement from project defaults of the config (the active one
+    by default), it is checked once per config.
+    """
+
+    cache = get_requirement_cache(get_config() if req_config is None else req_config)
+    value = cache.defaults.get(option)
+    if value is None:
+        value = cache.defaults[option] = check(cache.config.get('Project', option))
+    return value
+
+
+def get_requirements(site, req_config=None):
+    """Return the requirements of a link which first site is the CSV row (see create_links).
+    Empty columns are taken from project defaults of the config (the active one by default).
+    Requirements are interned: rows with the same requirements share one record (records.Requirements),
+    columns of a row are parsed once per distinct combination.
+    """
+
+    """
+    If there are only 4 options in CSV, other values will be got from project defaults.
+    Otherwise, parse them from CSV.
+    """
+
+    if len(site) == 4:
+        columns = ('', '', '', '', '')
+    elif len(site) == 9:
+        columns = tuple(site[4:])
+    else:
+        raise ValueError(f'Site \'{site[0]}\' must contain either 4 or 9 parameters.')
+
+    cache = get_requirement_cache(get_config() if req_config is None else req_config)
+    requirements = cache.parsed.get(columns)
+    if requirements is None:
+        values = tuple(get_default(option, check, cache.config) if column == '' else check(column)
+                       for column, (option, check) in zip(columns, REQUIREMENT_OPTIONS))
+        if len(cache.parsed) >= REQUIREMENTS_CACHE_SIZE:
+            cache.parsed.clear()
+            cache.interned.clear()
+        requirements = cache.interned.get(values)
+        if requirements is None:
+            requirements = cache.interned[values] = Requirements(*values)
+        cache.parsed[columns] = requirements
+    return requirements
+
+
+def get_site(site, row_number=None):
+    """Return the site (records.Site) of a CSV row.
+    Coordinates (DMS, DMM or DD) are parsed once per unique string (see coordinates.CoordinateCache):
+    coordinates keeps the numbers for distances, latitude and longitude keep decimal degrees for the KMZ.
+    Errors mention the row number if it is given.
+    """
+
+    try:
+        latitude, latitude_text = LATITUDES[site[1]]
+        longitude, longitude_text = LONGITUDES[site[2]]
+    except ValueError as error_msg:
+        site_name = f'Row {row_number}, site' if row_number is not None else 'Site'
+        raise ValueError(f'{site_name} \'{site[0]}\'. {error_msg}') from None
+    return Site(site[0], latitude_text, longitude_text, site[3], (latitude, longitude))
+
+
+def create_link(site_a, site_b, row_a=None, row_b=None, req_config=None):
+    """Combine two sites into a link, row_a and row_b are their row numbers (for errors).
+    Defaults of the requirements are taken from the config (see get_requirements).
+    Return the link name and the link (see create_links).
+    """
+
+    link = Link(get_site(site_a, row_a), get_site(site_b, row_b), get_requirements(site_a, req_config))
+
+    return link.name, link
+
+
+def iter_links(sites, report=NULL_REPORT, req_config=None):
+    """Combine sites into links on the fly, sites are (row number, row) pairs (see iter_numbered_csv).
+    An even row is the first site, an odd row is the second site. Defaults of the requirements are taken
+    from the config (the active one by default).
+    Yield the link name and the link (records.Link). Invalid links are logged, counted and skipped,
+    a site without a pair is reported at the end of the stream.
+    """
+
+    site_a = None
+    for row_number, site in sites:
+        if site_a is None:
+            row_a, site_a = row_number, site
+            continue
+        try:
+            yield create_link(site_a, site, row_a, row_number, req_config)
+        except ValueError as error_msg:
+            logger.exception(f'{error_msg}', exc_info=False)
+            report.count('rejected_links')
+        site_a = None
+    if site_a is not None:
+        logger.error(f'Row {row_a}, site \'{site_a[0]}\' has no pair. CSV must contain an even number of rows.')
 
 
 def create_links(sites):
     """Combine sites into links.
-    Return a dictonary contains all links and their properties
+    Return a dictonary contains all links (see records.Link) by their names.
     For example:
-    {'Link name':
-        {'Site A': {'Name': 'Home', 'Latitude': '59.6070142792', 'Longitude': '60.5717699289', 'Height': '60'},
-         'Site B': {'Name': 'Damm', 'Latitude': '59.597915334', 'Longitude': '60.3832959195', 'Height': '60'},
-         'Requirements':
-             {'Frequency range': '5',
-              'Bandwidth': '40',
-              'Capacity': 1100,
-              'Availability': '99.99',
-              'Exclude':
-                  {'xg1000': False, 'xg500': False, 'quanta': False,
-                   'e5000': False, 'r5000_pro': False, 'r5000_lite': False}}}
-    """
-
-    def check_req_freq(req_freq):
-        """Check what this frequency range is supported."""
-
-        if req_freq in ['3', '4', '5', '6', '28', '70']:
-            return req_freq
-        else:
-            raise ValueError(f'The requested frequency range cannot be {req_freq}. '
-                             f'Appropriate values are 3, 4, 5, 6, 28, 70.')
+    {'From Home to Damm':
+        Link(site_a=Site('Home', '59.6070142792', '60.5717699289', '60'),
+             site_b=Site('Damm', '59.597915334', '60.3832959195', '60'),
+             requirements=Requirements('5', '40', 1100, '99.99', 0))}
+    The JSON of InfiPLANNER is made of the link only when the project is written (see prepare_project).
+    """
 
-    def check_req_bw(req_bw):
-        """Check what this bandwidth is supported (cannot be zero)."""
+    return dict(iter_links(enumerate(sites, 1)))
 
-        if int(req_bw) > 0:
-            return req_bw
-        else:
-            raise ValueError(f'The requested bandwidth cannot be {req_bw}. '
-                             f'Appropriate value must be greater than zero.')
 
-    def check_req_cap(req_cap):
-        """Check what this capacity is supported (cannot be zero)."""
+def iter_planned_links(sites, catalog, neighbours=0, report=NULL_REPORT, req_config=None):
+    """Propose links for a list of unpaired sites: (row number, row) pairs, every row is a site
+    (see get_requirements).
+    Sites are paired if they are closer than the longest distance any device of the requested frequency range
+    and bandwidth reaches with the requested availability (see linkplanner.iter_site_pairs),
+    a link takes the requirements of the site which is listed first (defaults are taken from the config,
+    the active one by default). If neighbours is positive,
+    only links to the nearest sites are proposed. Invalid sites are logged and skipped.
+    Yield the link name and the link (like iter_links), distances are already calculated.
+    """
 
-        if int(req_cap) > 0:
-            return int(req_cap)
-        else:
-            raise ValueError(f'The requested capacity  cannot be {req_cap}. '
-                             f'Appropriate value must be greater than zero.')
+    from linkplanner import iter_site_pairs
+
+    site_props = []
+    site_reqs = []
+    coordinates = []
+    reaches = []
+    # (frequency range, bandwidth, availability) -> the longest reach of devices
+    max_reach = {}
+    for row_number, site in sites:
+        try:
+            requirements = get_requirements(site, req_config)
+            site_prop = get_site(site, row_number)
+        except ValueError as error_msg:
+            logger.exception(f'{error_msg}', exc_info=False)
+            report.count('rejected_sites')
+            continue
+        coordinates.append(site_prop.coordinates)
+        key = (requirements.band, requirements.bandwidth, requirements.availability)
+        if key not in max_reach:
+            table = catalog.get_table(key[0], key[1])
+            max_reach[key] = table.max_reach(key[2]) if table is not None else 0.0
+        site_props.append(site_prop)
+        site_reqs.append(requirements)
+        reaches.append(max_reach[key])
+    report.count('sites', len(site_props))
+    if len(site_props) == 0:
+        return
+
+    latitudes, longitudes = zip(*coordinates)
+    for site_a, site_b, distance in iter_site_pairs(latitudes, longitudes, reaches, neighbours):
+        # Links of a site share its record and requirements, they are never modified
+        link = Link(site_props[site_a], site_props[site_b], site_reqs[site_a], distance)
+        yield link.name, link
+
+
+def set_distances(links):
+    """Calculate distances of all links at once (geodesy.link_distances).
+    The result is stored in link.distance.
+    """
 
-    def check_req_avb(req_avb):
-        """Check what this availability range is supported."""
+    # NumPy is imported only when distances are calculated
+    import numpy as np
+    from geodesy import link_distances
 
-        if req_avb in ['99.90', '99.99']:
-            return req_avb
-        else:
-            raise ValueError(f'The requested availability cannot be {req_avb}. '
-                             f'Appropriate value is either 99.90 or 99.99 %.')
-
-    def check_req_exclude(req_exclude):
-        """Parse excluded options."""
-
-        result = {'XG 1000': False,
-                  'XG 500': False,
-                  'Quanta': False,
-                  'E5000': False,
-                  'R5000 Pro': False,
-                  'R5000 Lite': False}
-        pattern_xg1000 = compile(r'(xg1000)')
-        pattern_xg500 = compile(r'(xg500)')
-        pattern_quanta = compile(r'(quanta)')
-        pattern_e5000 = compile(r'(e5000)')
-        pattern_r5000_pro = compile(r'(r5000_pro)')
-        pattern_r5000_lite = compile(r'(r5000_lite)')
-        if pattern_xg1000.search(req_exclude.lower()) is not None:
-            result['XG 1000'] = True
-        if pattern_xg500.search(req_exclude.lower()) is not None:
-            result['XG 500'] = True
-        if pattern_quanta.search(req_exclude.lower()) is not None:
-            result['Quanta '] = True
-        if pattern_e5000.search(req_exclude.lower()) is not None:
-            result['E5000'] = True
-        if pattern_r5000_pro.search(req_exclude.lower()) is not None:
-            result['R5000 Pro'] = True
-        if pattern_r5000_lite.search(req_exclude.lower()) is not None:
-            result['R5000 Lite'] = True
-        return result
-
-    links = {}
-    link = {'Site A': {}, 'Site B': {}, 'Requirements': {}}
-    # An even row is the first site, an odd row is the second site
-    sites_even = sites[::2]
-    sites_odd = sites[1::2]
-    for link_id in range(len(sites_even)):
-        name = f'From {sites_even[link_id][0]} to {sites_odd[link_id][0]}'
-        links[name] = deepcopy(link)
-        links[name]['Site A']['Name'] = sites_even[link_id][0]
-        links[name]['Site A']['Latitude'] = sites_even[link_id][1]
-        links[name]['Site A']['Longitude'] = sites_even[link_id][2]
-        links[name]['Site A']['Height'] = sites_even[link_id][3]
-        links[name]['Site B']['Name'] = sites_odd[link_id][0]
-        links[name]['Site B']['Latitude'] = sites_odd[link_id][1]
-        links[name]['Site B']['Longitude'] = sites_odd[link_id][2]
-        links[name]['Site B']['Height'] = sites_odd[link_id][3]
+    if len(links) == 0:
+        return
+    coordinates = [link.site_a.coordinates + link.site_b.coordinates for link in links]
+    lat_a, lon_a, lat_b, lon_b = np.array(coordinates, dtype=np.float64).T
+    for link, link_dist in zip(links, link_distances(lat_a, lon_a, lat_b, lon_b).tolist()):
+        link.distance = link_dist
 
-        """
-        If there are only 4 options in CSV, other values will be got from project defaults.
-        Otherwise, parse them from CSV.
-        """
 
-        if len(sites_even[link_id]) == 4:
-            links[name]['Requirements']['Frequency range'] = check_req_freq(config.get('Project', 'req_freq'))
-            links[name]['Requirements']['Bandwidth'] = check_req_bw(config.get('Project', 'req_bw'))
-            links[name]['Requirements']['Capacity'] = check_req_cap(config.get('Project', 'req_cap'))
-            links[name]['Requirements']['Availability'] = check_req_avb(config.get('Project', 'req_avb'))
-            links[name]['Requirements']['Exclude'] = check_req_exclude(config.get('Project', 'req_exclude'))
-        elif len(sites_even[link_id]) == 9:
-            if sites_even[link_id][4] == '':
-                links[name]['Requirements']['Frequency range'] = check_req_freq(config.get('Project', 'req_freq'))
-            else:
-                links[name]['Requirements']['Frequency range'] = check_req_freq(sites_even[link_id][4])
+def get_distance(link):
+    """Return the link distance in km."""
 
-            if sites_even[link_id][5] == '':
-                links[name]['Requirements']['Bandwidth'] = check_req_bw(config.get('Project', 'req_bw'))
-            else:
-                links[name]['Requirements']['Bandwidth'] = check_req_bw(sites_even[link_id][5])
+    if link.distance is not None:
+        return link.distance
+    from geopy import distance as gedistance
+    from geopy import point as gepoint
+    lat_a, lon_a = link.site_a.coordinates
+    lat_b, lon_b = link.site_b.coordinates
+    point_a = gepoint.Point(latitude=lat_a, longitude=lon_a)
+    point_b = gepoint.Point(latitude=lat_b, longitude=lon_b)
+    return round(gedistance.distance(point_a, point_b).km, 2)
 
-            if sites_even[link_id][6] == '':
-                links[name]['Requirements']['Capacity'] = check_req_cap(config.get('Project', 'req_cap'))
-            else:
-                links[name]['Requirements']['Capacity'] = check_req_cap(sites_even[link_id][6])
 
-            if sites_even[link_id][7] == '':
-                links[name]['Requirements']['Availability'] = check_req_avb(config.get('Project', 'req_avb'))
-            else:
-                links[name]['Requirements']['Availability'] = check_req_avb(sites_even[link_id][7])
+def get_profile():
+    """Return the active scoring profile, it is resolved from the config on the first call."""
 
-            if sites_even[link_id][8] == '':
-                links[name]['Requirements']['Exclude'] = check_req_exclude(config.get('Project', 'req_exclude'))
-            else:
-                links[name]['Requirements']['Exclude'] = check_req_exclude(sites_even[link_id][8])
-        else:
-            raise ValueError(f'Site \'{sites_even[link_id][0]}\' must contain either 4 or 9 parameters.')
+    global active_profile
+    if active_profile is None:
+        active_profile = ScoringProfile.from_config(get_config())
+    return active_profile
 
-    return links
 
+def set_profile(new_profile):
+    """Replace the active scoring profile (e.g. after the settings have been changed)."""
 
-def get_recommendations(link, table):
-    """Select the best option for the requested throughput among all products.
-    Return the most suitable device option.
+    global active_profile
+    active_profile = new_profile
+
+
+def iter_candidates(link, catalog, profile):
+    """Score all products which support the requested bandwidth.
+    Yield (weight, name, weight_cap, weight_dist, weight_excl, family, MCS, MCS capacity, MCS distance).
     """
 
-    link_req_bw = link['Requirements']['Bandwidth']
-    link_req_cap = int(link['Requirements']['Capacity'])
-    link_req_avb = link['Requirements']['Availability']
-    link_excl_xg1000 = link['Requirements']['Exclude']['XG 1000']
-    link_excl_xg500 = link['Requirements']['Exclude']['XG 500']
-    link_excl_quanta = link['Requirements']['Exclude']['Quanta']
-    link_excl_e5000 = link['Requirements']['Exclude']['E5000']
-    link_excl_r5000_pro = link['Requirements']['Exclude']['R5000 Pro']
-    link_excl_r5000_lite = link['Requirements']['Exclude']['R5000 Lite']
-
-    point_a = gepoint.Point(latitude=link['Site A']['Latitude'], longitude=link['Site A']['Longitude'])
-    point_b = gepoint.Point(latitude=link['Site B']['Latitude'], longitude=link['Site B']['Longitude'])
-    link_dist = round(gedistance.distance(point_a, point_b).km, 2)
-
-    candidates = []
-    for device in table:
-        # Find relations between MCS and Throughput for the particular bandwidth and packs them to dev_modulations
-        dev_cap = device['Capacity'].get(link_req_bw)
-        if dev_cap is None:
-            logger.debug(f'Link \'From {link["Site A"]["Name"]} to {link["Site B"]["Name"]}\'. '
-                         f'{device["Model"]} doesn\'t support the requested bandwidth ({link_req_bw}).')
-            continue
-        dev_modulations = list(dev_cap.items())
-        """
-        If MCS doesn't satisfy the requested capacity need to filter it 
-        but if there are no suitable MCSes at all 
-        then it is needed to save the highest MCS in case no devices will be suitable.
-        """
-        dev_modulations = list(filter(lambda x: x[1] >= link_req_cap, dev_modulations[:-1])) + [dev_modulations[-1]]
+    requirements = link.requirements
+    link_req_freq = requirements.band
+    link_req_bw = requirements.bandwidth
+    link_req_cap = requirements.capacity
+    link_req_avb = requirements.availability
+    link_excl = requirements.exclude
+
+    link_dist = get_distance(link)
+
+    # Only devices which support the requested bandwidth are indexed
+    table = catalog.get_table(link_req_freq, link_req_bw)
+    if table is None:
+        logger.debug(f'Link \'{link.name}\'. '
+                     f'No devices support the requested bandwidth ({link_req_bw}).')
+        table = ()
+    for row in range(len(table)):
         """
         Find the closest MCS to the requested capacity. 
-        It will be the highest MCS if the device doesn't satisfy the requirements.
+        If MCS doesn't satisfy the requested capacity it is skipped
+        but if there are no suitable MCSes at all 
+        then it will be the highest MCS in case no devices will be suitable.
         """
-        dev_mcs_clst = min(dev_modulations, key=lambda x: abs(x[1] - link_req_cap))
+        dev_mcs_clst = table.closest_mcs(row, link_req_cap)
         # Find relations between MCS and Distance for the particular availability
-        dev_avb = device['Availability'].get(link_req_avb).get(link_req_bw)
-        dev_mcs_dist = dev_avb.get(dev_mcs_clst[0])
+        dev_mcs_dist = table.mcs_distance(row, link_req_avb, dev_mcs_clst[0])
+        dev_family = table.families[row]
 
         """
         Calculate weights (the less the better).
@@ -249,27 +511,8 @@ def get_recommendations(link, table):
         
         As a result, it is calculated how the final weight.
         """
-        if device['Family'] == 'InfiLINK XG 1000':
-            weight_cost = int(config.get('Settings', 'weight_xg1000'))
-            weight_excl = int(config.get('Settings', 'weight_exclude')) if link_excl_xg1000 else 0
-        elif device['Family'] == 'InfiLINK XG 500':
-            weight_cost = int(config.get('Settings', 'weight_xg500'))
-            weight_excl = int(config.get('Settings', 'weight_exclude')) if link_excl_xg500 else 0
-        elif device['Family'] == 'Quanta 5' or device['Family'] == 'Quanta 6':
-            weight_cost = int(config.get('Settings', 'weight_quanta'))
-            weight_excl = int(config.get('Settings', 'weight_exclude')) if link_excl_quanta else 0
-        elif device['Family'] == 'Quanta 70':
-            weight_cost = int(config.get('Settings', 'weight_quanta_70'))
-            weight_excl = int(config.get('Settings', 'weight_exclude')) if link_excl_quanta else 0
-        elif device['Family'] == 'InfiLINK Evolution':
-            weight_cost = int(config.get('Settings', 'weight_e5000'))
-            weight_excl = int(config.get('Settings', 'weight_exclude')) if link_excl_e5000 else 0
-        elif device['Family'] == 'InfiLINK 2x2 PRO':
-            weight_cost = int(config.get('Settings', 'weight_r5000_pro'))
-            weight_excl = int(config.get('Settings', 'weight_exclude')) if link_excl_r5000_pro else 0
-        elif device['Family'] == 'InfiLINK 2x2 LITE':
-            weight_cost = int(config.get('Settings', 'weight_r5000_lite'))
-            weight_excl = int(config.get('Settings', 'weight_exclude')) if link_excl_r5000_lite else 0
+        weight_cost, dev_excl_option = profile.get_weights(dev_family)
+        weight_excl = profile.weight_exclude if link_excl & EXCLUDE_BITS[dev_excl_option] else 0
 
         if link_req_cap > dev_mcs_clst[1]:
             weight_cap = weight_cost * -1
@@ -286,309 +529,835 @@ def get_recommendations(link, table):
 
         weight = weight_cap + weight_dist + weight_excl
 
-        candidates.append((weight, device['Name']))
+        yield (weight, table.names[row], weight_cap, weight_dist, weight_excl, dev_family,
+               dev_mcs_clst[0], dev_mcs_clst[1], dev_mcs_dist)
+
+
+def get_recommendations(link, catalog, profile=None):
+    """Select the best option for the requested throughput among all products.
+    Weights are taken from the scoring profile (the active one by default).
+    Return the most suitable device option.
+    """
 
-    print(link_req_cap)
-    #print(link)
-    #print(candidates)
+    if profile is None:
+        profile = get_profile()
 
+    candidates = [candidate[:2] for candidate in iter_candidates(link, catalog, profile)]
     if len(candidates) == 0:
-        raise ValueError(f'Link \'From {link["Site A"]["Name"]} to {link["Site B"]["Name"]}\'. '
+        raise ValueError(f'Link \'{link.name}\'. '
                          f'There is no suitable equipment. Please check the requirements.')
 
     return min(candidates)[1]
 
 
-def prepare_project(link, site_id):
+def get_alternatives(link, catalog, profile=None, top_k=3):
+    """Select the top_k best options in one pass over products (a bounded heap, see heapq.nsmallest).
+    Return a list of alternatives, the best first: {'Name', 'Family', 'Weight', 'Weight cap', 'Weight dist',
+    'Weight excl', 'MCS', 'Capacity', 'Reach'} (Reach - the distance of the MCS, km).
+    The first alternative is the device get_recommendations() returns.
+    """
+
+    if profile is None:
+        profile = get_profile()
+
+    best = nsmallest(top_k, iter_candidates(link, catalog, profile), key=itemgetter(0, 1))
+    if len(best) == 0:
+        raise ValueError(f'Link \'{link.name}\'. '
+                         f'There is no suitable equipment. Please check the requirements.')
+
+    return [{'Name': name, 'Family': family, 'Weight': weight, 'Weight cap': weight_cap, 'Weight dist': weight_dist,
+             'Weight excl': weight_excl, 'MCS': mcs, 'Capacity': mcs_capacity, 'Reach': mcs_dist}
+            for weight, name, weight_cap, weight_dist, weight_excl, family, mcs, mcs_capacity, mcs_dist in best]
+
+
+def get_reach_index(catalog, profile):
+    """Return the reach index, it is built again for another catalog or other weights."""
+
+    global reach_index
+    if reach_index is None or reach_index.catalog is not catalog or reach_index.weights != profile.get_key():
+        reach_index = ReachIndex(catalog, profile)
+    return reach_index
+
+
+def get_recommendations_indexed(link, catalog, profile=None):
+    """Select the best option like get_recommendations() does.
+    Only devices which can win are scored (see ReachIndex), the result is the same.
+    """
+
+    if profile is None:
+        profile = get_profile()
+
+    requirements = link.requirements
+    link_dist = get_distance(link)
+    table = catalog.get_table(requirements.band, requirements.bandwidth)
+    if table is None:
+        logger.debug(f'Link \'{link.name}\'. '
+                     f'No devices support the requested bandwidth ({requirements.bandwidth}).')
+        raise ValueError(f'Link \'{link.name}\'. '
+                         f'There is no suitable equipment. Please check the requirements.')
+    return get_reach_index(catalog, profile).recommend(table, requirements.availability, requirements.capacity,
+                                                       link_dist, requirements.exclude)
+
+
+def get_recommendations_batch(links, catalog, profile=None):
+    """Select the best option for a batch of links (the same as get_recommendations() does).
+    Links are grouped by frequency range, bandwidth and availability,
+    every group is scored at once with NumPy (batchrecommender).
+    Return a list of device names, ValueError is placed instead of the name if the link cannot be scored.
+    """
+
+    import numpy as np
+    import batchrecommender
+
+    if profile is None:
+        profile = get_profile()
+
+    set_distances([link for link in links if link.distance is None])
+    results = [None] * len(links)
+    groups = {}
+    for link_id, link in enumerate(links):
+        try:
+            get_distance(link)
+        except ValueError as error_msg:
+            results[link_id] = error_msg
+            continue
+        requirements = link.requirements
+        key = (requirements.band, requirements.bandwidth, requirements.availability)
+        groups.setdefault(key, []).append(link_id)
+
+    for (link_req_freq, link_req_bw, link_req_avb), link_ids in groups.items():
+        table = catalog.get_table(link_req_freq, link_req_bw)
+        if table is None:
+            for link_id in link_ids:
+                link = links[link_id]
+                results[link_id] = ValueError(f'Link \'{link.name}\'. '
+                                              f'There is no suitable equipment. Please check the requirements.')
+            continue
+        try:
+            dev_weights = [profile.get_weights(family) for family in table.families]
+        except ValueError as error_msg:
+            # A family without a weight, the links are rejected like the scalar path does
+            for link_id in link_ids:
+                results[link_id] = error_msg
+            continue
+        dev_cost = [weight_cost for weight_cost, option in dev_weights]
+        dev_option = np.array([EXCLUDE_BITS[option] for weight_cost, option in dev_weights], dtype=np.int64)
+
+        link_dist = [links[link_id].distance for link_id in link_ids]
+        link_req_cap = [links[link_id].requirements.capacity for link_id in link_ids]
+        link_excl = np.array([links[link_id].requirements.exclude for link_id in link_ids], dtype=np.int64)
+        excluded = (link_excl[:, np.newaxis] & dev_option) != 0
+
+        winners = batchrecommender.recommend(table, link_req_avb, link_dist, link_req_cap, excluded,
+                                             dev_cost, profile.weight_exclude)
+        for link_id, row in zip(link_ids, winners):
+            results[link_id] = table.names[row]
+    return results
+
+
+def score_links(links, catalog, profile, batch=False, top_k=0):
+    """Select the best option for every link of the list (distances must be calculated).
+    Return a list of device names, ValueError is placed instead of the name if the link cannot be scored.
+    If top_k is positive, lists of top_k alternatives (see get_alternatives) are returned instead of names,
+    all products are scored then (batch is ignored, the batch recommender keeps only the winners).
+    """
+
+    if top_k > 0:
+        results = []
+        for link in links:
+            try:
+                results.append(get_alternatives(link, catalog, profile, top_k))
+            except ValueError as error_msg:
+                results.append(error_msg)
+        return results
+    if batch:
+        return get_recommendations_batch(links, catalog, profile)
+    results = []
+    for link in links:
+        try:
+            results.append(get_recommendations_indexed(link, catalog, profile))
+        except ValueError as error_msg:
+            results.append(error_msg)
+    return results
+
+
+def get_cache():
+    """Return the recommendation cache, it is configured from the [Cache] partition on the first call."""
+
+    global recommendation_cache
+    if recommendation_cache is None:
+        recommendation_cache = RecommendationCache(get_config().getint('Cache', 'cache_size', fallback=4096),
+                                                   get_config().getfloat('Cache', 'distance_step', fallback=0.0))
+    return recommendation_cache
+
+
+def recommend_links(links, catalog, profile, batch=False, report=NULL_REPORT, top_k=0):
+    """Calculate distances and select the best option for every link of the list.
+    Links found in the recommendation cache aren't scored, equal links of the list are scored once.
+    Return a list of device names (lists of alternatives if top_k is positive, see score_links),
+    ValueError is placed instead of the name if the link cannot be scored.
+    """
+
+    with report.timer('distances'):
+        set_distances([link for link in links if link.distance is None])
+    with report.timer('scoring'):
+        return recommend_links_cached(links, catalog, profile, batch, report, top_k)
+
+
+def recommend_links_cached(links, catalog, profile, batch=False, report=NULL_REPORT, top_k=0):
+    """Select the best option for every link of the list using the recommendation cache."""
+
+    cache = get_cache()
+    cache.bind(catalog, profile, top_k)
+    hits, misses = cache.hits, cache.misses
+    results = [None] * len(links)
+    # Cache key -> ids of links which aren't cached
+    pending = {}
+    for link_id, link in enumerate(links):
+        try:
+            key = cache.get_key(link, get_distance(link))
+        except ValueError as error_msg:
+            results[link_id] = error_msg
+            continue
+        if key in pending:
+            pending[key].append(link_id)
+            cache.hits += 1
+            continue
+        name = cache.get(key)
+        if name is None:
+            pending[key] = [link_id]
+        else:
+            results[link_id] = name
+
+    scored = [links[link_ids[0]] for link_ids in pending.values()]
+    index = get_reach_index(catalog, profile)
+    index_scored = index.scored
+    recommendations = score_links(scored, catalog, profile, batch, top_k)
+    if report.enabled:
+        report.count('cache_hits', cache.hits - hits)
+        report.count('cache_misses', cache.misses - misses)
+        if batch or top_k > 0:
+            # The batch recommender and get_alternatives() score all devices of the table
+            tables = (catalog.get_table(link.requirements.band, link.requirements.bandwidth) for link in scored)
+            report.count('devices_scored', sum(len(table) for table in tables if table is not None))
+        else:
+            report.count('devices_scored', index.scored - index_scored)
+    failed = []
+    for (key, link_ids), link_rec in zip(pending.items(), recommendations):
+        if isinstance(link_rec, ValueError):
+            # Errors mention the link, so other links of the group are scored separately
+            results[link_ids[0]] = link_rec
+            failed.extend(link_ids[1:])
+            continue
+        cache.put(key, link_rec)
+        for link_id in link_ids:
+            results[link_id] = link_rec
+    for link_id, link_rec in zip(failed, score_links([links[link_id] for link_id in failed], catalog, profile, batch,
+                                                     top_k)):
+        results[link_id] = link_rec
+    return results
+
+
+def iter_chunks(items, chunk_size=CHUNK_SIZE):
+    """Split an iterable into lists of chunk_size items."""
+
+    chunk = []
+    for item in items:
+        chunk.append(item)
+        if len(chunk) == chunk_size:
+            yield chunk
+            chunk = []
+    if len(chunk) != 0:
+        yield chunk
+
+
+def iter_timed_chunks(links, chunk_size=CHUNK_SIZE, report=NULL_REPORT):
+    """Split links into chunks like iter_chunks, reading (parsing) of every chunk is timed."""
+
+    chunks = iter_chunks(links, chunk_size)
+    while True:
+        with report.timer('parse'):
+            chunk = next(chunks, None)
+        if chunk is None:
+            return
+        report.count('links', len(chunk))
+        yield chunk
+
+
+def iter_recommendations(links, catalog, profile=None, batch=False, chunk_size=CHUNK_SIZE, report=NULL_REPORT,
+                         top_k=0):
+    """Score links chunk by chunk, so the memory doesn't depend on the input size
+    and the first results appear as soon as the first chunk is read.
+    Yield the link and the recommended device name (ValueError if the link cannot be scored,
+    a list of alternatives if top_k is positive).
+    """
+
+    if profile is None:
+        profile = get_profile()
+    for chunk in iter_timed_chunks(links, chunk_size, report):
+        yield from zip(chunk, recommend_links(chunk, catalog, profile, batch, report, top_k))
+
+
+def init_worker(catalog, profile, run_config=None):
+    """Keep the catalog, the scoring profile and the config (the active one if it isn't given)
+    in a worker process. They are passed once per process, not per task.
+    """
+
+    global worker_catalog, worker_profile, worker_config
+    worker_catalog = catalog
+    worker_profile = profile
+    worker_config = run_config
+
+
+def recommend_chunk(links, batch=False, instrumented=False, top_k=0):
+    """Score a chunk of links in a worker process (see init_worker).
+    Return recommendations and timers/counters of the chunk (None if it isn't instrumented).
+    """
+
+    report = RunReport() if instrumented else NULL_REPORT
+    results = recommend_links(links, worker_catalog, worker_profile, batch, report, top_k)
+    return results, (report.to_dict() if instrumented else None)
+
+
+def iter_recommendations_parallel(links, catalog, profile=None, batch=False, workers=2, chunk_size=CHUNK_SIZE,
+                                  report=NULL_REPORT, top_k=0):
+    """The same as iter_recommendations but chunks are scored by a pool of processes.
+    Results are yielded in the input order, only a few chunks per worker are queued at once.
+    Timers of workers are summed up, so they show the processor time rather than the elapsed one.
+    """
+
+    from concurrent.futures import ProcessPoolExecutor
+
+    if profile is None:
+        profile = get_profile()
+    with ProcessPoolExecutor(max_workers=workers, initializer=init_worker, initargs=(catalog, profile)) as executor:
+        pending = deque()
+        for chunk in iter_timed_chunks(links, chunk_size, report):
+            pending.append((chunk, executor.submit(recommend_chunk, chunk, batch, report.enabled, top_k)))
+            if len(pending) >= workers * 2:
+                chunk, future = pending.popleft()
+                yield from zip(chunk, get_chunk_result(future, report))
+        while len(pending) != 0:
+            chunk, future = pending.popleft()
+            yield from zip(chunk, get_chunk_result(future, report))
+
+
+def get_chunk_result(future, report=NULL_REPORT):
+    """Wait for a chunk scored by a worker, add its timers and counters to the report."""
+
+    with report.timer('waiting'):
+        results, chunk_report = future.result()
+    if chunk_report is not None:
+        report.merge(chunk_report)
+    return results
+
+
+def prepare_project(link, site_id, profile=None):
     """Prepare link for importing to a KMZ project.
     It must follow InfiPLANNER KML template.
     KML contains JSON with linksArray and sitesArray,
     need to fill this structure to match the InfiPLANNER requirements.
+    The link (see records.Link) must have the equipment, it isn't modified.
     Return link for linksArray (linksArray contains sites for sitesArray)."""
 
-    project_site_template = {'id': None,
-                             'name': None,
-                             'location': {'latitude': None, 'longitude': None},
-                             'antennaHeight': None,
-                             'deviceProductKey': None,
-                             'antennaPartNumber': None,
-                             'rfCablePartNumber': None,
-                             'relocationLocked': True,
-                             'interference': '-Infinity',
-                             'temperature': 293
-                             }
-    project_site_a = deepcopy(project_site_template)
-    project_site_b = deepcopy(project_site_template)
-    project_link_template = {'terrainType': 'AVERAGE',
-                             'climateType': 'NORMAL',
-                             'frequencies': {'start': None, 'end': None},
-                             'band': None,
-                             'transmissionType': 'SINGLE_CARRIER',
-                             'bandwidth': None,
-                             'goal': {'type': 'DISTANCE', 'value': 30000},
-                             'txPowerLimit': 'Infinity',
-                             'eirpLimit': None,
-                             'temperature': 293,
-                             'totalAirPressure': 800,
-                             'humidity': 60,
-                             'startSite': project_site_a,
-                             'endSite': project_site_b
-                             }
-    project_link = deepcopy(project_link_template)
-
-    site_a = link['Site A']
-    site_b = link['Site B']
-    equipment = link['Equipment']
-
-    project_site_a['id'] = site_id
-    project_site_b['id'] = site_id + 1
-    project_site_a['name'] = site_a['Name']
-    project_site_b['name'] = site_b['Name']
-    project_site_a['location']['latitude'] = site_a['Latitude']
-    project_site_b['location']['latitude'] = site_b['Latitude']
-    project_site_a['location']['longitude'] = site_a['Longitude']
-    project_site_b['location']['longitude'] = site_b['Longitude']
-    project_site_a['antennaHeight'] = site_a['Height']
-    project_site_b['antennaHeight'] = site_b['Height']
-
-    if equipment['Family'] == 'InfiLINK 2x2 PRO' or equipment['Family'] == 'InfiLINK 2x2 LITE':
-        equipment['Family'] = 'InfiLINK 2x2'
-    if equipment['Family'] == 'InfiLINK XG 500':
-        equipment['Family'] = 'InfiLINK XG'
-    if config.get('Settings', 'region') == 'rus' and 'Quanta' in equipment['Family']:
-        equipment['Family'] = equipment['Family'].replace('Quanta', 'Vector')
-        equipment['Model'] = equipment['Model'].replace('Q', 'V')
-
-    if equipment['Type'] == 'external':
-        project_site_a['antennaPartNumber'] = equipment['Antenna']
-        project_site_b['antennaPartNumber'] = equipment['Antenna']
-        project_site_a['rfCablePartNumber'] = equipment['RF Cable']
-        project_site_b['rfCablePartNumber'] = equipment['RF Cable']
-
-    project_site_a['deviceProductKey'] = f'{equipment["Family"]}#{equipment["Model"]}'
-    project_site_b['deviceProductKey'] = f'{equipment["Family"]}#{equipment["Model"]}'
-
-    if link['Requirements']['Frequency range'] == '3':
-        project_link['frequencies'] = {'start': 2990, 'end': 4010}
-        project_link['band'] = 3000
-    elif link['Requirements']['Frequency range'] == '4':
-        project_link['frequencies'] = {'start': 3990, 'end': 5010}
-        project_link['band'] = 4000
-    elif link['Requirements']['Frequency range'] == '5':
-        project_link['frequencies'] = {'start': 4850, 'end': 6050}
-        project_link['band'] = 5000
-    elif link['Requirements']['Frequency range'] == '6':
-        project_link['frequencies'] = {'start': 6000, 'end': 6425}
-        project_link['band'] = 6000
-    elif link['Requirements']['Frequency range'] == '28':
-        project_link['frequencies'] = {'start': 28000, 'end': 29000}
-        project_link['band'] = 28000
-    elif link['Requirements']['Frequency range'] == '70':
-        project_link['frequencies'] = {'start': 70500, 'end': 76000}
-        project_link['band'] = 70500
-
-    project_link['bandwidth'] = link['Requirements']['Bandwidth']
-    project_link['startSite'] = project_site_a
-    project_link['endSite'] = project_site_b
-
-    if equipment['Family'] == 'InfiLINK XG 1000':
-        project_link['transmissionType'] = 'DUAL_CARRIER'
-
-    return project_link
-
-
-def create_project(pr_name, pr_links, pr_sites):
-    """Create KMZ for InfiPLANNER and BOM."""
-
-    if config.get('Output', 'output_folder') == 'default':
-        if Path.is_dir(Path.cwd() / 'Output') is False:
-            Path.mkdir(Path.cwd() / 'Output')
+    if profile is None:
+        profile = get_profile()
+
+    equipment = link.equipment
+    product_key = get_product_key(equipment, profile.region)
+    start, end, band = BANDS.get(link.requirements.band, (None, None, None))
+    transmission = 'DUAL_CARRIER' if equipment.family == 'InfiLINK XG 1000' else 'SINGLE_CARRIER'
+
+    return {'terrainType': 'AVERAGE',
+            'climateType': 'NORMAL',
+            'frequencies': {'start': start, 'end': end},
+            'band': band,
+            'transmissionType': transmission,
+            'bandwidth': link.requirements.bandwidth,
+            'goal': {'type': 'DISTANCE', 'value': 30000},
+            'txPowerLimit': 'Infinity',
+            'eirpLimit': None,
+            'temperature': 293,
+            'totalAirPressure': 800,
+            'humidity': 60,
+            'startSite': prepare_site(link.site_a, site_id, product_key, equipment),
+            'endSite': prepare_site(link.site_b, site_id + 1, product_key, equipment)
+            }
+
+
+def prepare_site(site, site_id, product_key, equipment):
+    """Return the site (see records.Site) for sitesArray."""
+
+    external = equipment.type == 'external'
+    return {'id': site_id,
+            'name': site.name,
+            'location': {'latitude': site.latitude, 'longitude': site.longitude},
+            'antennaHeight': site.height,
+            'deviceProductKey': product_key,
+            'antennaPartNumber': equipment.antenna if external else None,
+            'rfCablePartNumber': equipment.rf_cable if external else None,
+            'relocationLocked': True,
+            'interference': '-Infinity',
+            'temperature': 293
+            }
+
+
+def get_product_key(equipment, region):
+    """Return the product key of the device for InfiPLANNER (family#model).
+    Families are named as InfiPLANNER knows them, Quanta is Vector in the rus region.
+    """
+
+    family = equipment.family
+    model = equipment.model
+    if family == 'InfiLINK 2x2 PRO' or family == 'InfiLINK 2x2 LITE':
+        family = 'InfiLINK 2x2'
+    if family == 'InfiLINK XG 500':
+        family = 'InfiLINK XG'
+    if region == 'rus' and 'Quanta' in family:
+        family = family.replace('Quanta', 'Vector')
+        model = model.replace('Q', 'V')
+    return f'{family}#{model}'
+
+
+def escape(text):
+    """Escape &, < and > in XML text (the same as xml.sax.saxutils.escape, which imports urllib)."""
+
+    return text.replace('&', '&amp;').replace('>', '&gt;').replace('<', '&lt;')
+
+
+def get_db_path(db_config=None):
+    """Return the path of devices.db from the config (the active one by default)."""
+
+    if db_config is None:
+        db_config = get_config()
+    if db_config.get('Database', 'db_path') == 'default':
+        return Path('devices.db')
+    return Path(db_config.get('Database', 'db_path'))
+
+
+def get_output_paths(pr_name, output_folder=None, run_config=None):
+    """Reserve paths of KMZ and BOM in the output folder (existing files are not overwritten).
+    Both files are created empty (see reserve_path), so concurrent runs never get the same paths.
+    The output folder and names of the config (the active one by default) are used by default.
+    """
+
+    if run_config is None:
+        run_config = get_config()
+    if output_folder is not None:
+        output = Path(output_folder)
+    elif run_config.get('Output', 'output_folder') == 'default':
         output = Path.cwd() / 'Output'
     else:
-        if Path.is_dir(Path(config.get('Output', 'output_folder'))) is False:
-            Path.mkdir(Path(config.get('Output', 'output_folder')), parents=True, exist_ok=True)
-        output = Path(config.get('Output', 'output_folder'))
+        output = Path(run_config.get('Output', 'output_folder'))
+    output.mkdir(parents=True, exist_ok=True)
 
-    if config.get('Output', 'kmz_name') == 'default':
+    if run_config.get('Output', 'kmz_name') == 'default':
         kmz_name = f'{pr_name}'
     else:
-        kmz_name = config.get('Output', 'kmz_name')
-    kmz_path = output / f'{kmz_name}.kmz'
-    kmz_counter = 0
-    while True:
-        if kmz_path.is_file() is True:
-            kmz_counter += 1
-            kmz_path = output / f'{kmz_name}_{kmz_counter}.kmz'
-        else:
-            break
+        kmz_name = run_config.get('Output', 'kmz_name')
+    kmz_path = reserve_path(output, kmz_name, '.kmz')
 
-    if config.get('Output', 'bom_name') == 'default':
+    if run_config.get('Output', 'bom_name') == 'default':
         bom_name = f'{pr_name}'
     else:
-        bom_name = config.get('Output', 'kmz_name')
-    bom_path = output / f'{bom_name}.txt'
-    bom_counter = 0
+        bom_name = run_config.get('Output', 'kmz_name')
+    bom_path = reserve_path(output, bom_name, '.txt')
+
+    return kmz_path, bom_path
+
+
+def reserve_path(folder, name, suffix):
+    """Create an empty file <name><suffix> in the folder, <name>_1<suffix>, <name>_2<suffix>... if it exists.
+    The file is created atomically (exclusive mode). Return its path.
+    """
+
+    path = folder / f'{name}{suffix}'
+    counter = 0
     while True:
-        if bom_path.is_file() is True:
-            bom_counter += 1
-            bom_path = output / f'{bom_name}_{bom_counter}.txt'
-        else:
-            break
-
-    # Prepare KMZ (doc.kml in an archive)
-    project = {'appVersion': '609ef5b',
-               'appVersionFull': '609ef5b',
-               'linksArray': pr_links,
-               'sitesArray': pr_sites,
-               'obstaclesArray': [],
-               'project': {'id': f'{randint(45000, 99999)}',
-                           'name': f'{pr_name}',
-                           'type': 'PTP',
-                           'regulation': 'WORLDWIDE',
-                           'unitSystem': 'METRIC',
-                           'settings': {'ptmp': {'visible': True}},
-                           'updatedDatetime': f'{datetime.now()}',
-                           'createNew': 0
-                           }
-               }
-
-    kml_attributes = {'xmlns': 'http://www.opengis.net/kml/2.2',
-                      'xmlns:gs': 'http://earth.google.com/kml/2.1',
-                      'xmlns:kml': 'http://www.opengis.net/kml/2.2',
-                      'xmlns:atom': 'http://www.w3.org/2005/Atom',
-                      'xmlns:infidata': 'http://infinet.ru/kml'}
-
-    root = ElementTree.Element('kml', kml_attributes)
-    document = ElementTree.SubElement(root, 'Document')
-    extended_data = ElementTree.SubElement(document, 'ExtendedData')
-    ElementTree.SubElement(extended_data, 'infidata:json').text = dumps(project)
-
-    tree = ElementTree.ElementTree(root)
-    tree.write('doc.kml', encoding='UTF-8', xml_declaration=True)
-    with ZipFile(kmz_path, 'w') as kmz:
-        kmz.write('doc.kml')
-    file_kml = Path('doc.kml')
-    file_kml.unlink()
-
-    # Prepare BOM
-    bom_active = []
-    bom_passive = []
-    for site in pr_sites:
-        bom_active.append(site['deviceProductKey'].replace('#', ' '))
-        bom_passive.append('AUX-ODU-LPU-L')
-        if site['antennaPartNumber'] is not None:
-            bom_passive.append(site['antennaPartNumber'])
-        if site['rfCablePartNumber'] is not None:
-            bom_passive.append(site['rfCablePartNumber'])
-            bom_passive.append(site['rfCablePartNumber'])
-    bom_active = Counter(bom_active)
-    bom_active = OrderedDict(sorted(bom_active.items()))
-    bom_passive = Counter(bom_passive)
-    bom_passive = OrderedDict(sorted(bom_passive.items()))
-    bom_passive.move_to_end('AUX-ODU-LPU-L')
-
-    with open(bom_path, 'w') as bom_text:
-        text = []
-        text.append(f'ACTIVE EQUIPMENT\n')
-        for partnumber, counter in bom_active.items():
-            text.append(f'InfiNet {partnumber}:  {counter} pc.')
-        text.append(f'\nPASSIVE EQUIPMENT\n')
-        for partnumber, counter in bom_passive.items():
-            if partnumber != 'AUX-ODU-LPU-L':
-                text.append(f'InfiNet {partnumber}:  {counter} pc.')
+        try:
+            with open(path, 'x'):
+                return path
+        except FileExistsError:
+            counter += 1
+            path = folder / f'{name}_{counter}{suffix}'
+
+
+class ProjectWriter:
+    """Write KMZ for InfiPLANNER and BOM link by link.
+    doc.kml is streamed directly into the archive: linksArray is written as links are added,
+    sitesArray is kept in a temporary file (in memory while it is small) until the project is closed.
+    BOM is counted while sites are added.
+    """
+
+    def __init__(self, pr_name, kmz_path=None, bom_path=None, output_folder=None, run_config=None):
+        self.pr_name = pr_name
+        self.kmz_path = kmz_path
+        self.bom_path = bom_path
+        self.output_folder = output_folder
+        # Config of the output folder and names (the active one by default, see get_output_paths)
+        self.run_config = run_config
+        self.links_count = 0
+        self.sites_count = 0
+        self.bom_active = Counter()
+        self.bom_passive = Counter()
+        self.kmz = None
+        self.kml = None
+        self.sites = None
+        # Files reserved in the output folder (see get_output_paths), they are removed if the run fails
+        self.reserved = []
+
+    def open(self):
+        """Create the archive and start doc.kml. It is done on the first link."""
+
+        if self.kmz_path is None or self.bom_path is None:
+            kmz_path, bom_path = get_output_paths(self.pr_name, self.output_folder, self.run_config)
+            if self.kmz_path is None:
+                self.kmz_path = kmz_path
+                self.reserved.append(kmz_path)
+            else:
+                kmz_path.unlink()
+            if self.bom_path is None:
+                self.bom_path = bom_path
+                self.reserved.append(bom_path)
             else:
-                text.append(f'AC power\n'
-                            f'InfiNet {partnumber}:  {counter * 2} pc.'
-                            f'\nDC power (optional)\n'
-                            f'InfiNet {partnumber}:  {counter} pc.\n'
-                            f'InfiNet AUX-ODU-INJ-G:  {counter} pc.')
-        bom_text.write('\n'.join(text))
+                bom_path.unlink()
+
+        kml_attributes = {'xmlns': 'http://www.opengis.net/kml/2.2',
+                          'xmlns:gs': 'http://earth.google.com/kml/2.1',
+                          'xmlns:kml': 'http://www.opengis.net/kml/2.2',
+                          'xmlns:atom': 'http://www.w3.org/2005/Atom',
+                          'xmlns:infidata': 'http://infinet.ru/kml'}
+        attributes = ' '.join(f'{key}="{escape(value)}"' for key, value in kml_attributes.items())
+
+        # KML contains JSON (linksArray, sitesArray, obstaclesArray, project)
+        self.kmz = ZipFile(self.kmz_path, 'w')
+        kml_info = ZipInfo('doc.kml', datetime.now().timetuple()[:6])
+        # Regular file, rw-r--r--
+        kml_info.external_attr = 0o100644 << 16
+        self.kml = TextIOWrapper(self.kmz.open(kml_info, 'w'), encoding='UTF-8')
+        self.kml.write(f"<?xml version='1.0' encoding='UTF-8'?>\n"
+                       f'<kml {attributes}><Document><ExtendedData><infidata:json>')
+        self.kml.write(escape('{"appVersion": "609ef5b", "appVersionFull": "609ef5b", "linksArray": ['))
+        self.sites = SpooledTemporaryFile(max_size=SPOOL_SIZE, mode='w+', encoding='UTF-8')
+
+    def add_link(self, project_link):
+        """Add a link to linksArray."""
+
+        if self.kmz is None:
+            self.open()
+        if self.links_count != 0:
+            self.kml.write(', ')
+        self.kml.write(escape(dumps(project_link)))
+        self.links_count += 1
+
+    def add_site(self, project_site, listed=True):
+        """Add a site to sitesArray and count its equipment.
+        The equipment of a shared site (see SiteRegistry) is counted per radio, the site is listed once:
+        listed is False for its next radios.
+        """
 
+        if self.kmz is None:
+            self.open()
+        if listed:
+            if self.sites_count != 0:
+                self.sites.write(', ')
+            self.sites.write(escape(dumps(project_site)))
+            self.sites_count += 1
+
+        self.bom_active[project_site['deviceProductKey'].replace('#', ' ')] += 1
+        self.bom_passive['AUX-ODU-LPU-L'] += 1
+        if project_site['antennaPartNumber'] is not None:
+            self.bom_passive[project_site['antennaPartNumber']] += 1
+        if project_site['rfCablePartNumber'] is not None:
+            self.bom_passive[project_site['rfCablePartNumber']] += 2
+
+    def close(self):
+        """Finish KMZ and write BOM."""
+
+        if self.kmz is None:
+            self.open()
+
+        # Finish KMZ (doc.kml in an archive)
+        project = {'id': f'{randint(45000, 99999)}',
+                   'name': f'{self.pr_name}',
+                   'type': 'PTP',
+                   'regulation': 'WORLDWIDE',
+                   'unitSystem': 'METRIC',
+                   'settings': {'ptmp': {'visible': True}},
+                   'updatedDatetime': f'{datetime.now()}',
+                   'createNew': 0
+                   }
+        self.kml.write(escape('], "sitesArray": ['))
+        self.sites.seek(0)
+        copyfileobj(self.sites, self.kml)
+        self.kml.write(escape(f'], "obstaclesArray": [], "project": {dumps(project)}}}'))
+        self.kml.write('</infidata:json></ExtendedData></Document></kml>')
+        self.release()
+
+        # Prepare BOM
+        bom_active = OrderedDict(sorted(self.bom_active.items()))
+        bom_passive = OrderedDict(sorted(self.bom_passive.items()))
+        bom_passive.move_to_end('AUX-ODU-LPU-L')
+
+        with open(self.bom_path, 'w') as bom_text:
+            text = []
+            text.append(f'ACTIVE EQUIPMENT\n')
+            for partnumber, counter in bom_active.items():
+                text.append(f'InfiNet {partnumber}:  {counter} pc.')
+            text.append(f'\nPASSIVE EQUIPMENT\n')
+            for partnumber, counter in bom_passive.items():
+                if partnumber != 'AUX-ODU-LPU-L':
+                    text.append(f'InfiNet {partnumber}:  {counter} pc.')
+                else:
+                    text.append(f'AC power\n'
+                                f'InfiNet {partnumber}:  {counter * 2} pc.'
+                                f'\nDC power (optional)\n'
+                                f'InfiNet {partnumber}:  {counter} pc.\n'
+                                f'InfiNet AUX-ODU-INJ-G:  {counter} pc.')
+            bom_text.write('\n'.join(text))
+        self.reserved = []
+
+    def discard(self):
+        """Remove the unfinished archive and the reserved BOM (e.g. the run has failed)."""
+
+        if self.kmz is not None:
+            self.release()
+            if isinstance(self.kmz_path, Path) and self.kmz_path.is_file():
+                self.kmz_path.unlink()
+        for path in self.reserved:
+            if path.is_file():
+                path.unlink()
+
+    def release(self):
+        """Close doc.kml, the archive and the temporary file."""
+
+        self.kml.close()
+        self.kmz.close()
+        self.sites.close()
+
+
+class AlternativesWriter:
+    """Write ranked alternatives of links (see get_alternatives) to a CSV report.
+    Rows are kept in a temporary file until the project is written.
+    """
 
-def handle(input_file):
-    """Waits for a CSV file and returns a KMZ project + a TXT bill of materials"""
+    columns = ('Link', 'Distance', 'Rank', 'Device', 'Family', 'Weight', 'Weight cap', 'Weight dist', 'Weight excl',
+               'MCS', 'Capacity', 'Reach')
 
-    if config.get('Database', 'db_path') == 'default':
-        db_path = Path('devices.db')
-    else:
-        db_path = Path(config.get('Database', 'db_path'))
+    def __init__(self):
+        self.rows = SpooledTemporaryFile(max_size=SPOOL_SIZE, mode='w+', encoding='UTF-8', newline='')
+        self.csv = csv_writer(self.rows)
+        self.csv.writerow(self.columns)
 
-    db = TinyDB(db_path)
-    equipment = Query()
+    def add_link(self, link, alternatives):
+        """Add alternatives of the link, the best first."""
 
-    # Parse the CSV file and create a links array for future needs
-    file_csv = read_csv(input_file)
-    links = create_links(file_csv)
+        link_dist = get_distance(link)
+        for rank, alternative in enumerate(alternatives, 1):
+            self.csv.writerow((link.name, link_dist, rank, alternative['Name'], alternative['Family'],
+                               round(alternative['Weight'], 2), alternative['Weight cap'],
+                               round(alternative['Weight dist'], 2), alternative['Weight excl'],
+                               alternative['MCS'], alternative['Capacity'], alternative['Reach']))
+
+    def close(self, path):
+        """Save the report."""
+
+        self.rows.seek(0)
+        with open(path, 'w', encoding='UTF-8', newline='') as report_file:
+            copyfileobj(self.rows, report_file)
+        self.rows.close()
+
+    def discard(self):
+        """Drop the report (e.g. the run has failed)."""
+
+        self.rows.close()
+
+
+def get_site_registry(run_config=None):
+    """Return a new site registry if sites are merged ([Output] merge_sites of the config,
+    the active one by default), otherwise None.
+    """
+
+    if run_config is None:
+        run_config = get_config()
+    if not run_config.getboolean('Output', 'merge_sites', fallback=False):
+        return None
+    return SiteRegistry(run_config.getfloat('Output', 'site_tolerance', fallback=0.0))
+
+
+def get_alternatives_path(kmz_path):
+    """Return the path of the alternatives report of the project (<kmz name>_alternatives.csv)."""
+
+    return kmz_path.with_name(f'{kmz_path.stem}_alternatives.csv')
+
+
+def create_project(pr_name, pr_links, pr_sites, kmz_path=None, bom_path=None):
+    """Create KMZ for InfiPLANNER and BOM (in the output folder by default)."""
+
+    writer = ProjectWriter(pr_name, kmz_path, bom_path)
+    for project_link in pr_links:
+        writer.add_link(project_link)
+    for project_site in pr_sites:
+        writer.add_site(project_site)
+    writer.close()
+
+
+def handle(input_file, catalog=None, batch=False, profile=None, workers=1, report=None, output_folder=None,
+           progress=NULL_PROGRESS, alternatives=None, plan_links=None, neighbours=None, run_config=None):
+    """Waits for a CSV file and returns a KMZ project + a TXT bill of materials.
+    The device catalog and the scoring profile can be passed to reuse them across runs,
+    output_folder replaces the output folder of the config.
+    The config (the active one by default) is taken once: the whole run uses its project defaults
+    and output options, even if another config is activated meanwhile (see reloader.Reloader).
+    Links are read, scored and written as a stream (see iter_recommendations),
+    if batch is True, every chunk of links is scored at once (get_recommendations_batch).
+    If workers is greater than 1, chunks are scored by a pool of processes.
+
+    Stages are timed and counted if a RunReport is passed or run_report is enabled in the config,
+    in the latter case the report is also saved next to the KMZ (<kmz name>.json).
+    Return the report (NULL_REPORT if instrumentation is disabled).
+
+    progress (see progress.Progress) follows the stages catalog, links (links processed of the total)
+    and write; if it is cancelled, Cancelled is raised and nothing is written.
+
+    If alternatives is positive, the best `alternatives` options of every link are found in the same pass
+    and saved next to the KMZ (<kmz name>_alternatives.csv, see AlternativesWriter).
+    alternatives of the [Output] partition are used by default.
+
+    If plan_links is True, the CSV file is a list of unpaired sites and links are proposed
+    between the sites within reach (see iter_planned_links), neighbours limits them to the nearest sites.
+    plan_links and plan_neighbours of the [Project] partition are used by default.
+    """
+
+    setup_logging()
+    if run_config is None:
+        run_config = get_config()
+    save_report = run_config.getboolean('Output', 'run_report', fallback=False)
+    if report is None:
+        report = RunReport() if save_report else NULL_REPORT
+    if alternatives is None:
+        alternatives = run_config.getint('Output', 'alternatives', fallback=0)
+    if plan_links is None:
+        plan_links = run_config.getboolean('Project', 'plan_links', fallback=False)
+    if neighbours is None:
+        neighbours = run_config.getint('Project', 'plan_neighbours', fallback=0)
+    started = perf_counter()
+
+    if profile is None:
+        profile = get_profile() if run_config is get_config() else ScoringProfile.from_config(run_config)
+
+    if catalog is None:
+        progress.stage('catalog')
+        with report.timer('catalog'):
+            catalog = load_catalog(get_db_path(run_config))
+    # The number of planned links is known only when they are found
+    progress.stage('links', count_links(input_file) if progress.enabled and not plan_links else None)
 
     project_name = Path(input_file).stem
-    # linksArray
-    project_links = []
-    # sitesArray
-    project_sites = []
+    writer = ProjectWriter(project_name, output_folder=output_folder, run_config=run_config)
+    alternatives_writer = AlternativesWriter() if alternatives > 0 else None
+    registry = get_site_registry(run_config)
     # site id
     project_counter = 400000
-    for link_name, link in links.items():
-        try:
-            link_freq = link['Requirements']['Frequency range']
-            table = db.table(link_freq)
-            link_rec = get_recommendations(link, table)
-            links[link_name]['Equipment'] = dict(table.search(equipment.Name == link_rec)[0])
-            # They won't be needed else
-            del links[link_name]['Equipment']['Capacity']
-            del links[link_name]['Equipment']['Availability']
-            # Prepare all information about the link for importing to InfiPLANNER
-            project_link = prepare_project(link, project_counter)
-            project_counter += 2
-            project_links.append(project_link)
-            project_sites.append(project_link['startSite'])
-            project_sites.append(project_link['endSite'])
-        except ValueError as error_msg:
-            logger.exception(f'{error_msg}', exc_info=False)
-        finally:
-            continue
+    # Parse the CSV file and combine sites into links on the fly
+    if plan_links:
+        links = (link for link_name, link in iter_planned_links(iter_numbered_csv(input_file), catalog, neighbours,
+                                                                report, run_config))
+    else:
+        links = (link for link_name, link in iter_links(iter_numbered_csv(input_file), report, run_config))
+    if workers > 1:
+        recommendations = iter_recommendations_parallel(links, catalog, profile, batch, workers, report=report,
+                                                        top_k=alternatives)
+    else:
+        recommendations = iter_recommendations(links, catalog, profile, batch, report=report, top_k=alternatives)
+    try:
+        for link, link_rec in recommendations:
+            progress.advance()
+            try:
+                if isinstance(link_rec, ValueError):
+                    raise link_rec
+                if alternatives_writer is not None:
+                    link_alternatives, link_rec = link_rec, link_rec[0]['Name']
+                with report.timer('lookup'):
+                    link.equipment = catalog.get_equipment(link.requirements.band, link_rec)
+                # Prepare all information about the link for importing to InfiPLANNER
+                with report.timer('prepare'):
+                    project_link = prepare_project(link, project_counter, profile)
+                project_counter += 2
+                with report.timer('write'):
+                    start_listed = end_listed = True
+                    if registry is not None:
+                        # Links refer to the first site of every location
+                        start_listed = registry.add(project_link['startSite'])
+                        end_listed = registry.add(project_link['endSite'], project_link['startSite']['id'])
+                    writer.add_link(project_link)
+                    writer.add_site(project_link['startSite'], start_listed)
+                    writer.add_site(project_link['endSite'], end_listed)
+                    if alternatives_writer is not None:
+                        alternatives_writer.add_link(link, link_alternatives)
+            except ValueError as error_msg:
+                logger.exception(f'{error_msg}', exc_info=False)
+                report.count('rejected_links')
+        progress.stage('write')
+    except BaseException:
+        # Stop worker processes before the output is discarded
+        recommendations.close()
+        writer.discard()
+        if alternatives_writer is not None:
+            alternatives_writer.discard()
+        raise
+    report.count('written_links', writer.links_count)
+    if registry is not None:
+        report.count('merged_sites', registry.merged)
     # Create KMZ + BOM
     try:
-        if len(project_links) == 0:
+        if writer.links_count == 0:
             raise ValueError(f'Something goes wrong. Please check the logs.')
         else:
             logger.info('Project has been successfully created.')
-            create_project(project_name, project_links, project_sites)
+            if workers <= 1:
+                cache = get_cache()
+                logger.debug(f'Recommendation cache: {cache.hits} hits, {cache.misses} misses.')
+            with report.timer('write'):
+                writer.close()
+                if alternatives_writer is not None:
+                    alternatives_writer.close(get_alternatives_path(writer.kmz_path))
     except ValueError as error_msg:
         logger.exception(f'{error_msg}', exc_info=False)
-
-
-# Import config
-config = ConfigParser(comment_prefixes='/', allow_no_value=True)
-config_path = Path('config.ini')
-config.read(config_path)
-
-# Create logger
+    if alternatives_writer is not None and writer.links_count == 0:
+        alternatives_writer.discard()
+    report.add_time('total', perf_counter() - started)
+    if save_report and writer.kmz_path is not None:
+        report.save(writer.kmz_path.with_suffix('.json'))
+    return report
+
+
+# Config is read on demand (see get_config)
+config = None
+# id of a config -> its requirement cache (see get_requirement_cache)
+requirement_caches = {}
+# Scoring profile is resolved from the config on demand
+active_profile = None
+# Recommendation cache and reach index are created on demand
+recommendation_cache = None
+reach_index = None
+# Catalog, scoring profile and config of a worker process (see init_worker)
+worker_catalog = None
+worker_profile = None
+worker_config = None
+
+# Handlers are added by setup_logging()
 logger = getLogger(__name__)
-logger.setLevel(level='DEBUG')
-
-# Create path and filenames
-log_path = Path.cwd() / 'Logs'
-if Path.is_dir(log_path) is False:
-    Path.mkdir(log_path)
-log = log_path / f'{datetime.today().strftime("%Y_%m_%d")}.log'
-
-# Create handlers
-console_handler = StreamHandler()
-file_handler = FileHandler(log)
-console_handler.setLevel(level='DEBUG')
-file_handler.setLevel(level='INFO')
-
-# Create formatter and add it to handlers
-form = '%(asctime)s - %(levelname)s - %(pathname)s - %(message)s'
-formatter = Formatter(fmt=form, datefmt='%d-%b-%y %H:%M:%S')
-console_handler.setFormatter(formatter)
-file_handler.setFormatter(formatter)
-
-# Add handlers to the logger
-logger.addHandler(console_handler)
-logger.addHandler(file_handler)
 
 if __name__ == '__main__':
+    parser = ArgumentParser(description='Create a KMZ project and a bill of materials from a CSV file.')
+    parser.add_argument('input_file', nargs='?', type=Path, default=Path('example.csv'))
+    parser.add_argument('--workers', type=int, default=1, help='number of processes scoring links')
+    parser.add_argument('--batch', action='store_true', help='score chunks of links with NumPy')
+    parser.add_argument('--plan', action='store_true', default=None,
+                        help='the CSV file is a list of sites, propose links between sites within reach')
+    parser.add_argument('--neighbours', type=int, help='propose links only to N nearest sites')
+    args = parser.parse_args()
+    setup_logging()
     # Work with files
-    file_input = Path('example.csv')
-    handle(file_input)
+    handle(args.input_file, batch=args.batch, workers=args.workers, plan_links=args.plan, neighbours=args.neighbours)
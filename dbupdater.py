@@ -1,63 +1,50 @@
+from catalog import DeviceCatalog, get_binary_path, remove_stale_binaries, write_binary
+from hashlib import sha1
 from openpyxl import load_workbook
+from os import replace
 from pathlib import Path
+from progress import NULL_PROGRESS
 from re import compile
-from tinydb import TinyDB
+from tinydb import JSONStorage, TinyDB
+from tinydb.middlewares import CachingMiddleware
+from xml.etree.ElementTree import fromstring
+from zipfile import ZipFile
+
+
+# Table of devices.db with fingerprints of the workbook, its worksheets and device slices
+FINGERPRINTS = '_fingerprints'
+# XML namespaces of the workbook part
+SPREADSHEET = '{http://schemas.openxmlformats.org/spreadsheetml/2006/main}'
+RELATIONSHIPS = '{http://schemas.openxmlformats.org/officeDocument/2006/relationships}'
 
 
 def get_slices(sheet):
-    """Find devices in XLS."""
-
-    row_start = 1
-    while True:
-        family_cell = sheet.cell(row=row_start, column=2)
-        if family_cell.value == 'Quanta 5':
-            row_old_start = row_start
-            row_start = row_start + 24
-            row_end = row_start - 2
-        elif family_cell.value == 'Quanta 6':
-            row_old_start = row_start
-            row_start = row_start + 24
-            row_end = row_start - 2
-        elif family_cell.value == 'Quanta 70':
-            row_old_start = row_start
-            row_start = row_start + 9
-            row_end = row_start - 2
-        elif family_cell.value == 'InfiLINK XG 1000':
-            row_old_start = row_start
-            row_start = row_start + 15
-            row_end = row_start - 2
-        elif family_cell.value == 'InfiLINK XG 500':
-            row_old_start = row_start
-            row_start = row_start + 15
-            row_end = row_start - 2
-        elif family_cell.value == 'InfiLINK 2x2 PRO':
-            row_old_start = row_start
-            row_start = row_start + 18
-            row_end = row_start - 2
-        elif family_cell.value == 'InfiLINK 2x2 LITE':
-            row_old_start = row_start
-            row_start = row_start + 18
-            row_end = row_start - 2
-        elif family_cell.value == 'InfiLINK Evolution':
-            row_old_start = row_start
-            row_start = row_start + 21
-            row_end = row_start - 2
-        elif family_cell.value == 'Axion 28':
-            row_old_start = row_start
-            row_start = row_start + 9
-            row_end = row_start - 2
-        elif family_cell.value is None:
-            break
-        yield row_old_start, row_end
-
-
-def analyze_slice(start, end, sheet):
+    """Find devices in XLS.
+    Rows are read in one pass, every device block starts with the 'Family' row.
+    Yield blocks as lists of non-empty values of their rows.
+    """
+
+    block = None
+    for row in sheet.iter_rows(min_col=1, max_col=17, values_only=True):
+        row_text = tuple(value for value in row if value is not None)
+        if not row_text:
+            continue
+        if row_text[0] == 'Family':
+            if block:
+                yield block
+            block = []
+        if block is not None:
+            block.append(row_text)
+    if block:
+        yield block
+
+
+def analyze_slice(rows):
     """Parse data from XLS."""
 
     capacity = {}
     availability = {'99.90': {}, '99.99': {}}
-    for row in sheet.iter_rows(min_row=start, min_col=1, max_row=end, max_col=17):
-        row_text = list(filter(lambda x: x is not None, [cell.value for cell in row]))
+    for row_text in rows:
         if row_text[0] == 'Family':
             family = row_text[1]
         elif row_text[0] == 'Device':
@@ -65,9 +52,9 @@ def analyze_slice(start, end, sheet):
         elif row_text[0] == 'Capacity, Mbps':
             capacity[f'{row_text[1]}'] = {f'MCS{id}': int(item) for id, item in enumerate(row_text[2:])}
         elif row_text[0] == 'Availability, 99.90%':
-            availability['99.90'][row_text[1]] = {f'MCS{id}': float(item) for id, item in enumerate(row_text[2:])}
+            availability['99.90'][f'{row_text[1]}'] = {f'MCS{id}': float(item) for id, item in enumerate(row_text[2:])}
         elif row_text[0] == 'Availability, 99.99%':
-            availability['99.99'][row_text[1]] = {f'MCS{id}': float(item) for id, item in enumerate(row_text[2:])}
+            availability['99.99'][f'{row_text[1]}'] = {f'MCS{id}': float(item) for id, item in enumerate(row_text[2:])}
     if ('-E' in name) or ('Um' in name) or ('Omx' in name) or ('Lmn' in name) or ('STE' in name):
         type = 'external'
         model = name.split(' + ')[0]
@@ -82,35 +69,198 @@ def analyze_slice(start, end, sheet):
     return family, name, model, type, antenna, cable, capacity, availability
 
 
-def write_db(table, family, name, model, type, antenna, cable, capacity, availability):
-    """Insert data to the database."""
+def get_sheet_fingerprints(file_xls):
+    """Hash raw worksheet parts (xl/worksheets/*.xml) of the workbook without parsing them.
+    Text cells refer to the shared strings by index, so xl/sharedStrings.xml is a part of every fingerprint.
+    Return {sheet title: fingerprint} in the workbook order.
+    """
+
+    with ZipFile(file_xls) as archive:
+        workbook = fromstring(archive.read('xl/workbook.xml'))
+        targets = {relation.get('Id'): relation.get('Target')
+                   for relation in fromstring(archive.read('xl/_rels/workbook.xml.rels'))}
+        try:
+            strings = sha1(archive.read('xl/sharedStrings.xml')).digest()
+        except KeyError:
+            strings = b''
+        fingerprints = {}
+        for sheet in workbook.iter(f'{SPREADSHEET}sheet'):
+            target = targets[sheet.get(f'{RELATIONSHIPS}id')]
+            # Targets are relative to xl/ unless they are absolute
+            part = target[1:] if target.startswith('/') else f'xl/{target}'
+            fingerprints[sheet.get('name')] = sha1(strings + archive.read(part)).hexdigest()
+    return fingerprints
+
+
+def get_fingerprint(rows):
+    """Hash cell values of the device slice."""
+
+    return sha1(repr(rows).encode('utf-8')).hexdigest()
+
+
+def create_document(family, name, model, type, antenna, cable, capacity, availability):
+    """Create the database document of the device."""
+
+    return {'Family': family,
+            'Name': name,
+            'Model': model,
+            'Type': type,
+            'Antenna': antenna,
+            'RF Cable': cable,
+            'Capacity': capacity,
+            'Availability': availability
+            }
+
+
+def read_database(file_db):
+    """Return fingerprints of the workbook and of its worksheets (see get_sheet_fingerprints)
+    and devices of every sheet: (fingerprints of slices, documents).
+    """
+
+    if not Path(file_db).is_file():
+        return None, {}, {}
+    try:
+        db = TinyDB(file_db)
+    except ValueError:
+        return None, {}, {}
+    # The file is read once, tables of TinyDB read it on every access
+    tables = db.storage.read() or {}
+    db.close()
+    meta = next(iter(tables.get(FINGERPRINTS, {}).values()), None)
+    devices = {}
+    if meta is not None:
+        for title, fingerprints in meta['sheets'].items():
+            # Documents are stored by their ids in the insertion order
+            documents = list(tables.get(title, {}).values())
+            if len(documents) == len(fingerprints):
+                devices[title] = (fingerprints, documents)
+    if meta is None:
+        return None, {}, devices
+    return meta['workbook'], meta.get('worksheets', {}), devices
+
+
+def write_database(file_db, sheets, workbook, worksheets, fingerprints):
+    """Write all devices at once (the file is written when the database is closed).
+    The database is replaced atomically.
+    """
+
+    file_db = Path(file_db)
+    file_tmp = file_db.with_name(f'{file_db.name}.tmp')
+    if file_tmp.exists():
+        file_tmp.unlink()
+    db = TinyDB(file_tmp, storage=CachingMiddleware(JSONStorage))
+    for title, documents in sheets.items():
+        db.table(title).insert_multiple(documents)
+    db.table(FINGERPRINTS).insert({'workbook': workbook, 'worksheets': worksheets, 'sheets': fingerprints})
+    db.close()
+    replace(file_tmp, file_db)
+
+
+def write_binary_catalog(file_db, catalog=None):
+    """Save the binary catalog of the database if it is missing or outdated.
+    catalog is built from the devices just written to the database, then it isn't read again.
+    If the catalog can't be saved, the database is still updated: catalogs are built from JSON
+    until the binary catalog is saved by load_catalog.
+    """
+
+    source = Path(file_db).read_bytes()
+    bin_path = get_binary_path(file_db, source)
+    try:
+        DeviceCatalog.from_binary(bin_path, source)
+    except (OSError, ValueError):
+        if catalog is None:
+            catalog = DeviceCatalog.from_tinydb(file_db)
+        try:
+            write_binary(catalog, bin_path, source)
+        except OSError:
+            return
+    remove_stale_binaries(file_db, bin_path)
+
+
+def update_database(file_db, file_xls, incremental=True, progress=NULL_PROGRESS):
+    """Write data to the database. From XLSX to JSON (*.DB).
+    The binary catalog (*.<CRC32>.BIN, see catalog.get_binary_path) is saved next to the database.
+
+    Raw worksheet parts and device slices are fingerprinted. In the incremental mode nothing is done
+    if the workbook hasn't changed at all, worksheets which parts haven't changed aren't loaded,
+    and only new and changed slices of other worksheets are parsed.
+    Return changes: {'added': [...], 'changed': [...], 'removed': [...]} of (sheet, device name).
+
+    progress (see progress.Progress) follows the stages sheets (sheets parsed of the total) and write;
+    if it is cancelled, Cancelled is raised and the database is left as it was.
+    ValueError is raised and the database is left as it was if a device can't be scored
+    (an MCS without a distance, see catalog.build_table).
+    """
+
+    changes = {'added': [], 'changed': [], 'removed': []}
+    workbook = sha1(Path(file_xls).read_bytes()).hexdigest()
+    workbook_old, worksheets_old, devices_old = read_database(file_db)
+    if incremental and workbook == workbook_old:
+        write_binary_catalog(file_db)
+        return changes
+
+    worksheets = get_sheet_fingerprints(file_xls)
+    # Sheet title -> documents and fingerprints of slices, in the workbook order
+    sheets = dict.fromkeys(worksheets)
+    fingerprints = dict.fromkeys(worksheets)
+    progress.stage('sheets', len(worksheets))
+    for title, worksheet in worksheets.items():
+        if incremental and title in devices_old and worksheets_old.get(title) == worksheet:
+            fingerprints[title], sheets[title] = devices_old[title]
+            progress.advance()
+    changed = [title for title in worksheets if sheets[title] is None]
+    if changed:
+        wb = load_workbook(filename=file_xls, read_only=True)
+        try:
+            for title in changed:
+                slices_old = dict(zip(*devices_old.get(title, ((), ()))))
+                sheets[title] = []
+                fingerprints[title] = []
+                for slice in get_slices(wb[title]):
+                    progress.check()
+                    fingerprint = get_fingerprint(slice)
+                    document = slices_old.get(fingerprint) if incremental else None
+                    if document is None:
+                        document = create_document(*analyze_slice(slice))
+                    sheets[title].append(document)
+                    fingerprints[title].append(fingerprint)
+                progress.advance()
+        finally:
+            wb.close()
+
+    for title in sheets.keys() | devices_old.keys():
+        fingerprints_old, documents_old = devices_old.get(title, ((), ()))
+        names_old = {document['Name']: fingerprint for fingerprint, document in zip(fingerprints_old, documents_old)}
+        names = {document['Name']: fingerprint for fingerprint, document in zip(fingerprints.get(title, []),
+                                                                                 sheets.get(title, []))}
+        changes['added'].extend((title, name) for name in names.keys() - names_old.keys())
+        changes['removed'].extend((title, name) for name in names_old.keys() - names.keys())
+        changes['changed'].extend((title, name) for name in names.keys() & names_old.keys()
+                                  if names[name] != names_old[name])
+    for items in changes.values():
+        items.sort()
 
-    result = {'Family': family,
-              'Name': name,
-              'Model': model,
-              'Type': type,
-              'Antenna': antenna,
-              'RF Cable': cable,
-              'Capacity': capacity,
-              'Availability': availability
-              }
-    table.insert(result)
+    progress.stage('write')
+    # Devices which can't be scored (see catalog.build_table) are rejected before the database is written
+    catalog = DeviceCatalog.from_documents({title: documents for title, documents in sheets.items()
+                                            if not title.startswith('_')})
+    write_database(file_db, sheets, workbook, worksheets, fingerprints)
+    write_binary_catalog(file_db, catalog)
+    return changes
 
 
-def update_database(file_db, file_xls):
-    """Write data to the database. From XLSX to JSON (*.DB)."""
+def describe_changes(changes):
+    """Return a short summary of changes."""
 
-    db = TinyDB(file_db)
-    db.drop_tables()
-    wb = load_workbook(filename=file_xls)
-    for sheet in wb:
-        table = db.table(sheet.title)
-        for slice in get_slices(sheet):
-            device = analyze_slice(*slice, sheet)
-            write_db(table, *device)
+    summary = ', '.join(f'{len(items)} {change}' for change, items in changes.items() if items)
+    return summary or 'no changes'
 
 
 if __name__ == "__main__":
     file_db = Path.cwd() / 'devices.db'
     file_xls = Path.cwd() / 'devices.xlsx'
-    update_database(file_db, file_xls)
+    changes = update_database(file_db, file_xls)
+    print(f'Database has been updated: {describe_changes(changes)}')
+    for change, items in changes.items():
+        for title, name in items:
+            print(f'{change.capitalize()}: {name} ({title})')
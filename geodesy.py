@@ -0,0 +1,83 @@
+import numpy as np
+
+
+# WGS-84 (the same ellipsoid geopy.distance.distance() uses), km
+ELLIPSOID_A = 6378.137
+ELLIPSOID_F = 1 / 298.257223563
+ELLIPSOID_B = ELLIPSOID_A * (1 - ELLIPSOID_F)
+
+# Distances computed by Vincenty's formulae differ from Karney's geodesics (geopy) less than this, km
+DEFAULT_ACCURACY = 1e-6
+
+
+def vincenty(lat_a, lon_a, lat_b, lon_b, iterations=200):
+    """Vincenty's inverse formula for arrays of points (degrees).
+    Return distances in km and a mask of points where the formula converged
+    (it may not converge for nearly antipodal points).
+    """
+
+    f = ELLIPSOID_F
+    lat_a, lon_a, lat_b, lon_b = (np.radians(np.asarray(x, dtype=np.float64)) for x in (lat_a, lon_a, lat_b, lon_b))
+    lon_diff = lon_b - lon_a
+    u_a = np.arctan((1 - f) * np.tan(lat_a))
+    u_b = np.arctan((1 - f) * np.tan(lat_b))
+    sin_u_a, cos_u_a = np.sin(u_a), np.cos(u_a)
+    sin_u_b, cos_u_b = np.sin(u_b), np.cos(u_b)
+
+    lam = lon_diff.copy()
+    converged = np.zeros(lam.shape, dtype=bool)
+    with np.errstate(invalid='ignore', divide='ignore'):
+        for _ in range(iterations):
+            sin_lam, cos_lam = np.sin(lam), np.cos(lam)
+            sin_sigma = np.hypot(cos_u_b * sin_lam, cos_u_a * sin_u_b - sin_u_a * cos_u_b * cos_lam)
+            cos_sigma = sin_u_a * sin_u_b + cos_u_a * cos_u_b * cos_lam
+            sigma = np.arctan2(sin_sigma, cos_sigma)
+            sin_alpha = np.where(sin_sigma == 0, 0.0, cos_u_a * cos_u_b * sin_lam / sin_sigma)
+            cos_sq_alpha = 1 - sin_alpha ** 2
+            # Equatorial lines have cos_sq_alpha = 0
+            cos_2sigma_m = np.where(cos_sq_alpha == 0, 0.0, cos_sigma - 2 * sin_u_a * sin_u_b / cos_sq_alpha)
+            c = f / 16 * cos_sq_alpha * (4 + f * (4 - 3 * cos_sq_alpha))
+            lam_prev = lam
+            lam = lon_diff + (1 - c) * f * sin_alpha * (
+                sigma + c * sin_sigma * (cos_2sigma_m + c * cos_sigma * (-1 + 2 * cos_2sigma_m ** 2)))
+            converged = np.abs(lam - lam_prev) <= 1e-12
+            if converged.all():
+                break
+
+    u_sq = cos_sq_alpha * (ELLIPSOID_A ** 2 - ELLIPSOID_B ** 2) / ELLIPSOID_B ** 2
+    coef_a = 1 + u_sq / 16384 * (4096 + u_sq * (-768 + u_sq * (320 - 175 * u_sq)))
+    coef_b = u_sq / 1024 * (256 + u_sq * (-128 + u_sq * (74 - 47 * u_sq)))
+    delta_sigma = coef_b * sin_sigma * (cos_2sigma_m + coef_b / 4 * (
+        cos_sigma * (-1 + 2 * cos_2sigma_m ** 2)
+        - coef_b / 6 * cos_2sigma_m * (-3 + 4 * sin_sigma ** 2) * (-3 + 4 * cos_2sigma_m ** 2)))
+    result = ELLIPSOID_B * coef_a * (sigma - delta_sigma)
+    converged &= np.isfinite(result)
+    return np.where(converged, result, np.nan), converged
+
+
+def geodesic(lat_a, lon_a, lat_b, lon_b):
+    """Distance between two points in km (geopy, Karney's algorithm)."""
+
+    from geopy import distance as gedistance
+    from geopy import point as gepoint
+
+    point_a = gepoint.Point(latitude=lat_a, longitude=lon_a)
+    point_b = gepoint.Point(latitude=lat_b, longitude=lon_b)
+    return gedistance.distance(point_a, point_b).km
+
+
+def link_distances(lat_a, lon_a, lat_b, lon_b, accuracy=DEFAULT_ACCURACY):
+    """Distances of links in km rounded to 2 decimals.
+    Vincenty's formulae are used for all links at once. A link is recalculated with geopy
+    if the formula didn't converge or if its distance is closer than `accuracy` (km)
+    to a rounding boundary, so the result is the same as round(geopy distance, 2).
+    """
+
+    lat_a, lon_a, lat_b, lon_b = (np.asarray(x, dtype=np.float64) for x in (lat_a, lon_a, lat_b, lon_b))
+    result, converged = vincenty(lat_a, lon_a, lat_b, lon_b)
+    fraction = result * 100 - np.floor(result * 100)
+    ambiguous = ~converged | (np.abs(fraction - 0.5) <= accuracy * 100)
+    result = np.round(result, 2)
+    for link_id in np.flatnonzero(ambiguous):
+        result[link_id] = round(geodesic(lat_a[link_id], lon_a[link_id], lat_b[link_id], lon_b[link_id]), 2)
+    return result
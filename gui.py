@@ -3,12 +3,23 @@ import tkinter.filedialog as fd
 import webbrowser
 from configparser import ConfigParser
 from pathlib import Path
+from queue import Empty, Queue
 from re import compile
+from threading import Event, Thread
+from time import perf_counter
 from tkinter import font as tkfont
 from tkinter import ttk
 
-from csvhandler import handle
-from dbupdater import update_database
+from csvhandler import handle, setup_logging
+from progress import Cancelled, Progress
+from reloader import Reloader
+
+
+# Names of progress stages (see progress.Progress) shown in the window
+STAGE_NAMES = {'catalog': 'Loading devices',
+               'links': 'Processing links',
+               'write': 'Writing files',
+               'sheets': 'Reading sheets'}
 
 
 class Application(tk.Tk):
@@ -16,11 +27,15 @@ class Application(tk.Tk):
 
     def __init__(self, *args, **kwargs):
         tk.Tk.__init__(self, *args, **kwargs)
-        self.geometry('450x460')
+        self.geometry('450x560')
         self.title('InfiPLANNER project generator')
 
         self.container = tk.Frame(self)
 
+        # devices.db and config.ini are watched, changes are applied without restarting
+        self.reloader = Reloader()
+        self.reloader.start()
+
         self.frames = {}
         for page in (MainPage, SettingsPage, HelpPage, AboutPage):
             page_name = page.__name__
@@ -64,6 +79,97 @@ class Application(tk.Tk):
         frame.tkraise()
 
 
+class BackgroundTask:
+    """Run a long function in a worker thread, so the window isn't frozen.
+
+    The function gets a Progress, its states and the result are passed to the Tk thread by a queue
+    polled every `interval` ms: on_progress(stage, done, total, eta) and on_done(result, error)
+    are called in the Tk thread. eta is the remaining time of the stage in seconds (None if unknown).
+    """
+
+    def __init__(self, widget, function, on_progress, on_done, interval=100):
+        self.widget = widget
+        self.function = function
+        self.on_progress = on_progress
+        self.on_done = on_done
+        self.interval = interval
+        self.queue = Queue()
+        self.cancel_event = Event()
+        self.stage = None
+        self.stage_started = None
+
+    def start(self):
+        """Start the worker thread and polling of the queue."""
+
+        Thread(target=self.run, daemon=True).start()
+        self.widget.after(self.interval, self.poll)
+
+    def cancel(self):
+        """Ask the function to stop, Cancelled is passed to on_done when it has stopped."""
+
+        self.cancel_event.set()
+
+    def run(self):
+        """Call the function (in the worker thread)."""
+
+        progress = Progress(lambda stage, done, total: self.queue.put(('progress', (stage, done, total,
+                                                                                    perf_counter()))),
+                            self.cancel_event)
+        try:
+            self.queue.put(('done', (self.function(progress), None)))
+        except Exception as error:
+            self.queue.put(('done', (None, error)))
+
+    def poll(self):
+        """Pass the queued states to the callbacks, only the last progress state is shown."""
+
+        state = None
+        while True:
+            try:
+                message, data = self.queue.get_nowait()
+            except Empty:
+                break
+            if message == 'done':
+                self.on_done(*data)
+                return
+            stage, done, total, timestamp = data
+            if stage != self.stage:
+                self.stage, self.stage_started = stage, timestamp
+            eta = None
+            if total and done:
+                eta = (timestamp - self.stage_started) * (total - done) / done
+            state = (stage, done, total, eta)
+        if state is not None:
+            self.on_progress(*state)
+        self.widget.after(self.interval, self.poll)
+
+
+def show_progress(progress_bar, status_lbl, stage, done, total, eta, unit):
+    """Show the progress state on the progress bar and the status label."""
+
+    name = STAGE_NAMES.get(stage, stage)
+    if total:
+        progress_bar.stop()
+        progress_bar.config(mode='determinate', maximum=total, value=done)
+        status = f'{name}: {done} of {total} {unit}'
+        if eta is not None:
+            status += f', {int(eta) // 60}:{int(eta) % 60:02d} left'
+    else:
+        if str(progress_bar.cget('mode')) != 'indeterminate':
+            progress_bar.config(mode='indeterminate', value=0)
+            progress_bar.start()
+        status = f'{name}...'
+    status_lbl.config(text=status)
+
+
+def reset_progress(progress_bar, status_lbl, status=''):
+    """Stop the progress bar and show the final status."""
+
+    progress_bar.stop()
+    progress_bar.config(mode='determinate', value=0)
+    status_lbl.config(text=status)
+
+
 class MainPage(tk.Frame):
     """Main Page."""
 
@@ -84,11 +190,15 @@ class MainPage(tk.Frame):
                                      command=self.upload_file, font=self.font_btn)
         self.csv_path_txt = tk.Text(self, wrap='word', width=30, height=3, bg='Gray94', relief='flat')
         self.csv_path_txt.config(state='disabled')
-        self.start_btn = tk.Button(self, text='Start', width=30, height=5,
+        self.start_btn = tk.Button(self, text='Start', width=30, height=4,
                                    command=self.generate_project, font=self.font_btn)
+        self.cancel_btn = tk.Button(self, text='Cancel', width=16, command=self.cancel, state='disabled')
         self.start_txt = tk.Text(self, wrap='word', width=30, height=3, bg='Gray94',
                                  relief='flat', font=self.font_result)
         self.start_txt.config(state='disabled')
+        self.progress_bar = ttk.Progressbar(self, orient='horizontal', length=360, mode='determinate')
+        self.progress_lbl = tk.Label(self, text='')
+        self.task = None
         self.gui()
 
     def gui(self):
@@ -98,7 +208,10 @@ class MainPage(tk.Frame):
         self.csv_upl_btn.pack(padx=10, pady=10)
         self.csv_path_txt.pack(padx=10, pady=10)
         self.start_txt.pack(padx=10, pady=10)
-        self.start_btn.pack(side='bottom', padx=30, pady=30)
+        self.progress_bar.pack(padx=10, pady=2)
+        self.progress_lbl.pack(padx=10, pady=2)
+        self.cancel_btn.pack(side='bottom', padx=10, pady=10)
+        self.start_btn.pack(side='bottom', padx=30, pady=10)
         self.frame.pack()
 
         self.grid()
@@ -116,22 +229,60 @@ class MainPage(tk.Frame):
         self.csv_path_txt.config(state='disabled')
 
     def generate_project(self):
-        """Start csvhandler."""
-        try:
-            handle(Path(self.var_csv_path.get()))
-            self.start_txt.config(state='normal', fg='green')
-            self.start_txt.delete('0.0', 'end')
-            self.start_txt.insert('0.0', f'Project has been successfully generated')
-            self.start_txt.tag_add('center', '0.0', 'end')
-            self.start_txt.tag_config('center', justify='center')
-            self.start_txt.config(state='disabled')
-        except:
-            self.start_txt.config(state='normal', fg='red')
-            self.start_txt.delete('0.0', 'end')
-            self.start_txt.insert('0.0', f'Error')
-            self.start_txt.tag_add('center', '0.0', 'end')
-            self.start_txt.tag_config('center', justify='center')
-            self.start_txt.config(state='disabled')
+        """Start csvhandler in a worker thread."""
+
+        input_file = Path(self.var_csv_path.get())
+        reloader = self.controller.reloader
+        self.start_btn.config(state='disabled')
+        self.cancel_btn.config(state='normal')
+        self.show_result('', 'black')
+
+        def generate(progress):
+            # The run keeps this catalog, profile and config even if they are reloaded meanwhile
+            catalog, profile, config = reloader.get()
+            return handle(input_file, catalog, profile=profile, progress=progress, run_config=config)
+
+        self.task = BackgroundTask(self, generate, self.show_progress, self.finish)
+        self.task.start()
+
+    def cancel(self):
+        """Cancel project generation."""
+
+        if self.task is not None:
+            self.task.cancel()
+            self.cancel_btn.config(state='disabled')
+            self.progress_lbl.config(text='Cancelling...')
+
+    def show_progress(self, stage, done, total, eta):
+        """Show the progress of project generation."""
+
+        show_progress(self.progress_bar, self.progress_lbl, stage, done, total, eta, 'links')
+
+    def finish(self, report, error):
+        """Show the result of project generation."""
+
+        self.task = None
+        self.start_btn.config(state='normal')
+        self.cancel_btn.config(state='disabled')
+        if error is None:
+            reset_progress(self.progress_bar, self.progress_lbl)
+            self.show_result('Project has been successfully generated', 'green')
+        elif isinstance(error, Cancelled):
+            reset_progress(self.progress_bar, self.progress_lbl, 'Cancelled')
+            self.show_result('Project generation has been cancelled', 'red')
+        else:
+            reset_progress(self.progress_bar, self.progress_lbl)
+            self.show_result('Error', 'red')
+
+    def show_result(self, text, color):
+        """Show the result text."""
+
+        self.start_txt.config(state='normal', fg=color)
+        self.start_txt.delete('0.0', 'end')
+        self.start_txt.insert('0.0', text)
+        self.start_txt.tag_add('center', '0.0', 'end')
+        self.start_txt.tag_config('center', justify='center')
+        self.start_txt.config(state='disabled')
 
 
 class SettingsPage(tk.Frame):
@@ -274,6 +425,13 @@ class SettingsPage(tk.Frame):
         self.set_xls_txt.insert('0.0', f'{self.var_xls_path.get()}')
         self.set_xls_txt.config(state='disable')
         self.set_db_upd_btn = tk.Button(self, text='Update database', command=self.update_db, width=16, height=1)
+        self.db_upd_ok_lbl = tk.Label(self, text='OK', fg='green', font=self.font_bold)
+        self.db_upd_error_lbl = tk.Label(self, text='ERROR', fg='red', font=self.font_bold)
+        self.db_upd_progress_bar = ttk.Progressbar(self, orient='horizontal', length=120, mode='determinate')
+        self.db_upd_progress_lbl = tk.Label(self, text='')
+        self.db_upd_cancel_btn = tk.Button(self, text='Cancel', command=self.cancel_update_db, width=12, height=1,
+                                           state='disabled')
+        self.db_upd_task = None
 
         # Output settings
         self.set_out_lbl = tk.Label(self, text='Output settings', font=self.font_bold)
@@ -350,6 +508,9 @@ class SettingsPage(tk.Frame):
         self.set_xls_btn.grid(column=2, row=15, sticky='w', padx=2, pady=2)
         self.set_xls_txt.grid(column=1, row=16, sticky='nsew', columnspan=2, rowspan=3, padx=2, pady=2)
         self.set_db_upd_btn.grid(column=1, row=20, sticky='w', columnspan=2, padx=2, pady=2)
+        self.db_upd_progress_bar.grid(column=1, row=21, sticky='w', padx=2, pady=2)
+        self.db_upd_cancel_btn.grid(column=2, row=21, sticky='e', padx=2, pady=2)
+        self.db_upd_progress_lbl.grid(column=1, row=22, sticky='w', columnspan=2, padx=2, pady=2)
 
         # Output settings
         self.set_out_lbl.grid(column=4, row=9, sticky='w', columnspan=2, padx=2, pady=2)
@@ -447,18 +608,50 @@ class SettingsPage(tk.Frame):
         return ', '.join(self.temp_var_pr_req_excl)
 
     def update_db(self):
-        """Update database (dbupdater.py)."""
+        """Update database (dbupdater.py) in a worker thread. Only changed devices are parsed."""
 
-        try:
-            self.db_upd_ok_lbl = tk.Label(self, text='OK', fg='green', font=self.font_bold)
-            self.db_upd_error_lbl = tk.Label(self, text='ERROR', fg='red', font=self.font_bold)
+        file_db, file_xls = self.var_db_path.get(), self.var_xls_path.get()
+        self.db_upd_ok_lbl.grid_forget()
+        self.db_upd_error_lbl.grid_forget()
+        self.set_db_upd_btn.config(state='disabled')
+        self.db_upd_cancel_btn.config(state='normal')
+
+        def update(progress):
+            # openpyxl is loaded only when the database is updated
+            from dbupdater import describe_changes, update_database
+
+            return describe_changes(update_database(file_db, file_xls, progress=progress))
 
-            update_database(self.var_db_path.get(), self.var_xls_path.get())
+        self.db_upd_task = BackgroundTask(self, update, self.show_update_progress, self.finish_update_db)
+        self.db_upd_task.start()
 
-            self.db_upd_error_lbl.grid_forget()
+    def cancel_update_db(self):
+        """Cancel the database update."""
+
+        if self.db_upd_task is not None:
+            self.db_upd_task.cancel()
+            self.db_upd_cancel_btn.config(state='disabled')
+            self.db_upd_progress_lbl.config(text='Cancelling...')
+
+    def show_update_progress(self, stage, done, total, eta):
+        """Show the progress of the database update."""
+
+        show_progress(self.db_upd_progress_bar, self.db_upd_progress_lbl, stage, done, total, eta, 'sheets')
+
+    def finish_update_db(self, summary, error):
+        """Show the result of the database update."""
+
+        self.db_upd_task = None
+        self.set_db_upd_btn.config(state='normal')
+        self.db_upd_cancel_btn.config(state='disabled')
+        if error is None:
+            reset_progress(self.db_upd_progress_bar, self.db_upd_progress_lbl)
+            self.controller.reloader.check()
+            self.db_upd_ok_lbl.config(text=f'OK: {summary}')
             self.db_upd_ok_lbl.grid(column=2, row=20, sticky='e', padx=2, pady=2)
-        except:
-            self.db_upd_ok_lbl.grid_forget()
+        else:
+            reset_progress(self.db_upd_progress_bar, self.db_upd_progress_lbl,
+                           'Cancelled' if isinstance(error, Cancelled) else '')
             self.db_upd_error_lbl.grid(column=2, row=20, sticky='e', padx=2, pady=2)
 
     def save(self):
@@ -528,6 +721,8 @@ class SettingsPage(tk.Frame):
 
             with open(self.cfg_path, 'w') as config_file:
                 self.cfg.write(config_file)
+            # Apply new settings at once rather than on the next poll
+            self.controller.reloader.check()
 
             self.db_save_error_lbl.grid_forget()
             self.db_save_ok_lbl.grid(column=4, row=20, sticky='w', padx=2, pady=2)
@@ -615,5 +810,6 @@ class AboutPage(tk.Frame):
 
 
 if __name__=='__main__':
+    setup_logging()
     app = Application()
     app.mainloop()
@@ -0,0 +1,156 @@
+from argparse import ArgumentParser
+from functools import partial
+from glob import glob
+from pathlib import Path
+from time import perf_counter
+import sys
+
+import csvhandler
+from catalog import load_catalog
+from report import RunReport
+
+
+def find_projects(source):
+    """Return CSV files of a folder or files matching a glob pattern."""
+
+    if Path(source).is_dir():
+        return sorted(Path(source).glob('*.csv'))
+    return sorted(Path(path) for path in glob(source) if Path(path).is_file())
+
+
+def init_worker(catalog, profile, run_config=None):
+    """Keep the catalog, the scoring profile and the config in a worker process."""
+
+    csvhandler.init_worker(catalog, profile, run_config)
+
+
+def process_project(input_file, output_folder=None, batch=False, catalog=None, profile=None, alternatives=None,
+                    plan_links=None, neighbours=None, run_config=None):
+    """Create KMZ and BOM of one CSV file.
+    Return the summary of the project: name, links, written, rejected, seconds, error.
+    """
+
+    if catalog is None:
+        catalog, profile = csvhandler.worker_catalog, csvhandler.worker_profile
+        run_config = csvhandler.worker_config
+    started = perf_counter()
+    summary = {'name': Path(input_file).name, 'links': 0, 'written': 0, 'rejected': 0, 'seconds': 0.0,
+               'error': None}
+    try:
+        report = csvhandler.handle(input_file, catalog, batch, profile, report=RunReport(),
+                                   output_folder=output_folder, alternatives=alternatives, plan_links=plan_links,
+                                   neighbours=neighbours, run_config=run_config)
+        summary['links'] = report.counters.get('links', 0)
+        summary['written'] = report.counters.get('written_links', 0)
+        summary['rejected'] = report.counters.get('rejected_links', 0)
+        if summary['written'] == 0:
+            summary['error'] = 'no links have been written'
+    except Exception as error_msg:
+        summary['error'] = f'{type(error_msg).__name__}: {error_msg}'
+    summary['seconds'] = perf_counter() - started
+    return summary
+
+
+def run_batch(projects, output_folder=None, jobs=1, batch=False, alternatives=None, plan_links=None, neighbours=None):
+    """Process projects with the catalog, the scoring profile and the config loaded once.
+    Projects are processed by a pool of `jobs` processes. Yield summaries in the input order.
+    """
+
+    from concurrent.futures import ProcessPoolExecutor
+
+    run_config = csvhandler.get_config()
+    catalog = load_catalog(csvhandler.get_db_path(run_config))
+    profile = csvhandler.get_profile()
+    if jobs <= 1:
+        for input_file in projects:
+            yield process_project(input_file, output_folder, batch, catalog, profile, alternatives, plan_links,
+                                  neighbours, run_config)
+        return
+    with ProcessPoolExecutor(max_workers=jobs, initializer=init_worker, initargs=(catalog, profile, run_config)) as executor:
+        yield from executor.map(partial(process_project, output_folder=output_folder, batch=batch,
+                                        alternatives=alternatives, plan_links=plan_links, neighbours=neighbours),
+                                projects)
+
+
+def print_summary(summaries, seconds):
+    """Print the table of projects."""
+
+    width = max([len(summary['name']) for summary in summaries] + [7])
+    print(f'{"Project":<{width}}  {"Links":>7}  {"Written":>7}  {"Rejected":>8}  {"Time, s":>8}  Status')
+    for summary in summaries:
+        status = 'OK' if summary['error'] is None else f'FAILED ({summary["error"]})'
+        print(f'{summary["name"]:<{width}}  {summary["links"]:>7}  {summary["written"]:>7}  '
+              f'{summary["rejected"]:>8}  {summary["seconds"]:>8.2f}  {status}')
+    failed = sum(summary['error'] is not None for summary in summaries)
+    links = sum(summary['links'] for summary in summaries)
+    print(f'{len(summaries)} projects, {failed} failed, {links} links in {seconds:.2f} s')
+
+
+def batch_command(args):
+    """Process a folder (or a glob pattern) of CSV files."""
+
+    projects = find_projects(args.source)
+    if len(projects) == 0:
+        print(f'There are no CSV files in {args.source}.')
+        return 1
+    csvhandler.setup_logging('WARNING' if args.quiet else 'DEBUG')
+    started = perf_counter()
+    summaries = list(run_batch(projects, args.out, args.jobs, args.batch, args.alternatives, args.plan,
+                               args.neighbours))
+    print_summary(summaries, perf_counter() - started)
+    return 0 if all(summary['error'] is None for summary in summaries) else 1
+
+
+def serve_command(args):
+    """Run the planning service until it is interrupted."""
+
+    from asyncio import run
+    from reloader import Reloader
+    from service import PlanningService
+
+    csvhandler.setup_logging('WARNING' if args.quiet else 'INFO')
+    reloader = Reloader(interval=args.reload_interval)
+    catalog, profile, config = reloader.get()
+    service = PlanningService(catalog, profile, config, args.workers, 'WARNING' if args.quiet else 'INFO')
+    # devices.db and config.ini are watched, the pool of workers is replaced when they change
+    reloader.on_reload = service.reload
+    reloader.start()
+    try:
+        run(service.serve(args.host, args.port))
+    except KeyboardInterrupt:
+        pass
+    finally:
+        reloader.stop()
+    return 0
+
+
+def main(argv=None):
+    parser = ArgumentParser(prog='iwpgen', description='InfiPLANNER project generator.')
+    commands = parser.add_subparsers(dest='command', required=True)
+    batch_parser = commands.add_parser('batch', help='create projects from many CSV files')
+    batch_parser.add_argument('source', help='folder with CSV files or a glob pattern')
+    batch_parser.add_argument('--out', type=Path, help='output folder (the config one by default)')
+    batch_parser.add_argument('--jobs', type=int, default=1, help='number of projects processed at once')
+    batch_parser.add_argument('--batch', action='store_true', help='score chunks of links with NumPy')
+    batch_parser.add_argument('--alternatives', type=int,
+                              help='save N ranked alternatives of every link (the config value by default)')
+    batch_parser.add_argument('--plan', action='store_true', default=None,
+                              help='CSV files are lists of sites, propose links between sites within reach')
+    batch_parser.add_argument('--neighbours', type=int,
+                              help='propose links only to N nearest sites (the config value by default)')
+    batch_parser.add_argument('--quiet', action='store_true', help='show only warnings and errors')
+    batch_parser.set_defaults(function=batch_command)
+    serve_parser = commands.add_parser('serve', help='run the local HTTP planning service')
+    serve_parser.add_argument('--host', default='127.0.0.1', help='address to listen on')
+    serve_parser.add_argument('--port', type=int, default=8080)
+    serve_parser.add_argument('--workers', type=int, help='number of worker processes (CPU count by default)')
+    serve_parser.add_argument('--reload-interval', type=float, default=2.0,
+                              help='seconds between checks of devices.db and config.ini (0 - never)')
+    serve_parser.add_argument('--quiet', action='store_true', help='show only warnings and errors')
+    serve_parser.set_defaults(function=serve_command)
+    args = parser.parse_args(argv)
+    return args.function(args)
+
+
+if __name__ == '__main__':
+    sys.exit(main())
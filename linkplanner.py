@@ -0,0 +1,144 @@
+from math import asin, ceil, degrees, floor, radians, sin, cos
+
+import numpy as np
+
+from geodesy import link_distances
+
+
+# Mean radius of the Earth, km
+EARTH_RADIUS = 6371.0088
+# Great-circle distances on the mean sphere differ from ellipsoidal ones less than 0.6 %,
+# pairs are preselected on the sphere with this margin and then checked with exact distances
+SPHERE_MARGIN = 1.01
+# Distances are rounded to 0.01 km
+ROUNDING_MARGIN = 0.01
+# Exact distances of this many preselected pairs are calculated at once
+PAIR_BATCH = 65536
+
+
+class SiteGrid:
+    """Spatial hash of sites: a latitude/longitude grid of cells about `radius` km high.
+
+    query() returns sites of the cells which can contain points within `radius` km
+    (great-circle distance) of a point, so only neighbouring cells are checked.
+    The grid wraps at the antimeridian, around the poles whole rows are checked.
+    """
+
+    __slots__ = ('radius', 'step', 'columns', 'rows', 'cells')
+
+    def __init__(self, radius):
+        self.radius = radius
+        # Cells are square in degrees, 360 is a multiple of the step, so columns wrap exactly
+        self.columns = max(1, ceil(360 / degrees(radius / EARTH_RADIUS)))
+        self.step = 360 / self.columns
+        self.rows = ceil(180 / self.step)
+        # (row, column) -> site ids
+        self.cells = {}
+
+    def get_cell(self, latitude, longitude):
+        """Return (row, column) of the point."""
+
+        row = min(floor((latitude + 90) / self.step), self.rows - 1)
+        return row, floor(((longitude + 180) % 360) / self.step) % self.columns
+
+    def add(self, site_id, latitude, longitude):
+        """Put the site into its cell."""
+
+        self.cells.setdefault(self.get_cell(latitude, longitude), []).append(site_id)
+
+    def query(self, latitude, longitude):
+        """Return ids of sites which can be within the radius of the point (a superset)."""
+
+        lat_delta = degrees(self.radius / EARTH_RADIUS)
+        first_row = max(floor((latitude - lat_delta + 90) / self.step), 0)
+        last_row = min(floor((latitude + lat_delta + 90) / self.step), self.rows - 1)
+        if abs(latitude) + lat_delta >= 90:
+            # The circle contains a pole, all longitudes are within reach
+            columns = range(self.columns)
+        else:
+            # Bounding box of a circle on the sphere
+            lon_delta = degrees(asin(min(1.0, sin(self.radius / EARTH_RADIUS) / cos(radians(latitude)))))
+            position = (longitude + 180) % 360
+            first_column = floor((position - lon_delta) / self.step)
+            last_column = floor((position + lon_delta) / self.step)
+            if last_column - first_column + 1 >= self.columns:
+                columns = range(self.columns)
+            else:
+                columns = [column % self.columns for column in range(first_column, last_column + 1)]
+        site_ids = []
+        for row in range(first_row, last_row + 1):
+            for column in columns:
+                site_ids.extend(self.cells.get((row, column), ()))
+        return np.array(site_ids, dtype=np.int64)
+
+
+def haversine(lat_a, lon_a, lat_b, lon_b):
+    """Great-circle distances on the mean sphere for arrays of points (degrees), km."""
+
+    lat_a, lon_a, lat_b, lon_b = (np.radians(x) for x in (lat_a, lon_a, lat_b, lon_b))
+    h = np.sin((lat_b - lat_a) / 2) ** 2 + np.cos(lat_a) * np.cos(lat_b) * np.sin((lon_b - lon_a) / 2) ** 2
+    return 2 * EARTH_RADIUS * np.arcsin(np.sqrt(np.minimum(h, 1.0)))
+
+
+def iter_site_pairs(latitudes, longitudes, reaches, neighbours=0, batch_size=PAIR_BATCH):
+    """Find pairs of sites within reach without comparing every site with every other one (see SiteGrid).
+    The pair (i, j), i < j, is within reach if 0 < distance <= reaches[i]: a link takes the requirements
+    of its first site. If neighbours is positive, a pair is kept only if one of its sites is among
+    the `neighbours` nearest sites (within reach) of the other one.
+    Yield (i, j, distance) sorted by i and j, distances are in km (geodesy.link_distances).
+    """
+
+    lat = np.asarray(latitudes, dtype=np.float64)
+    lon = np.asarray(longitudes, dtype=np.float64)
+    reach = np.asarray(reaches, dtype=np.float64)
+    if len(lat) < 2 or reach.max() <= 0:
+        return
+    grid = SiteGrid(reach.max() * SPHERE_MARGIN + ROUNDING_MARGIN)
+    for site_id in range(len(lat)):
+        grid.add(site_id, lat[site_id], lon[site_id])
+
+    # Preselected pairs of consecutive sites, their exact distances are calculated at once
+    buffer = []
+    buffered = 0
+    pairs = {}
+    for site_id in range(len(lat)):
+        candidates = grid.query(lat[site_id], lon[site_id])
+        # Without the nearest neighbours every pair is found from its first site
+        candidates = candidates[candidates > site_id] if neighbours <= 0 else candidates[candidates != site_id]
+        # The first site of the pair gives the reach and the direction of the link
+        first = candidates > site_id
+        pair_reach = np.where(first, reach[site_id], reach[candidates])
+        close = haversine(lat[site_id], lon[site_id], lat[candidates], lon[candidates]) <= \
+            pair_reach * SPHERE_MARGIN + ROUNDING_MARGIN
+        if close.any():
+            buffer.append((np.full(np.count_nonzero(close), site_id), candidates[close], first[close],
+                           pair_reach[close]))
+            buffered += len(buffer[-1][0])
+        if buffered >= batch_size or site_id == len(lat) - 1:
+            if buffered == 0:
+                continue
+            site_ids, others, first, pair_reach = (np.concatenate(column) for column in zip(*buffer))
+            buffer = []
+            buffered = 0
+            distances = link_distances(np.where(first, lat[site_ids], lat[others]),
+                                       np.where(first, lon[site_ids], lon[others]),
+                                       np.where(first, lat[others], lat[site_ids]),
+                                       np.where(first, lon[others], lon[site_ids]))
+            within = (distances > 0) & (distances <= pair_reach)
+            site_ids, others, distances = site_ids[within], others[within], distances[within]
+            if neighbours <= 0:
+                order = np.lexsort((others, site_ids))
+                yield from zip(site_ids[order].tolist(), others[order].tolist(), distances[order].tolist())
+                continue
+            # The nearest sites of every site: sorted by the site and the distance, ranks within the site
+            order = np.lexsort((distances, site_ids))
+            site_ids, others, distances = site_ids[order], others[order], distances[order]
+            starts = np.flatnonzero(np.r_[True, site_ids[1:] != site_ids[:-1]])
+            ranks = np.arange(len(site_ids)) - np.repeat(starts, np.diff(np.r_[starts, len(site_ids)]))
+            nearest = ranks < neighbours
+            for site_a, site_b, distance in zip(np.minimum(site_ids, others)[nearest].tolist(),
+                                                np.maximum(site_ids, others)[nearest].tolist(),
+                                                distances[nearest].tolist()):
+                pairs[(site_a, site_b)] = distance
+    for (site_a, site_b), distance in sorted(pairs.items()):
+        yield site_a, site_b, distance
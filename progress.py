@@ -0,0 +1,70 @@
+class Cancelled(Exception):
+    """Raised by Progress when the task has been cancelled."""
+
+
+class Progress:
+    """Progress of a long task (project generation, database update).
+
+    callback(stage, done, total) is called when a stage starts and then about 200 times per stage
+    (every 100 items if the total is unknown), it is called from the thread running the task.
+    cancel is an object with is_set() (threading.Event), Cancelled is raised on the next step
+    after it is set.
+    """
+
+    enabled = True
+
+    def __init__(self, callback=None, cancel=None):
+        self.callback = callback
+        self.cancel = cancel
+        self.stage_name = None
+        self.done = 0
+        self.total = None
+        self.step = 100
+        self.notified = 0
+
+    def stage(self, stage, total=None):
+        """Start the stage of `total` items (None if unknown)."""
+
+        self.check()
+        self.stage_name = stage
+        self.done = 0
+        self.total = total
+        self.step = max(1, total // 200) if total else 100
+        self.notified = 0
+        if self.callback is not None:
+            self.callback(stage, 0, total)
+
+    def advance(self, count=1):
+        """Mark items of the current stage as done."""
+
+        self.check()
+        self.done += count
+        if self.callback is not None and self.done - self.notified >= self.step:
+            self.notified = self.done
+            self.callback(self.stage_name, self.done, self.total)
+
+    def check(self):
+        """Raise Cancelled if the task has been cancelled."""
+
+        if self.cancel is not None and self.cancel.is_set():
+            raise Cancelled('The task has been cancelled.')
+
+
+class NullProgress:
+    """Progress which ignores everything, it is used when nobody follows the task."""
+
+    __slots__ = ()
+
+    enabled = False
+
+    def stage(self, stage, total=None):
+        pass
+
+    def advance(self, count=1):
+        pass
+
+    def check(self):
+        pass
+
+
+NULL_PROGRESS = NullProgress()
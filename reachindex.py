@@ -0,0 +1,170 @@
+from bisect import bisect_left, bisect_right
+
+from scoring import EXCLUDE_BITS
+
+
+# Candidates are selected by approximate weights with this tolerance, then their exact weights are compared
+TOLERANCE = 1e-6
+
+
+class ReachGroup:
+    """Devices with the same weight_excl sorted by their reach (the distance of the closest MCS).
+
+    For a link distance L the devices reach[pos:] can establish the link (reach >= L)
+    and reach[:pos] can't. Weights of both parts are linear in L, so the best weight
+    of every part is known from suffix and prefix minimums:
+    reachable - weight_cap + reach - L, unreachable - (-weight_cost) - reach + L.
+    """
+
+    __slots__ = ('weight_excl', 'rows', 'reach', 'reachable_min', 'unreachable_min')
+
+    def __init__(self, weight_excl, rows, reach, reachable_key, unreachable_key):
+        self.weight_excl = weight_excl
+        self.rows = rows
+        self.reach = reach
+        # reachable_min[pos] - minimum key of rows[pos:]
+        self.reachable_min = list(reachable_key)
+        for pos in range(len(rows) - 2, -1, -1):
+            self.reachable_min[pos] = min(self.reachable_min[pos], self.reachable_min[pos + 1])
+        # unreachable_min[pos] - minimum key of rows[:pos + 1]
+        self.unreachable_min = list(unreachable_key)
+        for pos in range(1, len(rows)):
+            self.unreachable_min[pos] = min(self.unreachable_min[pos], self.unreachable_min[pos - 1])
+
+
+class ReachEntry:
+    """Closest MCS of every device of a bandwidth table for a capacity interval and an availability."""
+
+    __slots__ = ('req_cap', 'weight_exclude', 'mcs_cap', 'reach', 'costs', 'options', 'mask', 'groups')
+
+    def __init__(self, table, req_avb, req_cap, profile):
+        self.req_cap = req_cap
+        self.weight_exclude = profile.weight_exclude
+        self.mcs_cap = []
+        self.reach = []
+        self.costs = []
+        # Bit of the exclude option (see scoring.EXCLUDE_BITS) -> rows
+        self.options = {}
+        for row in range(len(table)):
+            weight_cost, dev_excl_option = profile.get_weights(table.families[row])
+            dev_mcs_clst = table.closest_mcs(row, req_cap)
+            self.mcs_cap.append(dev_mcs_clst[1])
+            self.reach.append(table.mcs_distance(row, req_avb, dev_mcs_clst[0]))
+            self.costs.append(weight_cost)
+            self.options.setdefault(EXCLUDE_BITS[dev_excl_option], []).append(row)
+        # Bits of the options of the table
+        self.mask = sum(self.options)
+        # Excluded options -> groups of devices (not excluded and excluded ones)
+        self.groups = {}
+
+    def get_groups(self, link_excl):
+        """Return groups of devices for the excluded options of the link (a bitmask)."""
+
+        mask = link_excl & self.mask
+        groups = self.groups.get(mask)
+        if groups is None:
+            groups = self.groups[mask] = []
+            for excluded in (False, True):
+                rows = [row for bit, option_rows in self.options.items() if bool(mask & bit) is excluded
+                        for row in option_rows]
+                if len(rows) == 0:
+                    continue
+                rows.sort(key=lambda x: self.reach[x])
+                reachable_key = [self.get_weight_cap(row) + self.reach[row] for row in rows]
+                unreachable_key = [-self.costs[row] - self.reach[row] for row in rows]
+                groups.append(ReachGroup(self.weight_exclude if excluded else 0, rows,
+                                         [self.reach[row] for row in rows], reachable_key, unreachable_key))
+        return groups
+
+    def get_weight_cap(self, row):
+        """Return weight_cap of a device which reaches the link.
+        The requested capacity of any link of the interval gives the same result.
+        """
+
+        return -self.costs[row] if self.req_cap > self.mcs_cap[row] else self.costs[row]
+
+    def get_weight(self, row, req_cap, link_dist, weight_excl):
+        """Calculate the weight exactly like csvhandler.get_recommendations() does."""
+
+        weight_cost = self.costs[row]
+        if req_cap > self.mcs_cap[row]:
+            weight_cap = weight_cost * -1
+        else:
+            weight_cap = weight_cost
+        if (link_dist - self.reach[row]) > 0:
+            weight_cap = weight_cost * -1
+            weight_dist = link_dist - self.reach[row]
+        else:
+            weight_dist = (link_dist - self.reach[row]) * -1
+        return weight_cap + weight_dist + weight_excl
+
+
+class ReachIndex:
+    """Index of device reach for the recommendations.
+
+    Devices are split by the closest MCS: it is the same for all capacities between two breakpoints
+    of a bandwidth table, so entries are built once per (frequency range, bandwidth, availability,
+    capacity interval) on demand. Only devices which best weights are within TOLERANCE
+    of the best weight of the link are scored, the winner is the same as the full scan gives.
+    """
+
+    def __init__(self, catalog, profile):
+        self.catalog = catalog
+        self.profile = profile
+        self.weights = profile.get_key()
+        # Devices scored with the exact formula
+        self.scored = 0
+        # (band, bandwidth) -> sorted capacities where the closest MCS of any device changes
+        self.breakpoints = {}
+        # (band, bandwidth, availability, capacity interval) -> ReachEntry
+        self.entries = {}
+
+    def get_breakpoints(self, table):
+        """Find capacities where the closest MCS (or its relation to the requested capacity) changes."""
+
+        breakpoints = set()
+        for row in range(len(table)):
+            start = row * table.width
+            caps = table.capacity[start:start + table.mcs_count[row]]
+            cap_last = caps[-1]
+            breakpoints.update(cap + 1 for cap in caps)
+            # cap - req <= |cap_last - req| changes at ceil((cap + cap_last) / 2) if req > cap_last
+            breakpoints.update((cap + cap_last + 1) // 2 for cap in caps[:-1])
+        return sorted(breakpoints)
+
+    def get_entry(self, table, req_avb, req_cap):
+        """Return the entry for the requested capacity and availability."""
+
+        table_key = (table.band, table.bandwidth)
+        breakpoints = self.breakpoints.get(table_key)
+        if breakpoints is None:
+            breakpoints = self.breakpoints[table_key] = self.get_breakpoints(table)
+        key = (table.band, table.bandwidth, req_avb, bisect_right(breakpoints, req_cap))
+        entry = self.entries.get(key)
+        if entry is None:
+            entry = self.entries[key] = ReachEntry(table, req_avb, req_cap, self.profile)
+        return entry
+
+    def recommend(self, table, req_avb, req_cap, link_dist, link_excl):
+        """Return the name of the best device of the table for the link."""
+
+        entry = self.get_entry(table, req_avb, req_cap)
+        sides = []
+        for group in entry.get_groups(link_excl):
+            pos = bisect_left(group.reach, link_dist)
+            if pos < len(group.rows):
+                sides.append((group.reachable_min[pos] - link_dist + group.weight_excl, group, pos, len(group.rows)))
+            if pos > 0:
+                sides.append((group.unreachable_min[pos - 1] + link_dist + group.weight_excl, group, 0, pos))
+        best = min(side[0] for side in sides) + TOLERANCE
+
+        candidates = []
+        for side_min, group, start, end in sides:
+            if side_min > best:
+                continue
+            self.scored += end - start
+            for row in group.rows[start:end]:
+                weight = entry.get_weight(row, req_cap, link_dist, group.weight_excl)
+                if weight <= best:
+                    candidates.append((weight, table.names[row]))
+        return min(candidates)[1]
@@ -0,0 +1,95 @@
+class Site:
+    """A site of a link (a CSV row, see csvhandler.get_site).
+    latitude and longitude are decimal degrees for the KMZ (text), coordinates are their numbers.
+    """
+
+    __slots__ = ('name', 'latitude', 'longitude', 'height', 'coordinates')
+
+    def __init__(self, name, latitude, longitude, height, coordinates):
+        self.name = name
+        self.latitude = latitude
+        self.longitude = longitude
+        self.height = height
+        self.coordinates = coordinates
+
+    def __repr__(self):
+        return f'Site({self.name!r}, {self.latitude!r}, {self.longitude!r}, {self.height!r})'
+
+
+class Requirements:
+    """Requirements of a link (see csvhandler.get_requirements).
+    exclude is a bitmask of excluded families (see scoring.EXCLUDE_BITS).
+    Rows with the same requirements share one record (see csvhandler.get_requirements), it is never modified.
+    """
+
+    __slots__ = ('band', 'bandwidth', 'capacity', 'availability', 'exclude')
+
+    def __init__(self, band, bandwidth, capacity, availability, exclude):
+        # Frequency range
+        self.band = band
+        self.bandwidth = bandwidth
+        self.capacity = capacity
+        self.availability = availability
+        self.exclude = exclude
+
+    def __repr__(self):
+        return (f'Requirements({self.band!r}, {self.bandwidth!r}, {self.capacity!r}, {self.availability!r}, '
+                f'{self.exclude!r})')
+
+
+class Equipment:
+    """Device properties of the database (without Capacity and Availability).
+    Records are shared by all links of the device (see catalog.DeviceCatalog.get_equipment), they are never modified.
+    """
+
+    __slots__ = ('family', 'name', 'model', 'type', 'antenna', 'rf_cable')
+
+    # Fields of devices.db documents
+    fields = ('Family', 'Name', 'Model', 'Type', 'Antenna', 'RF Cable')
+
+    def __init__(self, family, name, model, type, antenna, rf_cable):
+        self.family = family
+        self.name = name
+        self.model = model
+        self.type = type
+        self.antenna = antenna
+        self.rf_cable = rf_cable
+
+    def __repr__(self):
+        return f'Equipment({self.family!r}, {self.name!r})'
+
+    @classmethod
+    def from_document(cls, document):
+        """Create the record from device properties of devices.db."""
+
+        return cls(*(document.get(field) for field in cls.fields))
+
+    def to_dict(self):
+        """Return device properties as they are stored in devices.db."""
+
+        return dict(zip(self.fields, (self.family, self.name, self.model, self.type, self.antenna, self.rf_cable)))
+
+
+class Link:
+    """A link between two sites: its requirements, the distance (km, None until it is calculated)
+    and the recommended equipment (None until the link is scored).
+    Sites and requirements can be shared by several links, they are never modified.
+    """
+
+    __slots__ = ('site_a', 'site_b', 'requirements', 'distance', 'equipment')
+
+    def __init__(self, site_a, site_b, requirements, distance=None, equipment=None):
+        self.site_a = site_a
+        self.site_b = site_b
+        self.requirements = requirements
+        self.distance = distance
+        self.equipment = equipment
+
+    def __repr__(self):
+        return f'Link({self.name!r}, distance={self.distance!r})'
+
+    @property
+    def name(self):
+        """Name of the link: From <site A> to <site B>."""
+
+        return f'From {self.site_a.name} to {self.site_b.name}'
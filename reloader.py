@@ -0,0 +1,146 @@
+from hashlib import sha1
+from pathlib import Path
+from threading import Event, Lock, Thread
+
+import csvhandler
+from catalog import load_catalog
+from scoring import ScoringProfile
+
+
+class WatchedFile:
+    """A file polled for changes: stat first, SHA-1 of the content only if the stamp has changed."""
+
+    __slots__ = ('path', 'stamp', 'digest')
+
+    def __init__(self, path):
+        self.path = Path(path)
+        self.stamp = None
+        self.digest = None
+
+    def get_stamp(self):
+        """Return (mtime, size) of the file, None if it doesn't exist."""
+
+        try:
+            stat = self.path.stat()
+        except OSError:
+            return None
+        return stat.st_mtime_ns, stat.st_size
+
+    def poll(self):
+        """Return the new state (stamp, digest) of the file, None if its content hasn't changed.
+        The state is remembered by commit(), so a failed reload is tried again on the next poll.
+        """
+
+        stamp = self.get_stamp()
+        if stamp == self.stamp:
+            return None
+        digest = sha1(self.path.read_bytes()).hexdigest() if stamp is not None else None
+        if digest == self.digest:
+            self.stamp = stamp
+            return None
+        return stamp, digest
+
+    def commit(self, state):
+        """Remember the state returned by poll()."""
+
+        if state is not None:
+            self.stamp, self.digest = state
+
+
+class Reloader:
+    """Keep the catalog, the scoring profile and the config of a long-lived process (GUI, service) up to date.
+
+    config.ini and the database are polled every `interval` seconds by a background thread
+    (see start) or on demand (see check). When the content of a file changes, the catalog,
+    the profile and the config are rebuilt and replaced together by one assignment, so a run which
+    has already taken them (see get, csvhandler.handle) finishes with the old ones and nobody waits
+    for the reload. The new config is also made active in csvhandler for callers which don't pass it.
+    on_reload(catalog, profile, config) is called after every reload (and after the first load).
+    """
+
+    def __init__(self, config_path='config.ini', interval=2.0, on_reload=None):
+        self.config_file = WatchedFile(config_path)
+        self.db_file = None
+        self.interval = interval
+        self.on_reload = on_reload
+        self.resources = None
+        self.reloads = 0
+        self.lock = Lock()
+        self.last_error = None
+        self.stopped = Event()
+        self.thread = None
+
+    def get(self):
+        """Return (catalog, profile, config), they are loaded on the first call.
+        The config must be passed to the run with them (see csvhandler.handle).
+        """
+
+        resources = self.resources
+        if resources is None:
+            self.check()
+            resources = self.resources
+        return resources
+
+    def check(self):
+        """Reload the catalog, the profile and the config if config.ini or the database has changed.
+        Return True if they have been replaced.
+        """
+
+        with self.lock:
+            config_state = self.config_file.poll()
+            config_changed = config_state is not None
+            if config_changed or self.resources is None:
+                config = csvhandler.read_config(self.config_file.path)
+                profile = ScoringProfile.from_config(config)
+            else:
+                profile, config = self.resources[1:]
+            db_path = csvhandler.get_db_path(config)
+            if self.db_file is None or self.db_file.path != db_path:
+                self.db_file = WatchedFile(db_path)
+            db_state = self.db_file.poll()
+            db_changed = db_state is not None
+            if not config_changed and not db_changed and self.resources is not None:
+                return False
+            reloaded = self.resources is not None
+            catalog = load_catalog(db_path) if db_changed or not reloaded else self.resources[0]
+            # Nothing is replaced until the config, the profile and the catalog are ready
+            csvhandler.set_config(config)
+            csvhandler.set_profile(profile)
+            self.resources = (catalog, profile, config)
+            self.config_file.commit(config_state)
+            self.db_file.commit(db_state)
+            self.reloads += reloaded
+        if reloaded:
+            changed = [path.name for path, path_changed in ((self.config_file.path, config_changed),
+                                                            (db_path, db_changed)) if path_changed]
+            csvhandler.logger.info(f'The catalog, the scoring profile and the config have been reloaded: {", ".join(changed)} '
+                                   f'changed.')
+        if self.on_reload is not None:
+            self.on_reload(catalog, profile, config)
+        return True
+
+    def start(self):
+        """Poll the files in a background thread."""
+
+        if self.thread is None and self.interval > 0:
+            self.thread = Thread(target=self.run, daemon=True)
+            self.thread.start()
+
+    def stop(self):
+        """Stop polling."""
+
+        self.stopped.set()
+
+    def run(self):
+        """Poll the files until stop() is called."""
+
+        while not self.stopped.is_set():
+            try:
+                self.check()
+                self.last_error = None
+            except Exception as error_msg:
+                # A file may be caught in the middle of writing, it is checked again next time
+                if str(error_msg) != self.last_error:
+                    csvhandler.logger.warning(f'Reload has failed: {error_msg}')
+                self.last_error = str(error_msg)
+            self.stopped.wait(self.interval)
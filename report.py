@@ -0,0 +1,116 @@
+from json import dumps
+from time import perf_counter
+
+
+class Timer:
+    """Context manager which adds the elapsed time to a stage of the report."""
+
+    __slots__ = ('report', 'stage', 'start')
+
+    def __init__(self, report, stage):
+        self.report = report
+        self.stage = stage
+        self.start = None
+
+    def __enter__(self):
+        self.start = perf_counter()
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        self.report.add_time(self.stage, perf_counter() - self.start)
+        return False
+
+
+class RunReport:
+    """Timers (seconds per stage) and counters of a project run.
+
+    Stages: catalog, parse, distances, scoring, waiting (for worker processes), lookup, prepare, write, total.
+    Counters: links, rejected_links, written_links, merged_sites, cache_hits, cache_misses, devices_scored,
+    sites and rejected_sites (planned links).
+    """
+
+    enabled = True
+
+    def __init__(self):
+        self.timers = {}
+        self.counters = {}
+
+    def timer(self, stage):
+        """Return a context manager which times the stage."""
+
+        return Timer(self, stage)
+
+    def add_time(self, stage, seconds):
+        """Add seconds to the stage."""
+
+        self.timers[stage] = self.timers.get(stage, 0.0) + seconds
+
+    def count(self, counter, value=1):
+        """Increase the counter."""
+
+        self.counters[counter] = self.counters.get(counter, 0) + value
+
+    def merge(self, data):
+        """Add timers and counters of another report (see to_dict)."""
+
+        for stage, seconds in data['timers'].items():
+            self.add_time(stage, seconds)
+        for counter, value in data['counters'].items():
+            self.count(counter, value)
+
+    def to_dict(self):
+        """Return the report as a JSON-compatible dict."""
+
+        total = self.timers.get('total')
+        links = self.counters.get('links', 0)
+        return {'timers': dict(self.timers),
+                'counters': dict(self.counters),
+                'links_per_second': links / total if total else None}
+
+    def save(self, path):
+        """Write the report as JSON."""
+
+        with open(path, 'w') as report_file:
+            report_file.write(dumps(self.to_dict(), indent=2))
+
+
+class NullTimer:
+    """Timer of NullReport, it does nothing."""
+
+    __slots__ = ()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        return False
+
+
+class NullReport:
+    """Report which ignores everything, it is used when instrumentation is disabled."""
+
+    __slots__ = ()
+
+    enabled = False
+
+    def timer(self, stage):
+        return NULL_TIMER
+
+    def add_time(self, stage, seconds):
+        pass
+
+    def count(self, counter, value=1):
+        pass
+
+    def merge(self, data):
+        pass
+
+    def to_dict(self):
+        return {'timers': {}, 'counters': {}, 'links_per_second': None}
+
+    def save(self, path):
+        pass
+
+
+NULL_TIMER = NullTimer()
+NULL_REPORT = NullReport()
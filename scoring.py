@@ -0,0 +1,50 @@
+EXCLUDE_OPTIONS = ('XG 1000', 'XG 500', 'Quanta', 'E5000', 'R5000 Pro', 'R5000 Lite')
+# Exclude option -> its bit in the exclusions of the requirements (a bitmask, see records.Requirements)
+EXCLUDE_BITS = {option: 1 << bit for bit, option in enumerate(EXCLUDE_OPTIONS)}
+
+# Family -> (weight option in the config, exclude option of the requirements)
+FAMILIES = {'InfiLINK XG 1000': ('weight_xg1000', 'XG 1000'),
+            'InfiLINK XG 500': ('weight_xg500', 'XG 500'),
+            'Quanta 5': ('weight_quanta', 'Quanta'),
+            'Quanta 6': ('weight_quanta', 'Quanta'),
+            'Quanta 70': ('weight_quanta_70', 'Quanta'),
+            'InfiLINK Evolution': ('weight_e5000', 'E5000'),
+            'InfiLINK 2x2 PRO': ('weight_r5000_pro', 'R5000 Pro'),
+            'InfiLINK 2x2 LITE': ('weight_r5000_lite', 'R5000 Lite')}
+
+
+class ScoringProfile:
+    """Weights and region resolved from the [Settings] partition of the config.
+    It is created once and passed to the recommendation engine,
+    so the config isn't parsed for every device of every link.
+    """
+
+    __slots__ = ('costs', 'options', 'weight_exclude', 'region')
+
+    def __init__(self, costs, weight_exclude, region):
+        # Family -> weight_cost
+        self.costs = costs
+        # Family -> exclude option
+        self.options = {family: option for family, (weight, option) in FAMILIES.items()}
+        self.weight_exclude = weight_exclude
+        self.region = region
+
+    @classmethod
+    def from_config(cls, config):
+        """Resolve the profile from a ConfigParser."""
+
+        costs = {family: int(config.get('Settings', weight)) for family, (weight, option) in FAMILIES.items()}
+        return cls(costs, int(config.get('Settings', 'weight_exclude')), config.get('Settings', 'region'))
+
+    def get_weights(self, family):
+        """Return weight_cost and exclude option of the family."""
+
+        try:
+            return self.costs[family], self.options[family]
+        except KeyError:
+            raise ValueError(f'There is no weight for {family}. Please check the settings.') from None
+
+    def get_key(self):
+        """Return weights which affect recommendations (the region doesn't)."""
+
+        return tuple(sorted(self.costs.items())), self.weight_exclude
@@ -0,0 +1,308 @@
+from asyncio import get_running_loop, IncompleteReadError, start_server
+from base64 import b64encode
+from csv import reader, writer
+from io import StringIO
+from json import dumps, loads
+from pathlib import Path
+from re import compile
+from tempfile import TemporaryDirectory
+from urllib.parse import parse_qs, urlsplit
+
+import csvhandler
+from report import RunReport
+
+
+# Fields of a link in JSON requests, they are converted to CSV rows (see get_rows)
+SITE_FIELDS = ('name', 'latitude', 'longitude', 'height')
+REQUIREMENT_FIELDS = ('frequency_range', 'bandwidth', 'capacity', 'availability', 'exclude')
+# Requests with a larger body are rejected
+MAX_BODY_SIZE = 64 * 2 ** 20
+HTTP_REASONS = {200: 'OK', 400: 'Bad Request', 404: 'Not Found', 405: 'Method Not Allowed',
+                413: 'Payload Too Large', 422: 'Unprocessable Entity', 500: 'Internal Server Error'}
+PROJECT_NAME = compile(r'[^\w\-. ]')
+# Content-Length is a non-negative decimal number (int() would also accept signs, spaces and underscores)
+CONTENT_LENGTH = compile(r'[0-9]+')
+
+
+class HTTPError(Exception):
+    """Error which is sent to the client with the status code."""
+
+    def __init__(self, status, message):
+        super().__init__(message)
+        self.status = status
+
+
+def get_rows(item):
+    """Convert a JSON link into two CSV rows.
+    {"site_a": {"name": ..., "latitude": ..., "longitude": ..., "height": ...}, "site_b": {...},
+     "frequency_range": ..., "bandwidth": ..., "capacity": ..., "availability": ..., "exclude": ...}
+    Requirements are optional, missing ones are taken from the project defaults.
+    """
+
+    try:
+        site_a = [str(item['site_a'][field]) for field in SITE_FIELDS]
+        site_b = [str(item['site_b'][field]) for field in SITE_FIELDS]
+        requirements = [str(item.get(field) or '') for field in REQUIREMENT_FIELDS]
+    except (KeyError, TypeError) as error_msg:
+        raise HTTPError(400, f'Invalid link {item!r}: {error_msg!r} is missing.')
+    if any(requirements):
+        site_a += requirements
+    return site_a, site_b
+
+
+def get_links(body, content_type):
+    """Return CSV rows of the project, the body is CSV text or a JSON list of links."""
+
+    text = body.decode('utf-8-sig')
+    if content_type.startswith('application/json'):
+        try:
+            items = loads(text)
+        except ValueError as error_msg:
+            raise HTTPError(400, f'Invalid JSON: {error_msg}')
+        if isinstance(items, dict):
+            items = items.get('links')
+        if not isinstance(items, list):
+            raise HTTPError(400, 'JSON must be a list of links or {"links": [...]}.')
+        return [row for item in items for row in get_rows(item)]
+    return [row for row in reader(StringIO(text), delimiter=',') if len(row) != 0]
+
+
+def init_worker(catalog, profile, config, console_level='INFO'):
+    """Keep the catalog, the scoring profile and the config in a worker process of the service."""
+
+    csvhandler.setup_logging(console_level)
+    csvhandler.init_worker(catalog, profile, config)
+
+
+def recommend_links(pairs, top_k=0):
+    """Select devices for links given as pairs of CSV rows (in a worker process).
+    Return a list of {"link", "device", "distance", "equipment", "error"},
+    "alternatives" (see csvhandler.get_alternatives) are added if top_k is positive.
+    """
+
+    catalog, profile = csvhandler.worker_catalog, csvhandler.worker_profile
+    results = [None] * len(pairs)
+    links = []
+    link_ids = []
+    for link_id, (site_a, site_b) in enumerate(pairs):
+        try:
+            name, link = csvhandler.create_link(site_a, site_b, req_config=csvhandler.worker_config)
+        except ValueError as error_msg:
+            results[link_id] = {'link': f'From {site_a[0]} to {site_b[0]}', 'device': None, 'distance': None,
+                                'equipment': None, 'error': str(error_msg)}
+            continue
+        links.append((name, link))
+        link_ids.append(link_id)
+    recommendations = csvhandler.recommend_links([link for name, link in links], catalog, profile, top_k=top_k)
+    for link_id, (name, link), link_rec in zip(link_ids, links, recommendations):
+        result = {'link': name, 'device': None, 'distance': link.distance, 'equipment': None, 'error': None}
+        if isinstance(link_rec, ValueError):
+            result['error'] = str(link_rec)
+            results[link_id] = result
+            continue
+        if top_k > 0:
+            result['alternatives'] = link_rec
+            link_rec = link_rec[0]['Name']
+        result['device'] = link_rec
+        result['equipment'] = catalog.get_equipment(link.requirements.band, link_rec).to_dict()
+        results[link_id] = result
+    return results
+
+
+def create_project(name, rows):
+    """Create KMZ and BOM of the project (in a worker process).
+    Return the summary: name, links, written, rejected, kmz (bytes), bom (text).
+    """
+
+    with TemporaryDirectory() as tmp_dir:
+        csv_path = Path(tmp_dir) / f'{name}.csv'
+        with open(csv_path, 'w', newline='') as csv_file:
+            writer(csv_file).writerows(rows)
+        output = Path(tmp_dir) / 'Output'
+        report = csvhandler.handle(csv_path, csvhandler.worker_catalog, profile=csvhandler.worker_profile,
+                                   report=RunReport(), output_folder=output, run_config=csvhandler.worker_config)
+        kmz = [path.read_bytes() for path in output.glob('*.kmz')]
+        bom = [path.read_text() for path in output.glob('*.txt')]
+    return {'name': name,
+            'links': report.counters.get('links', 0),
+            'written': report.counters.get('written_links', 0),
+            'rejected': report.counters.get('rejected_links', 0),
+            'kmz': kmz[0] if kmz else None,
+            'bom': bom[0] if bom else None}
+
+
+class PlanningService:
+    """Local HTTP service which keeps the catalog, the scoring profile and the config in memory.
+
+    GET /health - the state of the service.
+    POST /recommend?alternatives=<K> - a JSON link or a list of links (see get_rows), the best device
+    of every link (and K ranked alternatives).
+    POST /project?name=<name> - CSV (text/csv) or a JSON list of links, KMZ (base64) and BOM of the project.
+
+    Links are scored by a pool of worker processes which get the catalog once (a memory-mapped catalog
+    is passed as the path of its binary file), so requests are handled concurrently and devices.db
+    is never read again. reload() replaces the pool when the catalog, the profile or the config has changed.
+    """
+
+    def __init__(self, catalog, profile, config, workers=None, console_level='INFO'):
+        self.workers = workers
+        self.console_level = console_level
+        self.catalog = None
+        self.profile = None
+        self.config = None
+        self.executor = None
+        self.requests = 0
+        self.reloads = -1
+        self.reload(catalog, profile, config)
+        self.routes = {'/health': ('GET', self.health),
+                       '/recommend': ('POST', self.recommend),
+                       '/project': ('POST', self.project)}
+
+    def reload(self, catalog, profile, config):
+        """Start a new pool of workers with the catalog, the profile and the config.
+        Requests which are already queued are finished by the old pool.
+        """
+
+        from concurrent.futures import ProcessPoolExecutor
+
+        executor = ProcessPoolExecutor(max_workers=self.workers, initializer=init_worker,
+                                       initargs=(catalog, profile, config, self.console_level))
+        old_executor, self.executor = self.executor, executor
+        self.catalog, self.profile, self.config = catalog, profile, config
+        self.reloads += 1
+        if old_executor is not None:
+            old_executor.shutdown(wait=False)
+
+    async def run_in_worker(self, function, *args):
+        """Run the function in the pool of worker processes."""
+
+        return await get_running_loop().run_in_executor(self.executor, function, *args)
+
+    async def health(self, query, headers, body):
+        """Return the state of the service."""
+
+        return 200, {'status': 'ok', 'tables': len(self.catalog.tables), 'requests': self.requests,
+                     'reloads': self.reloads}
+
+    async def recommend(self, query, headers, body):
+        """Return the best device of a link (or of every link of a list)."""
+
+        try:
+            items = loads(body)
+        except ValueError as error_msg:
+            raise HTTPError(400, f'Invalid JSON: {error_msg}')
+        single = isinstance(items, dict)
+        if not single and not isinstance(items, list):
+            raise HTTPError(400, 'JSON must be a link or a list of links.')
+        pairs = [get_rows(item) for item in ([items] if single else items)]
+        try:
+            top_k = int(query.get('alternatives', ['0'])[0])
+        except ValueError:
+            raise HTTPError(400, 'alternatives must be a number.')
+        results = await self.run_in_worker(recommend_links, pairs, top_k)
+        return 200, results[0] if single else results
+
+    async def project(self, query, headers, body):
+        """Return KMZ (base64) and BOM of a project."""
+
+        name = PROJECT_NAME.sub('_', query.get('name', ['project'])[0]).strip('. ') or 'project'
+        rows = get_links(body, headers.get('content-type', 'text/csv'))
+        result = await self.run_in_worker(create_project, name, rows)
+        if result['written'] == 0:
+            raise HTTPError(422, f'No links have been written ({result["rejected"]} rejected), '
+                                 f'please check the requirements.')
+        result['kmz'] = b64encode(result['kmz']).decode('ascii')
+        return 200, result
+
+    async def handle_connection(self, stream_reader, stream_writer):
+        """Serve requests of a keep-alive connection."""
+
+        try:
+            while True:
+                request = await read_request(stream_reader)
+                if request is None:
+                    break
+                method, target, headers, body = request
+                self.requests += 1
+                status, data = await self.dispatch(method, target, headers, body)
+                keep_alive = headers.get('connection', '').lower() != 'close'
+                stream_writer.write(get_response(status, data, keep_alive))
+                await stream_writer.drain()
+                if not keep_alive:
+                    break
+        except HTTPError as error_msg:
+            stream_writer.write(get_response(error_msg.status, {'error': str(error_msg)}, False))
+        except (ConnectionError, IncompleteReadError):
+            pass
+        finally:
+            stream_writer.close()
+
+    async def dispatch(self, method, target, headers, body):
+        """Call the handler of the path, return the status and JSON data."""
+
+        url = urlsplit(target)
+        if url.path not in self.routes:
+            return 404, {'error': f'Unknown path: {url.path}'}
+        route_method, handler = self.routes[url.path]
+        if method != route_method:
+            return 405, {'error': f'{url.path} accepts only {route_method}'}
+        try:
+            return await handler(parse_qs(url.query), headers, body)
+        except HTTPError as error_msg:
+            return error_msg.status, {'error': str(error_msg)}
+        except Exception as error_msg:
+            csvhandler.logger.exception(f'{method} {url.path}: {error_msg}')
+            return 500, {'error': f'{type(error_msg).__name__}: {error_msg}'}
+
+    async def serve(self, host='127.0.0.1', port=8080):
+        """Serve requests until the task is cancelled."""
+
+        server = await start_server(self.handle_connection, host, port)
+        csvhandler.logger.info(f'Planning service is listening on http://{host}:{port}')
+        try:
+            async with server:
+                await server.serve_forever()
+        finally:
+            self.executor.shutdown()
+
+
+async def read_request(stream_reader):
+    """Read an HTTP/1.1 request. Return (method, target, headers, body) or None if the connection is closed."""
+
+    line = await stream_reader.readline()
+    if not line:
+        return None
+    try:
+        method, target, version = line.decode('latin-1').split()
+    except ValueError:
+        raise HTTPError(400, f'Invalid request line: {line!r}')
+    headers = {}
+    while True:
+        line = await stream_reader.readline()
+        if line in (b'\r\n', b'\n', b''):
+            break
+        key, _, value = line.decode('latin-1').partition(':')
+        headers[key.strip().lower()] = value.strip()
+    if 'chunked' in headers.get('transfer-encoding', ''):
+        raise HTTPError(400, 'Chunked requests are not supported, send Content-Length.')
+    content_length = headers.get('content-length', '0')
+    if CONTENT_LENGTH.fullmatch(content_length) is None:
+        raise HTTPError(400, f'Invalid Content-Length: {content_length!r}')
+    # Leading zeros are allowed, longer numbers are too large anyway (and not converted)
+    digits = content_length.lstrip('0')
+    length = int(digits or '0') if len(digits) <= len(str(MAX_BODY_SIZE)) else MAX_BODY_SIZE + 1
+    if length > MAX_BODY_SIZE:
+        raise HTTPError(413, f'Request body is larger than {MAX_BODY_SIZE} bytes.')
+    body = await stream_reader.readexactly(length) if length else b''
+    return method, target, headers, body
+
+
+def get_response(status, data, keep_alive=True):
+    """Return an HTTP response with JSON data."""
+
+    body = dumps(data).encode('utf-8')
+    head = (f'HTTP/1.1 {status} {HTTP_REASONS.get(status, "")}\r\n'
+            f'Content-Type: application/json\r\n'
+            f'Content-Length: {len(body)}\r\n'
+            f'Connection: {"keep-alive" if keep_alive else "close"}\r\n\r\n')
+    return head.encode('latin-1') + body
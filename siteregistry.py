@@ -0,0 +1,87 @@
+from math import ceil, cos, floor, radians
+
+
+# Length of a degree of latitude, m
+METERS_PER_DEGREE = 111320.0
+# Longitude cells near the poles are searched up to this cosine of latitude
+MIN_COS = 0.01
+
+
+def normalize_name(name):
+    """Return the site name without case and extra spaces."""
+
+    return ' '.join(str(name).split()).casefold()
+
+
+class SiteRegistry:
+    """One site of sitesArray per physical location.
+
+    Sites with the same normalized name whose coordinates are within `tolerance` meters
+    are one location, the first site keeps its id and later ones refer to it.
+    Locations are kept in a spatial hash (a grid of tolerance-sized cells), so only the cells
+    around the site are checked. With zero tolerance coordinates must be equal.
+    """
+
+    __slots__ = ('tolerance', 'step', 'cells', 'merged')
+
+    def __init__(self, tolerance=0.0):
+        self.tolerance = tolerance
+        # Cell size, degrees
+        self.step = tolerance / METERS_PER_DEGREE
+        # (name, row, column) -> [(latitude, longitude, site id)], (name, latitude, longitude) with zero tolerance
+        self.cells = {}
+        self.merged = 0
+
+    def get_cell(self, name, latitude, longitude):
+        """Return the grid cell of the point."""
+
+        if self.step <= 0:
+            return name, latitude, longitude
+        return name, floor(latitude / self.step), floor(longitude / self.step)
+
+    def find(self, name, latitude, longitude):
+        """Return the id of the location within the tolerance, None if there is no such location."""
+
+        if self.step <= 0:
+            location = self.cells.get((name, latitude, longitude))
+            return location[0][2] if location else None
+        name, row, column = self.get_cell(name, latitude, longitude)
+        # A cell is narrower than the tolerance along the longitude away from the equator
+        columns = min(ceil(1 / max(cos(radians(abs(latitude) + self.step)), MIN_COS)), ceil(360 / self.step))
+        best = None
+        for cell_row in range(row - 1, row + 2):
+            for cell_column in range(column - columns, column + columns + 1):
+                for site_lat, site_lon, site_id in self.cells.get((name, cell_row, cell_column), ()):
+                    distance = self.get_distance(latitude, longitude, site_lat, site_lon)
+                    if distance <= self.tolerance and (best is None or distance < best[0]):
+                        best = (distance, site_id)
+        return best[1] if best is not None else None
+
+    @staticmethod
+    def get_distance(lat_a, lon_a, lat_b, lon_b):
+        """Return the distance between close points, m (equirectangular approximation)."""
+
+        d_lon = (lon_a - lon_b) * cos(radians((lat_a + lat_b) / 2))
+        return ((lat_a - lat_b) ** 2 + d_lon ** 2) ** 0.5 * METERS_PER_DEGREE
+
+    def add(self, project_site, exclude_id=None):
+        """Register the site of a project link (see csvhandler.prepare_project).
+        If its location is known, the site gets the id of the location and False is returned,
+        otherwise the site is a new location and True is returned.
+        exclude_id isn't merged with (the other end of the same link).
+        """
+
+        name = normalize_name(project_site['name'])
+        try:
+            latitude = float(project_site['location']['latitude'])
+            longitude = float(project_site['location']['longitude'])
+        except (TypeError, ValueError):
+            return True
+        site_id = self.find(name, latitude, longitude)
+        if site_id is not None and site_id != exclude_id:
+            project_site['id'] = site_id
+            self.merged += 1
+            return False
+        self.cells.setdefault(self.get_cell(name, latitude, longitude), []).append(
+            (latitude, longitude, project_site['id']))
+        return True